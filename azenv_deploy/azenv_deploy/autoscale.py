@@ -0,0 +1,411 @@
+"""
+This module simulates the autoscaling of an AzureML compute cluster over a job trace, to
+choose its `min_node_count`, `max_node_count`, `node_idle_time_before_scale_down` and
+`vm_priority` from data.
+
+The trace is a CSV file with a row per job: its submit time (seconds, or an ISO-8601
+timestamp), node count and duration in seconds:
+
+    submit_time,node_count,duration_s
+    0,2,1800
+    2024-05-01T09:30:00,1,600
+
+The simulator models the node allocation latency, the scale down of idle nodes, and the
+preemption of low priority nodes, whose jobs restart from the queue. It reports the queue
+wait p50/p99, node-hours and idle node-hours:
+
+    python -m azenv_deploy.azenv_deploy.autoscale trace.csv --stack dev \\
+        --cluster comp-cluster-01 --recommend --max-p99-wait 600
+
+`--recommend` searches the settings with the lowest cost whose p99 wait is within the target,
+and prints them as a `compute_cluster_config` entry.
+"""
+import argparse
+import csv
+import heapq
+import math
+import random
+import re
+import sys
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import yaml
+
+DEFAULT_ALLOCATION_LATENCY_S = 240.0
+# The chance of a low priority node to be preempted, per node-hour.
+DEFAULT_PREEMPTION_RATE = 0.05
+# The price of low priority nodes, as a share of the dedicated price.
+DEFAULT_LOW_PRIORITY_PRICE = 0.2
+DEFAULT_MAX_P99_WAIT_S = 600.0
+IDLE_TIME_CANDIDATES = ("PT2M", "PT5M", "PT15M", "PT30M")
+DURATION_PATTERN = re.compile(
+    r"^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?"
+    r"(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$")
+
+@dataclass
+class Job:
+    """
+    A job of the trace.
+    """
+    submit_s: float
+    nodes: int
+    duration_s: float
+
+@dataclass
+class ClusterSettings:
+    """
+    The scale settings of a compute cluster.
+    """
+    min_node_count: int
+    max_node_count: int
+    node_idle_time_before_scale_down: str
+    vm_priority: str = "Dedicated"
+
+    @property
+    def idle_time_s(self) -> float:
+        """The idle time before scale down, in seconds."""
+        return parse_duration(self.node_idle_time_before_scale_down)
+
+@dataclass
+class SimulationResult:
+    """
+    The queue waits and the node usage of a simulation.
+    """
+    settings: ClusterSettings
+    waits_s: List[float] = field(default_factory=list)
+    node_seconds: float = 0.0
+    busy_node_seconds: float = 0.0
+    preemptions: int = 0
+    # Jobs needing more nodes than `max_node_count`.
+    unschedulable: int = 0
+
+    def wait_percentile(self, percentile: float) -> float:
+        """The queue wait at a percentile, in seconds, nearest rank."""
+        if not self.waits_s:
+            return 0.0
+        waits = sorted(self.waits_s)
+        return waits[max(math.ceil(percentile / 100 * len(waits)) - 1, 0)]
+
+    @property
+    def node_hours(self) -> float:
+        """The allocated node-hours."""
+        return self.node_seconds / 3600
+
+    @property
+    def idle_node_hours(self) -> float:
+        """The allocated node-hours without a job."""
+        return (self.node_seconds - self.busy_node_seconds) / 3600
+
+    def cost(self, low_priority_price: float = DEFAULT_LOW_PRIORITY_PRICE) -> float:
+        """The node-hours, in dedicated node-hours."""
+        price = low_priority_price if self.settings.vm_priority == "LowPriority" else 1.0
+        return self.node_hours * price
+
+def parse_duration(value: str) -> float:
+    """
+    Returns:
+        float: The seconds of an ISO-8601 duration of days, hours, minutes and seconds.
+
+    Raises:
+        (ValueError): The duration is not in that format.
+    """
+    match = DURATION_PATTERN.match(value)
+    if not match or value in ("P", "PT"):
+        raise ValueError(f"Unsupported ISO-8601 duration `{value}`, expected e.g. `PT5M`.")
+    parts = {name: float(number or 0) for name, number in match.groupdict().items()}
+    return parts["days"] * 86400 + parts["hours"] * 3600 + parts["minutes"] * 60 + \
+        parts["seconds"]
+
+def _submit_seconds(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def load_trace(path: str) -> List[Job]:
+    """
+    Load a job trace, with submit times relative to the first job.
+
+    Raises:
+        (ValueError): A row is invalid, with its line.
+    """
+    jobs = []
+    with open(path, encoding="utf-8", newline="") as trace_file:
+        reader = csv.DictReader(trace_file)
+        for row in reader:
+            try:
+                job = Job(_submit_seconds(row["submit_time"]), int(row["node_count"]),
+                          float(row["duration_s"]))
+            except (KeyError, TypeError, ValueError) as error:
+                raise ValueError(f"{path}:{reader.line_num}: invalid job: {error}") from error
+            if job.nodes < 1 or job.duration_s < 0:
+                raise ValueError(f"{path}:{reader.line_num}: invalid job: needs at least a "
+                                 "node and a duration.")
+            jobs.append(job)
+    jobs.sort(key=lambda job: job.submit_s)
+    start = jobs[0].submit_s if jobs else 0.0
+    return [replace(job, submit_s=job.submit_s - start) for job in jobs]
+
+class _Simulation: # pylint: disable=too-many-instance-attributes
+    """
+    The state of a simulation. Events are `(time, sequence, kind, payload)` tuples.
+    """
+    def __init__(self, settings: ClusterSettings, allocation_latency_s: float,
+                 preemption_rate: float, seed: int):
+        self.settings = settings
+        self.allocation_latency_s = allocation_latency_s
+        # Preemptions per node-second.
+        self.preemption_rate = preemption_rate / 3600 \
+            if settings.vm_priority == "LowPriority" else 0.0
+        self.random = random.Random(seed)
+        self.result = SimulationResult(settings)
+        self.events: List[tuple] = []
+        self.sequence = 0
+        self.queue: List[int] = []
+        self.jobs: List[Job] = []
+        # The idle nodes and the time they became idle, the allocating node count, and the
+        # nodes of each running job.
+        self.idle: Dict[int, float] = {}
+        self.allocating = 0
+        self.busy: Dict[int, List[int]] = {}
+        # The allocation time of each node, and the run of each job, to drop stale events.
+        self.allocated_at: Dict[int, float] = {}
+        self.runs: Dict[int, int] = {}
+        self.running_since: Dict[int, float] = {}
+        self.next_node = 0
+
+    def push(self, time: float, kind: str, payload: Any = None) -> None:
+        """Schedule an event."""
+        self.sequence += 1
+        heapq.heappush(self.events, (time, self.sequence, kind, payload))
+
+    def node_count(self) -> int:
+        """The allocated and allocating nodes."""
+        return len(self.idle) + self.allocating + sum(len(nodes) for nodes in self.busy.values())
+
+    def add_node(self, now: float) -> None:
+        """A node is ready."""
+        node = self.next_node
+        self.next_node += 1
+        self.allocated_at[node] = now
+        self.idle[node] = now
+        self.push(now + self.settings.idle_time_s, "idle", (node, now))
+
+    def release(self, node: int, now: float) -> None:
+        """A node is deallocated."""
+        self.result.node_seconds += now - self.allocated_at.pop(node)
+
+    def scale_up(self, now: float) -> None:
+        """Allocate the nodes the queued jobs need, up to `max_node_count`."""
+        needed = sum(self.jobs[index].nodes for index in self.queue) - len(self.idle) - \
+            self.allocating
+        new_nodes = min(needed, self.settings.max_node_count - self.node_count())
+        for _ in range(max(new_nodes, 0)):
+            self.allocating += 1
+            self.push(now + self.allocation_latency_s, "ready")
+
+    def schedule(self, now: float) -> None:
+        """Start the queued jobs in order, while the first one has enough idle nodes."""
+        while self.queue and self.jobs[self.queue[0]].nodes <= len(self.idle):
+            index = self.queue.pop(0)
+            job = self.jobs[index]
+            nodes = sorted(self.idle)[:job.nodes]
+            for node in nodes:
+                del self.idle[node]
+            self.busy[index] = nodes
+            self.running_since[index] = now
+            self.runs[index] = self.runs.get(index, 0) + 1
+            end = now + job.duration_s
+            if self.preemption_rate:
+                # The first preemption of any of the job's nodes.
+                preempted_at = now + self.random.expovariate(self.preemption_rate * job.nodes)
+                if preempted_at < end:
+                    self.push(preempted_at, "preempt", (index, self.runs[index]))
+                    continue
+            self.result.waits_s.append(now - job.submit_s)
+            self.push(end, "done", (index, self.runs[index]))
+        self.scale_up(now)
+
+    def on_event(self, now: float, kind: str, payload: Any) -> None:
+        """Apply an event to the cluster."""
+        if kind == "submit":
+            job = self.jobs[payload]
+            if job.nodes > self.settings.max_node_count:
+                self.result.unschedulable += 1
+                return
+            self.queue.append(payload)
+        elif kind == "ready":
+            self.allocating -= 1
+            self.add_node(now)
+        elif kind in ("done", "preempt"):
+            index, run = payload
+            if self.runs.get(index) != run or index not in self.busy:
+                # A stale event of an earlier run of the job.
+                return
+            nodes = self.busy.pop(index)
+            self.result.busy_node_seconds += len(nodes) * (now - self.running_since[index])
+            if kind == "preempt":
+                self.result.preemptions += 1
+                # The preempted node is gone, the job restarts from the front of the queue.
+                self.release(nodes[0], now)
+                nodes = nodes[1:]
+                self.queue.insert(0, index)
+            for node in nodes:
+                self.idle[node] = now
+                self.push(now + self.settings.idle_time_s, "idle", (node, now))
+        elif kind == "idle":
+            node, since = payload
+            if self.idle.get(node) != since:
+                return
+            if self.queue:
+                # The cluster doesn't scale down while jobs are queued.
+                self.push(now + self.settings.idle_time_s, "idle", (node, since))
+            elif self.node_count() > self.settings.min_node_count:
+                del self.idle[node]
+                self.release(node, now)
+        self.schedule(now)
+
+    def run(self, jobs: List[Job]) -> SimulationResult:
+        """Replay the jobs until the cluster is back to `min_node_count` idle nodes."""
+        self.jobs = jobs
+        for _ in range(self.settings.min_node_count):
+            self.add_node(0.0)
+        for index, job in enumerate(jobs):
+            self.push(job.submit_s, "submit", index)
+        now = 0.0
+        while self.events:
+            now, _, kind, payload = heapq.heappop(self.events)
+            self.on_event(now, kind, payload)
+        # The nodes kept at `min_node_count` are allocated until the end of the simulation.
+        for node in list(self.idle):
+            self.release(node, now)
+        return self.result
+
+def simulate(
+        jobs: List[Job],
+        settings: ClusterSettings,
+        allocation_latency_s: float = DEFAULT_ALLOCATION_LATENCY_S,
+        preemption_rate: float = DEFAULT_PREEMPTION_RATE,
+        seed: int = 0) -> SimulationResult:
+    """
+    Replay a job trace against cluster settings.
+
+    Args:
+        jobs (List[Job]): The jobs, by submit time.
+        settings (ClusterSettings): The scale settings of the cluster.
+        allocation_latency_s (float): The time a new node takes to be ready.
+        preemption_rate (float): The chance of a low priority node to be preempted, per hour.
+        seed (int): The seed of the preemptions, for reproducible results.
+
+    Returns:
+        SimulationResult: The queue waits and the node usage.
+    """
+    return _Simulation(settings, allocation_latency_s, preemption_rate, seed).run(jobs)
+
+def peak_demand(jobs: Iterable[Job]) -> int:
+    """
+    Returns:
+        int: The most nodes the jobs would use at once, without any queue.
+    """
+    events = sorted([(job.submit_s, job.nodes) for job in jobs] +
+                    [(job.submit_s + job.duration_s, -job.nodes) for job in jobs])
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+def candidate_settings(jobs: List[Job], current: ClusterSettings) -> List[ClusterSettings]:
+    """
+    Returns:
+        List[ClusterSettings]: The settings to search, around the current ones.
+    """
+    largest = max((job.nodes for job in jobs), default=1)
+    peak = peak_demand(jobs)
+    max_counts = sorted({count for count in (
+        largest, math.ceil(peak / 2), math.ceil(peak * 3 / 4), peak, current.max_node_count)
+        if count >= largest})
+    idle_times = sorted(set(IDLE_TIME_CANDIDATES) | {current.node_idle_time_before_scale_down},
+                        key=parse_duration)
+    return [ClusterSettings(min_count, max_count, idle_time, priority)
+            for max_count in max_counts
+            for min_count in sorted({0, min(current.min_node_count, max_count)})
+            for idle_time in idle_times
+            for priority in ("Dedicated", "LowPriority")]
+
+def recommend(
+        jobs: List[Job],
+        current: ClusterSettings,
+        max_p99_wait_s: float = DEFAULT_MAX_P99_WAIT_S,
+        low_priority_price: float = DEFAULT_LOW_PRIORITY_PRICE,
+        **simulation: Any) -> Optional[SimulationResult]:
+    """
+    Search the cheapest settings whose p99 queue wait is within the target.
+
+    Returns:
+        Optional[SimulationResult]: The simulation of the recommended settings, `None` if no
+            candidate meets the target.
+    """
+    results = [simulate(jobs, settings, **simulation)
+               for settings in candidate_settings(jobs, current)]
+    fitting = [result for result in results
+               if result.wait_percentile(99) <= max_p99_wait_s and not result.unschedulable]
+    if not fitting:
+        return None
+    return min(fitting, key=lambda result: (round(result.cost(low_priority_price), 6),
+                                            result.wait_percentile(99)))
+
+def format_result(result: SimulationResult, title: str) -> str:
+    """
+    Returns:
+        str: The settings and the metrics of a simulation.
+    """
+    settings = result.settings
+    return (f"{title}: min={settings.min_node_count} max={settings.max_node_count} "
+            f"idle={settings.node_idle_time_before_scale_down} {settings.vm_priority}\n"
+            f"  wait p50 {result.wait_percentile(50):.0f}s, p99 {result.wait_percentile(99):.0f}s"
+            f"; {result.node_hours:.1f} node-hours, {result.idle_node_hours:.1f} idle; "
+            f"{result.preemptions} preemptions, {result.unschedulable} unschedulable jobs")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Simulate a cluster over a job trace, and optionally recommend its scale settings.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .quota import load_azureml_config
+    parser = argparse.ArgumentParser(description="Simulate the autoscaling of a cluster.")
+    parser.add_argument("trace", help="The CSV job trace.")
+    parser.add_argument("--project-dir", default="projects/dev")
+    parser.add_argument("--stack", required=True)
+    parser.add_argument("--cluster", required=True, help="The `compute_cluster_config` entry.")
+    parser.add_argument("--allocation-latency", type=float, default=DEFAULT_ALLOCATION_LATENCY_S)
+    parser.add_argument("--preemption-rate", type=float, default=DEFAULT_PREEMPTION_RATE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recommend", action="store_true")
+    parser.add_argument("--max-p99-wait", type=float, default=DEFAULT_MAX_P99_WAIT_S)
+    parser.add_argument("--low-priority-price", type=float, default=DEFAULT_LOW_PRIORITY_PRICE)
+    options = parser.parse_args(argv)
+
+    cluster = load_azureml_config(options.project_dir, options.stack) \
+        .compute_cluster_config[options.cluster]
+    current = ClusterSettings(cluster.min_node_count, cluster.max_node_count,
+                              cluster.node_idle_time_before_scale_down, cluster.vm_priority)
+    jobs = load_trace(options.trace)
+    simulation = {"allocation_latency_s": options.allocation_latency,
+                  "preemption_rate": options.preemption_rate, "seed": options.seed}
+    print(format_result(simulate(jobs, current, **simulation), "current"))
+    if not options.recommend:
+        return 0
+    best = recommend(jobs, current, options.max_p99_wait, options.low_priority_price,
+                     **simulation)
+    if best is None:
+        print(f"no settings keep the p99 wait within {options.max_p99_wait:.0f}s")
+        return 1
+    print(format_result(best, "recommended"))
+    entry = {options.cluster: {**vars(best.settings), "vm_size": cluster.vm_size}}
+    print(yaml.safe_dump({"compute_cluster_config": entry}, sort_keys=False), end="")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
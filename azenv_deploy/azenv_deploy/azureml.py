@@ -2,62 +2,119 @@
 This module is to deploy Azure Machine Learning service and its related resources,
 such as storage accounts, keyvault, private endpoints, etc.
 """
+import re
 from dataclasses import dataclass, asdict
-from typing import Dict, Optional
-from pydantic import field_validator, Field, BaseModel
+from typing import Any, Dict, List, Literal, Optional, Set
+from pydantic import field_validator, Field, BaseModel, NonNegativeInt, ValidationInfo
+from pydantic.dataclasses import dataclass as pydantic_dataclass
+import pulumi
 from pulumi import Input, Output, ComponentResource, ResourceOptions
-from pulumi_azure_native import (
-    network,
-    storage,
-    containerregistry,
-    keyvault,
-    authorization,
-    insights,
-    machinelearning,
-    machinelearningservices as mls)
-import pulumi_random as random
-import pulumi_azuread as azuread
 from .constants import (
     LOCATION,
     STANDARD_DS11_V2,
-    PRIVATE_DNS_ZONE_STORAGE_FILE,
-    PRIVATE_DNS_ZONE_STORAGE_BLOB,
-    PRIVATE_DNS_ZONE_STORAGE_DFS,
     PRIVATE_DNS_ZONE_CONTAINER_REGISTRY,
     PRIVATE_DNS_ZONE_KEY_VAULT,
     PRIVATE_DNS_ZONE_AZUREML_NOTEBOOK,
     PRIVATE_DNS_ZONE_AZUREML_API_MS,
     KV_SOFT_DELETE_RETENTION_DAYS,
-    RECORDSET_TYPE,
-    RECORDSET_TTL
+    VM_SIZE_PATTERN,
+    ISO_8601_DURATION_PATTERN
 )
-from .private_endpoint import PrivateEndpointArgs, PrivateEndpoint
+from .private_endpoint import (
+    PrivateEndpointArgs,
+    PrivateEndpoint,
+    PrivateEndpointReplacementPolicy)
+from .dns_records import PrivateRecordSetManager
+from .storage_profile import StorageProfile, network_rule_set
+from .container_registry import ContainerRegistryConfig
+from .image_build import ImageBuildConfig, prebuilt_image
+from .online_endpoints import (
+    ENDPOINT_NAME_PATTERN,
+    OnlineEndpointItem,
+    create_online_endpoints)
+from .observability import (
+    ObservabilityConfig,
+    create_diagnostic_settings,
+    create_log_analytics,
+    create_metric_alerts)
+from . import invoke_cache, compute_names, sharding
+from .lazy_imports import lazy_import
 
-@dataclass
-class ComputeInstanceItem:
+# Provider submodules are only imported once a resource of that kind is built, e.g.
+# `machinelearningservices` is never imported when no compute is configured.
+storage = lazy_import("pulumi_azure_native.storage")
+containerregistry = lazy_import("pulumi_azure_native.containerregistry")
+keyvault = lazy_import("pulumi_azure_native.keyvault")
+insights = lazy_import("pulumi_azure_native.insights")
+machinelearning = lazy_import("pulumi_azure_native.machinelearning")
+mls = lazy_import("pulumi_azure_native.machinelearningservices")
+random = lazy_import("pulumi_random")
+
+# The names of compute instances, and of compute clusters with their 2 chars suffix.
+COMPUTE_INSTANCE_NAME_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9-]{2,23}$")
+COMPUTE_CLUSTER_NAME_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9-]{1,20}$")
+
+def validate_vm_size(value: str) -> str:
+    """Validate a VM size is e.g. `Standard_DS11_v2`."""
+    if not value or not VM_SIZE_PATTERN.match(value):
+        raise ValueError(f"invalid VM size {value!r}, expected e.g. `{STANDARD_DS11_V2}`.")
+    return value
+
+# Pydantic dataclasses, unlike the stdlib ones, run their validators.
+@pydantic_dataclass
+class ComputeInstanceItem: # pylint: disable=too-few-public-methods
     """
     Class for a Compute Instance config.
     """
     user_email: str
     vm_size: str = Field(default=STANDARD_DS11_V2)
 
-@dataclass
+    @field_validator("user_email")
+    @classmethod
+    def validate_user_email(cls, value): # pylint: disable=no-self-argument
+        """Validate that user_email looks like an email"""
+        if "@" not in value.strip(" @"):
+            raise ValueError(f"invalid user_email {value!r}.")
+        return value
+
+    _validate_vm_size = field_validator("vm_size")(validate_vm_size)
+
+@pydantic_dataclass
 class ComputeClusterItem:
     """
     Class for Compute Cluster Config
     """
-    max_node_count: int
-    min_node_count: int
+    max_node_count: NonNegativeInt
+    min_node_count: NonNegativeInt
     node_idle_time_before_scale_down: str
-    vm_priority: str
+    vm_priority: Literal["Dedicated", "LowPriority"]
     vm_size: str
 
     @field_validator("vm_size")
     @classmethod
     def validate_vm_size_not_empty(cls, value): # pylint: disable=no-self-argument
-        """Validate that vm_size is not empty"""
+        """Validate that vm_size is not empty, and is a VM size"""
         if not value or value.strip() == "":
             raise ValueError("vm_size in compute cluster can't be empty.")
+        return validate_vm_size(value)
+
+    @field_validator("node_idle_time_before_scale_down")
+    @classmethod
+    def validate_idle_time(cls, value): # pylint: disable=no-self-argument
+        """Validate that the idle time is an ISO-8601 duration"""
+        if not ISO_8601_DURATION_PATTERN.match(value):
+            raise ValueError(f"invalid ISO-8601 duration {value!r}, expected e.g. `PT5M`.")
+        return value
+
+    @field_validator("min_node_count")
+    @classmethod
+    def validate_node_counts(cls, value, info: ValidationInfo): # pylint: disable=no-self-argument
+        """Validate that min_node_count is not greater than max_node_count"""
+        # `max_node_count` is validated first, and is missing from `info.data` if invalid.
+        max_node_count = info.data.get("max_node_count")
+        if max_node_count is not None and value > max_node_count:
+            raise ValueError(f"min_node_count ({value}) is greater than "
+                             f"max_node_count ({max_node_count}).")
         return value
 
     def __getitem__(self, key):
@@ -70,7 +127,45 @@ class AzureMLYamlConfig(BaseModel):
     compute_instance_subnet_name: Optional[str] = None
     compute_cluster_subnet_name: Optional[str] = None
     compute_instance_config: Dict[str, ComputeInstanceItem] = Field(default_factory=dict)
+    # A CSV or JSONL file with more compute instances, relative to the project, see `roster`.
+    compute_instance_roster: Optional[str] = None
     compute_cluster_config: Dict[str, ComputeClusterItem] = Field(default_factory=dict)
+    # `random` creates a `RandomString` resource per cluster for its `compute_name` suffix,
+    # `hash` derives the suffix from the stack, prefix and cluster names instead.
+    compute_cluster_suffix_mode: Literal["random", "hash"] = compute_names.SUFFIX_MODE_RANDOM
+    # Suffixes pinned by cluster name, e.g. to keep the names of existing clusters.
+    compute_cluster_suffixes: Dict[str, str] = Field(default_factory=dict)
+    private_endpoint_replacement: Optional[PrivateEndpointReplacementPolicy] = None
+    # The storage accounts, e.g. an ADLS Gen2 data account, see `storage_profile`.
+    storage_profile: Optional[StorageProfile] = None
+    # The SKU, geo-replicas and cache rules of the registry, see `container_registry`.
+    container_registry: Optional[ContainerRegistryConfig] = None
+    # The image build cluster and the prebuilt environments, see `image_build`.
+    image_build: Optional[ImageBuildConfig] = None
+    # The managed online endpoints and their deployments, see `online_endpoints`.
+    online_endpoint_config: Optional[Dict[str, OnlineEndpointItem]] = None
+    # The Log Analytics workspace, diagnostic settings and alerts, see `observability`.
+    observability: Optional[ObservabilityConfig] = None
+
+    @field_validator("online_endpoint_config")
+    @classmethod
+    def validate_endpoint_names(cls, value): # pylint: disable=no-self-argument
+        """Validate the online endpoint names"""
+        for endpoint_name in value or {}:
+            if not ENDPOINT_NAME_PATTERN.match(endpoint_name):
+                raise ValueError(f"invalid online endpoint name {endpoint_name!r}, expected "
+                                 "3 to 32 letters, digits or hyphens starting with a letter.")
+        return value
+
+    @field_validator("image_build")
+    @classmethod
+    def validate_image_build_compute(cls, value, info: ValidationInfo):
+        """Validate the image build compute is a cluster of `compute_cluster_config`."""
+        clusters = info.data.get("compute_cluster_config")
+        if value is not None and clusters is not None and value.compute not in clusters:
+            raise ValueError(f"the image build compute `{value.compute}` is not in "
+                             "compute_cluster_config.")
+        return value
 
 @dataclass
 class AzureMLArgs:
@@ -93,10 +188,332 @@ class AzureMLArgs:
         default_factory=dict)
     compute_cluster_config: Dict[str, ComputeClusterItem] = Field(
         default_factory=dict)
+    compute_cluster_suffix_mode: str = compute_names.SUFFIX_MODE_RANDOM
+    compute_cluster_suffixes: Optional[Dict[str, str]] = None
+    # When and how private endpoints are recreated, see `PrivateEndpointReplacementPolicy`.
+    private_endpoint_replacement: Optional[PrivateEndpointReplacementPolicy] = None
+    # The compute shard stacks. When set, the computes are deployed by the shard stacks with
+    # `AzureMLComputeShard` instead of this component, see `sharding`.
+    compute_shards: Optional[List[str]] = None
+    # The storage accounts of the component, see `StorageProfile`.
+    storage_profile: Optional[StorageProfile] = None
+    # The SKU, geo-replicas and cache rules of the registry, see `ContainerRegistryConfig`.
+    container_registry: Optional[ContainerRegistryConfig] = None
+    # The image build cluster and the prebuilt environments, see `ImageBuildConfig`.
+    image_build: Optional[ImageBuildConfig] = None
+    # The managed online endpoints, see `OnlineEndpointItem`.
+    online_endpoint_config: Optional[Dict[str, OnlineEndpointItem]] = None
+    # The telemetry of the component, see `ObservabilityConfig`.
+    observability: Optional[ObservabilityConfig] = None
+
+def validate_compute_names(config: AzureMLYamlConfig, name: str, stack: str) -> List[str]:
+    """
+    Validate the compute names of a config, as they are named in the workspace, i.e. with
+    the suffixes of the compute clusters. Names are case insensitive in a workspace.
+
+    Args:
+        config (AzureMLYamlConfig): The AzureML config, with its compute instances.
+        name (str): The name of the AzureML component, i.e. the prefixed name.
+        stack (str): The stack the cluster suffixes are derived from.
+
+    Returns:
+        List[str]: The problems of the compute names, empty if they are all valid.
+    """
+    errors = []
+    for instance_name in config.compute_instance_config:
+        if not COMPUTE_INSTANCE_NAME_PATTERN.match(instance_name):
+            errors.append(f"compute_instance_config.{instance_name}: the name should have 3 "
+                          "to 24 letters, digits or hyphens, starting with a letter.")
+    for cluster_name in config.compute_cluster_config:
+        if not COMPUTE_CLUSTER_NAME_PATTERN.match(cluster_name):
+            errors.append(f"compute_cluster_config.{cluster_name}: the name should have 2 to "
+                          "21 letters, digits or hyphens, starting with a letter, to fit "
+                          "its suffix.")
+        if cluster_name in config.compute_instance_config:
+            errors.append(f"compute_cluster_config.{cluster_name}: a compute instance has the "
+                          "same name.")
+
+    suffixes = compute_names.cluster_suffixes(
+        mode=config.compute_cluster_suffix_mode,
+        stack=stack,
+        name=name,
+        cluster_names=config.compute_cluster_config.keys(),
+        pinned=config.compute_cluster_suffixes,
+        reserved_names=config.compute_instance_config.keys())
+    compute_keys: Dict[str, str] = {}
+    for key in list(config.compute_instance_config) + [
+            f"{cluster_name}-{suffixes[cluster_name]}" for cluster_name in suffixes]:
+        other = compute_keys.setdefault(key.lower(), key)
+        if other != key:
+            errors.append(f"the compute names `{other}` and `{key}` collide in the workspace.")
+    return errors
+
+def private_endpoint_subnet_id(args: AzureMLArgs) -> Optional[Output[str]]:
+    """
+    Returns:
+        Optional[Output[str]]: The id of the subnet used by private endpoints and computes,
+            `None` if no subnet is configured.
+    """
+    if not args.private_endpoint_subnet_name:
+        return None
+    return invoke_cache.get_subnet_output(
+        resource_group_name=args.vnet_resource_group_name,
+        virtual_network_name=args.vnet_name,
+        subnet_name=args.private_endpoint_subnet_name
+    ).id
+
+def cluster_compute_names(
+        name: str,
+        args: AzureMLArgs,
+        opts: ResourceOptions,
+        *,
+        names: Optional[Set[str]] = None,
+        stack: Optional[str] = None) -> Dict[str, Input[str]]:
+    """
+    Name the compute clusters in the workspace, i.e. with their suffix, creating the
+    `RandomString` of the suffixes in the `random` suffix mode.
+
+    Args:
+        name (str): The name of the AzureML component, used by the cluster name suffixes.
+        args (AzureMLArgs): The component arguments, with all the compute configs.
+        opts (ResourceOptions): The options of the `RandomString` resources.
+        names (Optional[Set[str]]): Only name these clusters. Defaults to all of them.
+        stack (Optional[str]): The stack the suffixes are derived from. Defaults to the
+            current stack.
+
+    Returns:
+        Dict[str, Input[str]]: The compute names, by cluster.
+    """
+    cluster_suffixes = compute_names.cluster_suffixes(
+        mode=args.compute_cluster_suffix_mode,
+        stack=stack or pulumi.get_stack(),
+        name=name,
+        cluster_names=args.compute_cluster_config.keys(),
+        pinned=args.compute_cluster_suffixes,
+        reserved_names=args.compute_instance_config.keys())
+    cluster_names: Dict[str, Input[str]] = {}
+    for cluster_name in args.compute_cluster_config:
+        if names is not None and cluster_name not in names:
+            continue
+        suffix = cluster_suffixes.get(cluster_name)
+        if suffix is None:
+            suffix = random.RandomString(
+                f"{cluster_name}-suffix",
+                length=compute_names.SUFFIX_LENGTH,
+                upper=False,
+                special=False,
+                opts=opts).result
+        cluster_names[cluster_name] = Output.format("{0}-{1}", cluster_name, suffix)
+    return cluster_names
+
+def create_computes( # pylint: disable=too-many-arguments,too-many-locals
+        name: str,
+        args: AzureMLArgs,
+        workspace_name: Input[str],
+        pe_subnet_id: Optional[Input[str]],
+        opts: ResourceOptions,
+        *,
+        names: Optional[Set[str]] = None,
+        stack: Optional[str] = None,
+        cluster_names: Optional[Dict[str, Input[str]]] = None) -> Dict[str, Any]:
+    """
+    Create the compute instances and clusters of a workspace.
+
+    Args:
+        name (str): The name of the AzureML component, used by the cluster name suffixes.
+        args (AzureMLArgs): The component arguments, with all the compute configs.
+        workspace_name (Input[str]): The name of the workspace.
+        pe_subnet_id (Optional[Input[str]]): The subnet of the computes.
+        opts (ResourceOptions): The options of the computes, i.e. their parent.
+        names (Optional[Set[str]]): Only create the computes with these names, e.g. those
+            of a compute shard. Defaults to all of them.
+        stack (Optional[str]): The stack the cluster name suffixes are derived from.
+            Defaults to the current stack.
+        cluster_names (Optional[Dict[str, Input[str]]]): The compute names of clusters
+            already named with `cluster_compute_names`.
+
+    Returns:
+        Dict[str, mls.Compute]: The computes by name.
+    """
+    # Create compute instances
+    tenant_id = invoke_cache.get_client_config().tenant_id
+    # Resolve all the users in one lookup, rather than one blocking lookup per instance.
+    user_object_ids = invoke_cache.get_user_object_ids(
+        [config['user_email'] for compute_name, config in args.compute_instance_config.items()
+         if names is None or compute_name in names])
+    computes: Dict[str, Any] = {}
+    for compute_name, config in args.compute_instance_config.items():
+        if names is not None and compute_name not in names:
+            continue
+        computes[compute_name] = mls.Compute(
+            resource_name=compute_name,
+            resource_group_name=args.resource_group_name,
+            location=LOCATION,
+            properties=mls.ComputeInstancePropertiesArgs(
+                # pylint: disable=line-too-long
+                compute_instance_authorization_type=mls.ComputeInstanceAuthorizationType.PERSONAL,
+                personal_compute_instance_settings=mls.PersonalComputeInstanceSettingsArgs(
+                    assigned_user=mls.AssignedUserArgs(
+                            object_id=user_object_ids[config['user_email']],
+                            tenant_id=tenant_id
+                        )
+                ),
+                enable_node_public_ip=not args.enable_private_endpoints,
+                subnet=mls.ResourceIdArgs(id=pe_subnet_id),
+                vm_size=config['vm_size']
+            ),
+            workspace_name=workspace_name,
+            opts=opts
+        )
+
+    # Create compute clusters
+    cluster_names = dict(cluster_names or {})
+    unnamed = {cluster_name for cluster_name in args.compute_cluster_config
+               if (names is None or cluster_name in names) and cluster_name not in cluster_names}
+    if unnamed:
+        cluster_names.update(cluster_compute_names(name, args, opts, names=unnamed, stack=stack))
+    for cluster_name, cluster_config in args.compute_cluster_config.items():
+        if names is not None and cluster_name not in names:
+            continue
+        computes[cluster_name] = mls.Compute(
+            cluster_name,
+            opts=opts,
+            compute_name=cluster_names[cluster_name],
+            identity=mls.ManagedServiceIdentityArgs(
+                type=mls.ManagedServiceIdentityType.SYSTEM_ASSIGNED
+            ),
+            properties=mls.AmlComputeArgs(
+                compute_type=mls.ComputeType.AML_COMPUTE,
+                disable_local_auth=True,
+                properties=mls.AmlComputePropertiesArgs(
+                    enable_node_public_ip=not args.enable_private_endpoints,
+                    isolated_network=False,
+                    os_type=mls.OsType.LINUX,
+                    remote_login_port_public_access=mls.RemoteLoginPortPublicAccess.DISABLED,
+                    scale_settings=mls.ScaleSettingsArgs(
+                        max_node_count=cluster_config['max_node_count'],
+                        min_node_count=cluster_config['min_node_count'],
+                        # pylint: disable=line-too-long
+                        node_idle_time_before_scale_down=cluster_config['node_idle_time_before_scale_down']
+                    ),
+                    subnet=mls.ResourceIdArgs(id=pe_subnet_id),
+                    vm_priority=mls.VmPriority(cluster_config['vm_priority']),
+                    vm_size=cluster_config['vm_size']
+                )
+            ),
+            resource_group_name=args.resource_group_name,
+            workspace_name=workspace_name
+        )
+
+    return computes
+
+def create_datastore( # pylint: disable=too-many-arguments,too-many-positional-arguments
+        name: str,
+        args: AzureMLArgs,
+        profile: StorageProfile,
+        account: Any,
+        workspace_name: Input[str],
+        opts: ResourceOptions) -> Any:
+    """
+    Register the data account of a storage profile as a workspace datastore, with a blob
+    container, or an ADLS Gen2 file system, for the data.
+
+    Args:
+        name (str): The name of the AzureML component.
+        args (AzureMLArgs): The component arguments.
+        profile (StorageProfile): The storage profile.
+        account (storage.StorageAccount): The data account.
+        workspace_name (Input[str]): The workspace of the datastore.
+        opts (ResourceOptions): The options of the resources.
+
+    Returns:
+        mls.Datastore: The datastore.
+    """
+    container = storage.BlobContainer(
+        f"{name}dat-{profile.container_name}",
+        account_name=account.name,
+        container_name=profile.container_name,
+        resource_group_name=args.resource_group_name,
+        opts=opts)
+    # Identity based access, no account key or SAS token is stored in the workspace.
+    credentials = mls.NoneDatastoreCredentialsArgs(credentials_type="None")
+    if profile.data_account().is_hns_enabled:
+        properties = mls.AzureDataLakeGen2DatastoreArgs(
+            account_name=account.name,
+            credentials=credentials,
+            datastore_type="AzureDataLakeGen2",
+            filesystem=container.name)
+    else:
+        properties = mls.AzureBlobDatastoreArgs(
+            account_name=account.name,
+            container_name=container.name,
+            credentials=credentials,
+            datastore_type="AzureBlob")
+    return mls.Datastore(
+        f"{name}-{profile.datastore_name}",
+        datastore_properties=properties,
+        name=profile.datastore_name,
+        resource_group_name=args.resource_group_name,
+        workspace_name=workspace_name,
+        opts=opts)
+
+def create_prebuilt_environments( # pylint: disable=too-many-arguments,too-many-positional-arguments
+        name: str,
+        args: AzureMLArgs,
+        image_build: ImageBuildConfig,
+        registry: Any,
+        workspace_name: Input[str],
+        opts: ResourceOptions) -> Dict[str, Any]:
+    """
+    Build the images of the prebuilt environments in the workspace registry with ACR task
+    runs, and register each of them as a workspace environment version using its image.
+
+    Args:
+        name (str): The name of the AzureML component.
+        args (AzureMLArgs): The component arguments.
+        image_build (ImageBuildConfig): The environments to prebuild.
+        registry (containerregistry.Registry): The workspace registry.
+        workspace_name (Input[str]): The workspace of the environments.
+        opts (ResourceOptions): The options of the resources.
+
+    Returns:
+        Dict[str, mls.EnvironmentVersion]: The environment versions, by environment name.
+    """
+    environments: Dict[str, Any] = {}
+    for env_name, environment in image_build.environments.items():
+        image = prebuilt_image(env_name, environment)
+        # A new version changes the update tag, which runs the build again.
+        build = containerregistry.TaskRun(
+            f"{name}-{env_name}-build",
+            force_update_tag=str(environment.version),
+            location=LOCATION,
+            registry_name=registry.name,
+            resource_group_name=args.resource_group_name,
+            run_request=containerregistry.DockerBuildRequestArgs(
+                agent_pool_name=image_build.agent_pool,
+                docker_file_path=environment.dockerfile_path,
+                image_names=[image],
+                is_push_enabled=True,
+                platform=containerregistry.PlatformPropertiesArgs(os="Linux"),
+                source_location=environment.source_location,
+                type="DockerBuildRequest"),
+            opts=opts)
+        environments[env_name] = mls.EnvironmentVersion(
+            f"{name}-{env_name}-env",
+            environment_version_properties=mls.EnvironmentVersionArgs(
+                image=Output.concat(registry.login_server, "/", image),
+                os_type=mls.OperatingSystemType.LINUX),
+            name=env_name,
+            resource_group_name=args.resource_group_name,
+            version=str(environment.version),
+            workspace_name=workspace_name,
+            opts=ResourceOptions.merge(opts, ResourceOptions(depends_on=[build])))
+    return environments
 
 class AzureML(ComponentResource):
     """Pulumi Component for Azure ML Workspace and associated resources"""
-    # pylint: disable=too-many-locals
+    # pylint: disable=too-many-locals,too-many-instance-attributes,too-many-branches
+    # pylint: disable=too-many-statements
     def __init__(
         self,
         name: str,
@@ -110,35 +527,12 @@ class AzureML(ComponentResource):
                          asdict(args),
                          opts)
         # 1. Get the subnet id of the subnet that is used by private endpoints.
-        pe_subnet_id = None
-        if args.private_endpoint_subnet_name:
-            pe_subnet_id = network.get_subnet_output(
-                resource_group_name=args.vnet_resource_group_name,
-                virtual_network_name=args.vnet_name,
-                subnet_name=args.private_endpoint_subnet_name
-            ).id
-
-        # 2. Create a Storage Account
-        storage_name = f"{name}stg"
-        # private_dns_zones_and_group_ids = None
-        if args.enable_private_endpoints:
-            private_dns_zones_and_group_ids = [
-                # Use a Tuple to store the private dns zones and their group ids.
-                (PRIVATE_DNS_ZONE_STORAGE_FILE, "file"),
-                (PRIVATE_DNS_ZONE_STORAGE_BLOB, "blob"),
-                (PRIVATE_DNS_ZONE_STORAGE_DFS, "dfs")]
+        pe_subnet_id = private_endpoint_subnet_id(args)
 
-        network_rule_set_args = None
-        if args.enable_private_endpoints:
-            network_rule_set_args=storage.NetworkRuleSetArgs(
-                bypass=storage.Bypass.AZURE_SERVICES,
-                default_action=storage.DefaultAction.DENY
-            )
-        else:
-            network_rule_set_args=storage.NetworkRuleSetArgs(
-                bypass=storage.Bypass.AZURE_SERVICES,
-                default_action=storage.DefaultAction.ALLOW
-            )
+        # 2. Create a Storage Account, and the data account of the storage profile
+        storage_profile = StorageProfile.from_config(args.storage_profile)
+        storage_name = f"{name}stg"
+        workspace_account = storage_profile.workspace_account()
         self.storage_account = storage.StorageAccount(
             storage_name,
             location=LOCATION,
@@ -147,30 +541,80 @@ class AzureML(ComponentResource):
             key_policy=storage.KeyPolicyArgs(
                 key_expiration_period_in_days=90,
             ),
-            kind=storage.Kind.STORAGE_V2,
+            kind=workspace_account.kind,
             minimum_tls_version=storage.MinimumTlsVersion.TLS1_2,
-            is_hns_enabled=False,
-            access_tier=storage.AccessTier.HOT,
+            is_hns_enabled=workspace_account.is_hns_enabled,
+            access_tier=workspace_account.access_tier,
             public_network_access=storage.PublicNetworkAccess.DISABLED \
                 if args.enable_private_endpoints else storage.PublicNetworkAccess.ENABLED,
-            network_rule_set=network_rule_set_args,
+            network_rule_set=network_rule_set(args.enable_private_endpoints),
             resource_group_name=args.resource_group_name,
-            sku=storage.SkuArgs(name=storage.SkuName.STANDARD_GZRS),
+            sku=storage.SkuArgs(name=workspace_account.sku),
             tags={},
             opts=child_opts
         )
+        # Use a Tuple to store the storage account, its resource name and its spec.
+        storage_accounts = [(self.storage_account, storage_name, workspace_account)]
+        data_account = storage_profile.data_account()
+        self.data_storage_account = None
+        if data_account is not None:
+            # Shared key access is off, the datastore is reached with the identity of the
+            # job or user.
+            self.data_storage_account = storage.StorageAccount(
+                f"{name}dat",
+                location=LOCATION,
+                allow_blob_public_access=False,
+                allow_shared_key_access=False,
+                kind=data_account.kind,
+                minimum_tls_version=storage.MinimumTlsVersion.TLS1_2,
+                is_hns_enabled=data_account.is_hns_enabled,
+                access_tier=data_account.access_tier,
+                public_network_access=storage.PublicNetworkAccess.DISABLED \
+                    if args.enable_private_endpoints else storage.PublicNetworkAccess.ENABLED,
+                network_rule_set=network_rule_set(args.enable_private_endpoints),
+                resource_group_name=args.resource_group_name,
+                sku=storage.SkuArgs(name=data_account.sku),
+                tags={},
+                opts=child_opts
+            )
+            storage_accounts.append((self.data_storage_account, f"{name}dat", data_account))
 
         # 4. Create a Azure Container Registry with private endpoints
+        registry_config = ContainerRegistryConfig.from_config(args.container_registry)
         self.container_registry = containerregistry.Registry(
             resource_name=f"{name}acr",
             location=LOCATION,
             resource_group_name=args.resource_group_name,
-            sku=containerregistry.SkuArgs(name=containerregistry.SkuName.STANDARD),
+            sku=containerregistry.SkuArgs(name=registry_config.sku),
             admin_user_enabled=True,
             public_network_access=containerregistry.PublicNetworkAccess.DISABLED \
                 if args.enable_private_endpoints \
                     else containerregistry.PublicNetworkAccess.ENABLED,
             opts=child_opts)
+        # 4.1. Replicate the registry to the regions where compute runs, so nodes pull
+        # images from their own region.
+        registry_replications: List[containerregistry.Replication] = []
+        for location, replica in registry_config.replicas.items():
+            registry_replications.append(containerregistry.Replication(
+                f"{name}acr-{location}",
+                location=location,
+                registry_name=self.container_registry.name,
+                replication_name=location,
+                resource_group_name=args.resource_group_name,
+                region_endpoint_enabled=True,
+                zone_redundancy=containerregistry.ZoneRedundancy.ENABLED \
+                    if replica.zone_redundancy else containerregistry.ZoneRedundancy.DISABLED,
+                opts=child_opts))
+        # 4.2. Cache upstream base images in the registry.
+        for rule_name, rule in registry_config.cache_rules.items():
+            containerregistry.CacheRule(
+                f"{name}acr-{rule_name}",
+                cache_rule_name=rule_name,
+                registry_name=self.container_registry.name,
+                resource_group_name=args.resource_group_name,
+                source_repository=rule.source_repository,
+                target_repository=rule.target(),
+                opts=child_opts)
 
         # 5. Create a Keyvault
         self.key_vault = keyvault.Vault(
@@ -189,7 +633,7 @@ class AzureML(ComponentResource):
                     family=keyvault.SkuFamily.A,
                     name=keyvault.SkuName.STANDARD
                 ),
-                tenant_id=authorization.get_client_config().tenant_id,
+                tenant_id=invoke_cache.get_client_config().tenant_id,
                 access_policies=[],
                 public_network_access=keyvault.PublicNetworkAccess.DISABLED \
                     if args.enable_private_endpoints else keyvault.PublicNetworkAccess.ENABLED
@@ -199,132 +643,141 @@ class AzureML(ComponentResource):
             opts=child_opts
         )
 
-        # 6. Create a Application Insights
+        # 6. Create a Application Insights, backed by a Log Analytics workspace if the
+        # telemetry is configured
+        observability = ObservabilityConfig.from_config(args.observability)
+        self.log_analytics = None
+        if observability is not None:
+            self.log_analytics = create_log_analytics(
+                name, observability, args.resource_group_name, child_opts)
         self.app_insights = insights.Component(
             f"{name}-app-insights",
             opts=child_opts,
             application_type="web",
             kind="web",
-            resource_group_name=args.resource_group_name)
-
-        # 7. Create a Azureml Workspace
-        self.workspace = machinelearning.Workspace(
-            resource_name=f"{name}-ws",
-            key_vault_identifier_id=self.key_vault.id,
-            location=LOCATION,
-            owner_email="angie.xiong0627@gmail.com",
             resource_group_name=args.resource_group_name,
-            sku=machinelearning.SkuArgs(
-                name="Basic",
-                tier="Basic"
-            ),
-            user_storage_account_id=self.storage_account.id,
-            workspace_name=f"{name}-ws",
-            opts=child_opts
-        )
+            ingestion_mode="LogAnalytics" if self.log_analytics is not None else None,
+            workspace_resource_id=self.log_analytics.id if self.log_analytics is not None
+            else None)
 
-        # 8. Create compute instances
-        tenant_id = authorization.get_client_config().tenant_id
-        for compute_name, config in args.compute_instance_config.items():
-            mls.Compute(
-                resource_name=compute_name,
-                resource_group_name=args.resource_group_name,
+        # 7. Create a Azureml Workspace
+        image_build = ImageBuildConfig.from_config(args.image_build)
+        build_cluster_names: Dict[str, Input[str]] = {}
+        if image_build is None:
+            self.workspace = machinelearning.Workspace(
+                resource_name=f"{name}-ws",
+                key_vault_identifier_id=self.key_vault.id,
                 location=LOCATION,
-                properties=mls.ComputeInstancePropertiesArgs(
-                    # pylint: disable=line-too-long
-                    compute_instance_authorization_type=mls.ComputeInstanceAuthorizationType.PERSONAL,
-                    personal_compute_instance_settings=mls.PersonalComputeInstanceSettingsArgs(
-                        assigned_user=mls.AssignedUserArgs(
-                                object_id=azuread.get_user(
-                                    user_principal_name=config['user_email']).object_id,
-                                tenant_id=tenant_id
-                            )
-                    ),
-                    enable_node_public_ip=not args.enable_private_endpoints,
-                    subnet=mls.ResourceIdArgs(id=pe_subnet_id),
-                    vm_size=config['vm_size']
+                owner_email="angie.xiong0627@gmail.com",
+                resource_group_name=args.resource_group_name,
+                sku=machinelearning.SkuArgs(
+                    name="Basic",
+                    tier="Basic"
                 ),
-                workspace_name=self.workspace.name,
+                user_storage_account_id=self.storage_account.id,
+                workspace_name=f"{name}-ws",
                 opts=child_opts
             )
-
-        # 9. Create compute clusters
-        for cluster_name, cluster_config in args.compute_cluster_config.items():
-            mls.Compute(
-                cluster_name,
-                opts=child_opts,
-                compute_name=Output.format(
-                    "{0}-{1}",
-                    cluster_name,
-                    random.RandomString(
-                        f"{cluster_name}-suffix",
-                        length=2,
-                        upper=False,
-                        special=False,
-                        opts=child_opts).result
-                ),
+        else:
+            # The image build compute is named before the workspace, the cluster itself is
+            # created in the workspace with the other computes.
+            build_cluster_names = cluster_compute_names(
+                name, args, child_opts, names={image_build.compute})
+            self.workspace = mls.Workspace(
+                resource_name=f"{name}-ws",
+                application_insights=self.app_insights.id,
+                container_registry=self.container_registry.id,
                 identity=mls.ManagedServiceIdentityArgs(
                     type=mls.ManagedServiceIdentityType.SYSTEM_ASSIGNED
                 ),
-                properties=mls.AmlComputeArgs(
-                    compute_type=mls.ComputeType.AML_COMPUTE,
-                    disable_local_auth=True,
-                    properties=mls.AmlComputePropertiesArgs(
-                        enable_node_public_ip=not args.enable_private_endpoints,
-                        isolated_network=False,
-                        os_type=mls.OsType.LINUX,
-                        remote_login_port_public_access=mls.RemoteLoginPortPublicAccess.DISABLED,
-                        scale_settings=mls.ScaleSettingsArgs(
-                            max_node_count=cluster_config['max_node_count'],
-                            min_node_count=cluster_config['min_node_count'],
-                            # pylint: disable=line-too-long
-                            node_idle_time_before_scale_down=cluster_config['node_idle_time_before_scale_down']
-                        ),
-                        subnet=mls.ResourceIdArgs(id=pe_subnet_id),
-                        vm_priority=mls.VmPriority(cluster_config['vm_priority']),
-                        vm_size=cluster_config['vm_size']
-                    )
-                ),
+                image_build_compute=build_cluster_names[image_build.compute],
+                key_vault=self.key_vault.id,
+                location=LOCATION,
+                public_network_access=mls.PublicNetworkAccess.DISABLED \
+                    if args.enable_private_endpoints else mls.PublicNetworkAccess.ENABLED,
                 resource_group_name=args.resource_group_name,
-                workspace_name=self.workspace.name
+                sku=mls.SkuArgs(
+                    name="Basic",
+                    tier="Basic"
+                ),
+                storage_account=self.storage_account.id,
+                workspace_name=f"{name}-ws",
+                opts=child_opts
             )
 
+        # 7.1. Register the data account of the storage profile as a datastore
+        if self.data_storage_account is not None:
+            create_datastore(name, args, storage_profile, self.data_storage_account,
+                             self.workspace.name, child_opts)
+
+        # 8. and 9. Create compute instances and clusters, unless they are deployed by
+        # compute shard stacks. The image build cluster is always created here.
+        if not args.compute_shards:
+            create_computes(
+                name, args, self.workspace.name, pe_subnet_id, child_opts,
+                cluster_names=build_cluster_names)
+        elif image_build is not None:
+            create_computes(
+                name, args, self.workspace.name, pe_subnet_id, child_opts,
+                names={image_build.compute}, cluster_names=build_cluster_names)
+
+        # 9.1. Prebuild the environments of the image build config
+        if image_build is not None and image_build.environments:
+            create_prebuilt_environments(
+                name, args, image_build, self.container_registry, self.workspace.name,
+                child_opts)
+
+        # 9.2. Create the managed online endpoints and their deployments
+        self.online_endpoints = {}
+        if args.online_endpoint_config:
+            self.online_endpoints = create_online_endpoints(
+                name, args.online_endpoint_config,
+                resource_group_name=args.resource_group_name,
+                workspace_name=self.workspace.name,
+                enable_private_endpoints=args.enable_private_endpoints,
+                opts=child_opts)
+
         # 10. Create private endpoints
         if args.enable_private_endpoints:
-            # 10.1. - Create private enddpoints for storage account
-            self.private_ip_addresses: Dict[str, str] = {}
-            for item in private_dns_zones_and_group_ids:
-                endpoint = PrivateEndpoint(
-                    name=f"{name}-{item[1]}-pe",
-                    args=PrivateEndpointArgs(
-                        resource_group_name=args.resource_group_name,
-                        private_link_service_id=self.storage_account.id,
-                        subnet_id=pe_subnet_id,
-                        dns_resource_group_name=args.dns_resource_group_name,
-                        group_id=item[1],
-                        private_dns_zones=[item[0]]
-                    ),
-                    opts=child_opts
-                )
-                # pylint: disable=line-too-long
-                self.private_ip_addresses[item[0]] = endpoint.private_dns_zone_configs[0]["record_sets"][0]["ip_addresses"][0]
-
-            # 10.2. Create extra DNS record sets to link the endpoints with the
-            # private dns zone in Spoke.
-            for item in private_dns_zones_and_group_ids:
-                private_ipv4_address = self.private_ip_addresses[item[0]]
-                network.PrivateRecordSet(f"{storage_name}-{item[1]}-rs",
-                    a_records=[network.ARecordArgs(
-                        ipv4_address=private_ipv4_address
-                    )],
-                    record_type=RECORDSET_TYPE,
-                    relative_record_set_name=self.storage_account.name,
-                    resource_group_name=args.resource_group_name,
-                    ttl=RECORDSET_TTL,
-                    private_zone_name=item[0],
-                    opts=ResourceOptions(parent=self, depends_on=[self.storage_account])
-                )
-            # 10.3. Create a private endpoint for container registry
+            pe_replacement_policy = PrivateEndpointReplacementPolicy.from_config(
+                args.private_endpoint_replacement)
+            # 10.1. - Create private enddpoints for storage accounts
+            record_set_manager = PrivateRecordSetManager(
+                args.resource_group_name, ResourceOptions(parent=self))
+            # The IPs of the workspace storage account endpoints, by private DNS zone.
+            self.private_ip_addresses: Dict[str, Output[List[str]]] = {}
+            for account, account_name, spec in storage_accounts:
+                # The data account endpoints are named after the account.
+                pe_prefix = name if account is self.storage_account else account_name
+                for zone, group_id in spec.private_dns_zones():
+                    endpoint = PrivateEndpoint(
+                        name=f"{pe_prefix}-{group_id}-pe",
+                        args=PrivateEndpointArgs(
+                            resource_group_name=args.resource_group_name,
+                            private_link_service_id=account.id,
+                            subnet_id=pe_subnet_id,
+                            dns_resource_group_name=args.dns_resource_group_name,
+                            group_id=group_id,
+                            private_dns_zones=[zone],
+                            replacement_policy=pe_replacement_policy
+                        ),
+                        opts=child_opts
+                    )
+                    # 10.2. Add extra DNS records to link the endpoints with the private dns
+                    # zone in Spoke. Records of the same zone and name share one record set.
+                    ip_addresses = record_set_manager.add_records(
+                        resource_name=f"{account_name}-{group_id}-rs",
+                        zone_name=zone,
+                        relative_record_set_name=account.name,
+                        private_dns_zone_configs=endpoint.private_dns_zone_configs,
+                        depends_on=[account])
+                    if account is self.storage_account:
+                        self.private_ip_addresses[zone] = ip_addresses
+            self.private_record_sets = record_set_manager.create_record_sets()
+            # 10.3. Create a private endpoint for container registry. The endpoints only get
+            # the data endpoint of a replica region if its replication exists first.
+            registry_pe_opts = ResourceOptions.merge(
+                child_opts, ResourceOptions(depends_on=registry_replications))
             PrivateEndpoint(
                 name=f"{name}-acr-pe",
                 args=PrivateEndpointArgs(
@@ -333,10 +786,34 @@ class AzureML(ComponentResource):
                     subnet_id=pe_subnet_id,
                     dns_resource_group_name=args.dns_resource_group_name,
                     group_id="registry",
-                    private_dns_zones=[PRIVATE_DNS_ZONE_CONTAINER_REGISTRY]
+                    private_dns_zones=[PRIVATE_DNS_ZONE_CONTAINER_REGISTRY],
+                    replacement_policy=pe_replacement_policy
                     ),
-                opts=child_opts
+                opts=registry_pe_opts
             )
+            # 10.3.1. Create a private endpoint for each registry replica, in a subnet of its
+            # region. It registers in the registry zone of its region, if any, since it would
+            # overwrite the records of the home endpoint in the zone of the home region.
+            for location, replica in registry_config.replicas.items():
+                PrivateEndpoint(
+                    name=f"{name}-{location}-acr-pe",
+                    args=PrivateEndpointArgs(
+                        resource_group_name=args.resource_group_name,
+                        private_link_service_id=self.container_registry.id,
+                        subnet_id=invoke_cache.get_subnet_output(
+                            resource_group_name=replica.vnet_resource_group_name,
+                            virtual_network_name=replica.vnet_name,
+                            subnet_name=replica.subnet_name).id,
+                        dns_resource_group_name=replica.dns_resource_group_name or "",
+                        group_id="registry",
+                        private_dns_zones=[PRIVATE_DNS_ZONE_CONTAINER_REGISTRY]
+                        if replica.dns_resource_group_name else [],
+                        replacement_policy=pe_replacement_policy,
+                        location=location,
+                        dns_group_name_prefix=f"{name}-{location}"
+                        ),
+                    opts=registry_pe_opts
+                )
             # 10.4. Create a private endpoint for key vault
             PrivateEndpoint(
                 name=f"{name}-kv-pe",
@@ -346,7 +823,8 @@ class AzureML(ComponentResource):
                     subnet_id=pe_subnet_id,
                     dns_resource_group_name=args.dns_resource_group_name,
                     group_id="vault",
-                    private_dns_zones=[PRIVATE_DNS_ZONE_KEY_VAULT]
+                    private_dns_zones=[PRIVATE_DNS_ZONE_KEY_VAULT],
+                    replacement_policy=pe_replacement_policy
                     ),
                 opts=child_opts
             )
@@ -362,7 +840,73 @@ class AzureML(ComponentResource):
                     private_dns_zones=[
                         PRIVATE_DNS_ZONE_AZUREML_NOTEBOOK,
                         PRIVATE_DNS_ZONE_AZUREML_API_MS
-                        ]
+                        ],
+                    replacement_policy=pe_replacement_policy
                     ),
                 opts=child_opts
             )
+
+        # 11. Send the logs and metrics of the resources to Log Analytics, and alert on the
+        # storage latencies, key vault throttling and failed runs
+        if observability is not None:
+            diagnostic_targets = {}
+            alert_targets: Dict[str, List[Any]] = {"storage": [], "kv": [
+                ("kv", self.key_vault.id)]}
+            for account, account_name, _ in storage_accounts:
+                suffix = "st" if account is self.storage_account else "dat"
+                diagnostic_targets[f"{suffix}-blob"] = (
+                    "blob", Output.concat(account.id, "/blobServices/default"))
+                alert_targets["storage"].append((suffix, account.id))
+            diagnostic_targets["st-file"] = (
+                "file", Output.concat(self.storage_account.id, "/fileServices/default"))
+            diagnostic_targets["acr"] = ("acr", self.container_registry.id)
+            diagnostic_targets["kv"] = ("kv", self.key_vault.id)
+            # The run events and metrics are only defined on `Microsoft.MachineLearningServices`
+            # workspaces, not on the classic workspace created without `image_build`.
+            if image_build is not None:
+                diagnostic_targets["ws"] = ("ws", self.workspace.id)
+                alert_targets["ws"] = [("ws", self.workspace.id)]
+            self.diagnostic_settings = create_diagnostic_settings(
+                name, diagnostic_targets, self.log_analytics.id, child_opts)
+            self.metric_alerts = create_metric_alerts(
+                name, observability, alert_targets, args.resource_group_name, child_opts)
+
+class AzureMLComputeShard(ComponentResource):
+    """
+    Pulumi Component for the computes of a compute shard stack. The workspace and its
+    resources are deployed by the core stack with `AzureML`.
+    """
+    def __init__( # pylint: disable=too-many-arguments
+        self,
+        name: str,
+        args: AzureMLArgs,
+        *,
+        shard: str,
+        workspace_name: Input[str],
+        core_stack: str,
+        opts: Optional[ResourceOptions] = None
+    ):
+        """
+        Args:
+            name (str): The name of the `AzureML` component of the core stack.
+            args (AzureMLArgs): The component arguments, the same as the core stack's.
+            shard (str): The shard stack, one of `args.compute_shards`.
+            workspace_name (Input[str]): The workspace of the core stack.
+            core_stack (str): The core stack, whose cluster name suffixes are kept.
+            opts (Optional[ResourceOptions]): The component options.
+        """
+        super().__init__("azenv_deploy:azureml:AzureMLComputeShard",
+                         f"{name}-{shard}-comp",
+                         {"shard": shard, "workspace_name": workspace_name},
+                         opts)
+        computes = list(args.compute_instance_config) + list(args.compute_cluster_config)
+        image_build = ImageBuildConfig.from_config(args.image_build)
+        if image_build is not None:
+            # The core stack creates the image build cluster, the workspace refers to it.
+            computes.remove(image_build.compute)
+        self.computes = create_computes(
+            name, args, workspace_name, private_endpoint_subnet_id(args),
+            ResourceOptions(parent=self),
+            names=set(sharding.shard_computes(computes, args.compute_shards or [shard], shard)),
+            stack=core_stack)
+        self.register_outputs({})
@@ -0,0 +1,136 @@
+"""
+This module builds the `compute_name` suffixes of AzureML compute clusters.
+
+Clusters used to get their suffix from a `random.RandomString` resource each. The `hash`
+mode derives it from the stack, the component name and the cluster name instead, so no
+extra resource is registered. To migrate an existing stack without renaming its clusters,
+pin the suffixes generated so far and switch the mode:
+
+    python -m azenv_deploy.azenv_deploy.compute_names .pulumi/stacks/dev/dev.json
+
+prints a `compute_cluster_suffixes` block to add to the `azureml` stack config, next to
+`compute_cluster_suffix_mode: hash`. The next `pulumi up` then only deletes the
+`RandomString` resources.
+"""
+import hashlib
+import string
+import sys
+from typing import Dict, Iterable, List, Optional
+from .state import load_state_resources, urn_name
+
+SUFFIX_MODE_RANDOM = "random"
+SUFFIX_MODE_HASH = "hash"
+SUFFIX_LENGTH = 2
+# The same alphabet as the `RandomString` suffixes, i.e. no upper case nor special chars.
+SUFFIX_ALPHABET = string.ascii_lowercase + string.digits
+RANDOM_STRING_TYPE = "random:index/randomString:RandomString"
+
+def hash_suffix(stack: str, name: str, cluster_name: str, salt: int = 0) -> str:
+    """
+    Derive a stable suffix from a stable hash of the stack, component and cluster names.
+
+    Args:
+        stack (str): The stack name.
+        name (str): The name of the AzureML component, i.e. the prefix of its resources.
+        cluster_name (str): The compute cluster name.
+        salt (int): Changes the suffix, to get around collisions.
+
+    Returns:
+        str: A suffix of `SUFFIX_LENGTH` lower case letters and digits.
+    """
+    seed = f"{stack}/{name}/{cluster_name}/{salt}" if salt else f"{stack}/{name}/{cluster_name}"
+    value = int.from_bytes(hashlib.sha256(seed.encode("utf-8")).digest(), "big")
+    suffix = ""
+    for _ in range(SUFFIX_LENGTH):
+        value, index = divmod(value, len(SUFFIX_ALPHABET))
+        suffix += SUFFIX_ALPHABET[index]
+    return suffix
+
+def cluster_suffixes( # pylint: disable=too-many-arguments
+        mode: str,
+        stack: str,
+        name: str,
+        cluster_names: Iterable[str],
+        *,
+        pinned: Optional[Dict[str, str]] = None,
+        reserved_names: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Build the suffixes of compute clusters that don't need a `RandomString` resource.
+
+    Args:
+        mode (str): `random` or `hash`.
+        stack (str): The stack name.
+        name (str): The name of the AzureML component.
+        cluster_names (Iterable[str]): The compute cluster names.
+        pinned (Optional[Dict[str, str]]): Suffixes set in the config, used in both modes.
+        reserved_names (Iterable[str]): Compute names already used in the workspace, e.g.
+            the compute instance names.
+
+    Returns:
+        Dict[str, str]: The suffix by cluster name. In `random` mode, only the pinned
+            clusters have one.
+
+    Raises:
+        (ValueError): The mode is unknown.
+    """
+    if mode not in (SUFFIX_MODE_RANDOM, SUFFIX_MODE_HASH):
+        raise ValueError(f"Unknown compute cluster suffix mode `{mode}`.")
+    cluster_names = list(cluster_names)
+    suffixes = {
+        cluster_name: suffix for cluster_name, suffix in (pinned or {}).items()
+        if cluster_name in cluster_names
+    }
+    if mode == SUFFIX_MODE_RANDOM:
+        return suffixes
+
+    used_names = set(reserved_names) | {
+        f"{cluster_name}-{suffix}" for cluster_name, suffix in suffixes.items()}
+    for cluster_name in sorted(cluster_names):
+        if cluster_name in suffixes:
+            continue
+        salt = 0
+        suffix = hash_suffix(stack, name, cluster_name)
+        # Clusters are suffixed in name order, so the salting is deterministic as well.
+        while f"{cluster_name}-{suffix}" in used_names:
+            salt += 1
+            suffix = hash_suffix(stack, name, cluster_name, salt)
+        suffixes[cluster_name] = suffix
+        used_names.add(f"{cluster_name}-{suffix}")
+    return suffixes
+
+def read_random_suffixes(state_path: str) -> Dict[str, str]:
+    """
+    Read the suffixes generated by the `RandomString` resources of a stack.
+
+    Args:
+        state_path (str): The stack state file.
+
+    Returns:
+        Dict[str, str]: The suffix by cluster name.
+    """
+    suffixes: Dict[str, str] = {}
+    for resource in load_state_resources(state_path):
+        resource_name = urn_name(resource.get("urn", ""))
+        if resource.get("type") == RANDOM_STRING_TYPE and resource_name.endswith("-suffix"):
+            result = (resource.get("outputs") or {}).get("result")
+            if result:
+                suffixes[resource_name[:-len("-suffix")]] = result
+    return suffixes
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Print the `compute_cluster_suffixes` config block of an existing stack.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(f"Usage: python -m {__spec__.name} <stack state file>", file=sys.stderr)
+        return 2
+    suffixes = read_random_suffixes(argv[0])
+    print("compute_cluster_suffix_mode: hash")
+    print("compute_cluster_suffixes:" + ("" if suffixes else " {}"))
+    for cluster_name, suffix in sorted(suffixes.items()):
+        print(f"  {cluster_name}: \"{suffix}\"")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
 """Constant Variables"""
+import re
+
 LOCATION = "eastus"
 STANDARD_DS11_V2 = "Standard_DS11_v2"
 
-PRIVATE_DNS_ZONE_STORAGE_FILE = "privatelink.blob.core.windows.net"
-PRIVATE_DNS_ZONE_STORAGE_BLOB = "privatelink.file.core.windows.net"
+PRIVATE_DNS_ZONE_STORAGE_FILE = "privatelink.file.core.windows.net"
+PRIVATE_DNS_ZONE_STORAGE_BLOB = "privatelink.blob.core.windows.net"
 PRIVATE_DNS_ZONE_STORAGE_DFS = "privatelink.dfs.core.windows.net"
 PRIVATE_DNS_ZONE_CONTAINER_REGISTRY = "privatelink.azurecr.io"
 PRIVATE_DNS_ZONE_KEY_VAULT = "privatelink.vaultcore.azure.net"
@@ -13,3 +15,9 @@ KV_SOFT_DELETE_RETENTION_DAYS = 7
 
 RECORDSET_TYPE = "A"
 RECORDSET_TTL = 3600
+
+# VM sizes, e.g. `Standard_DS11_v2` or `Standard_NC24ads_A100_v4`.
+VM_SIZE_PATTERN = re.compile(r"^Standard_[A-Za-z0-9]+(_[A-Za-z0-9]+)*$")
+# ISO-8601 durations, e.g. `PT5M` or `P1DT12H`.
+ISO_8601_DURATION_PATTERN = re.compile(
+    r"^P(?=\d|T\d)(\d+Y)?(\d+M)?(\d+W)?(\d+D)?(T(?=\d)(\d+H)?(\d+M)?(\d+(\.\d+)?S)?)?$")
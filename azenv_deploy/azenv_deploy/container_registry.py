@@ -0,0 +1,157 @@
+"""
+This module configures the container registry of the AzureML component: its SKU,
+geo-replicas in the regions where compute runs, and cache rules pulling upstream base
+images through the registry:
+
+    dev:azureml:
+      container_registry:
+        sku: Premium
+        replicas:
+          westus2:
+            vnet_resource_group_name: rg-westus2-network
+            vnet_name: vnet-westus2
+            subnet_name: snet-westus2-pe
+            dns_resource_group_name: rg-westus2-dns
+        cache_rules:
+          python:
+            source_repository: docker.io/library/python
+            target_repository: base/python
+
+Compute nodes pull images from the replica of their region. With private endpoints, each
+replica gets a private endpoint in a subnet of its region, since private endpoints live in
+the region of their virtual network. The registry endpoint of the home region serves the
+data endpoints of all the replicas as well.
+
+The endpoint of a replica registers its IPs in the `privatelink.azurecr.io` zone of its own
+`dns_resource_group_name`, the zone linked to the virtual networks of its region. In the
+zone of the home region, its IPs would overwrite the `<registry>` and `<registry>.<region>.data`
+records of the home endpoint, and pulls of the home region would cross regions. Without a
+`dns_resource_group_name`, the endpoint of the replica is created without a DNS zone group.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Optional, Union
+from .constants import LOCATION
+
+SKU_STANDARD = "Standard"
+SKU_PREMIUM = "Premium"
+# Replication and cache rule names of `Microsoft.ContainerRegistry`.
+REPLICATION_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9]{5,50}$")
+CACHE_RULE_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9-]{5,50}$")
+
+@dataclass
+class RegistryReplica:
+    """
+    A geo-replica of the container registry, and the subnet of its private endpoint.
+    """
+    zone_redundancy: bool = False
+    vnet_resource_group_name: Optional[str] = None
+    vnet_name: Optional[str] = None
+    subnet_name: Optional[str] = None
+    # The resource group of the `privatelink.azurecr.io` zone of the region of the replica.
+    dns_resource_group_name: Optional[str] = None
+
+    @property
+    def has_subnet(self) -> bool:
+        """Whether the subnet of the private endpoint of the replica is configured."""
+        return bool(self.vnet_resource_group_name and self.vnet_name and self.subnet_name)
+
+@dataclass
+class RegistryCacheRule:
+    """
+    A cache rule pulling an upstream repository through the registry, e.g.
+    `docker.io/library/python` as `base/python`.
+    """
+    source_repository: str
+    # Defaults to the source repository without its registry.
+    target_repository: Optional[str] = None
+
+    def target(self) -> str:
+        """The repository of the cached images in the registry."""
+        return self.target_repository or self.source_repository.split("/", 1)[-1]
+
+@dataclass
+class ContainerRegistryConfig:
+    """
+    A class for configuring the container registry of the AzureML component.
+
+    Attributes:
+        sku (str): `Standard` or `Premium`. Replicas need `Premium`.
+        replicas (Dict[str, RegistryReplica]): The replicas, by region.
+        cache_rules (Dict[str, RegistryCacheRule]): The cache rules, by name.
+    """
+    sku: Literal["Standard", "Premium"] = SKU_STANDARD
+    replicas: Dict[str, RegistryReplica] = field(default_factory=dict)
+    cache_rules: Dict[str, RegistryCacheRule] = field(default_factory=dict)
+
+    def __post_init__(self):
+        errors = validate_registry_config(self)
+        if errors:
+            raise ValueError(" ".join(errors))
+
+    @classmethod
+    def from_config(
+            cls,
+            config: Union["ContainerRegistryConfig", Dict[str, Any], None]
+    ) -> "ContainerRegistryConfig":
+        """Build a registry config from the stack config, which may be a plain dict."""
+        if config is None:
+            return cls()
+        if isinstance(config, dict):
+            return cls(
+                sku=config.get("sku", SKU_STANDARD),
+                replicas={location: RegistryReplica(**replica) for location, replica
+                          in (config.get("replicas") or {}).items()},
+                cache_rules={name: RegistryCacheRule(**rule) for name, rule
+                             in (config.get("cache_rules") or {}).items()})
+        return config
+
+def validate_registry_config(config: ContainerRegistryConfig) -> List[str]:
+    """
+    Returns:
+        List[str]: The problems of a registry config, empty if it is valid.
+    """
+    errors = []
+    if config.replicas and config.sku != SKU_PREMIUM:
+        errors.append(f"replicas need the `{SKU_PREMIUM}` SKU.")
+    for location in config.replicas:
+        if location.lower() == LOCATION:
+            errors.append(f"replica `{location}`: the registry is already in `{LOCATION}`.")
+        elif not REPLICATION_NAME_PATTERN.match(location):
+            errors.append(f"replica `{location}`: expected a region name, e.g. `westus2`.")
+    for name in config.cache_rules:
+        if not CACHE_RULE_NAME_PATTERN.match(name):
+            errors.append(f"cache rule `{name}`: expected 5 to 50 letters, digits or hyphens.")
+    return errors
+
+def validate_replica_subnets(
+        config: Optional[ContainerRegistryConfig],
+        dns_resource_group_name: Optional[str] = None) -> List[str]:
+    """
+    Args:
+        config (Optional[ContainerRegistryConfig]): The registry config.
+        dns_resource_group_name (Optional[str]): The resource group of the private DNS zones
+            of the home region.
+
+    Returns:
+        List[str]: The replicas without the subnet of their private endpoint, or registering
+            it in the DNS zone of the home region.
+    """
+    config = ContainerRegistryConfig.from_config(config)
+    errors = []
+    for location, replica in config.replicas.items():
+        if not replica.has_subnet:
+            errors.append(f"replica `{location}`: `vnet_resource_group_name`, `vnet_name` and "
+                          "`subnet_name` are required with private endpoints.")
+        if dns_resource_group_name and replica.dns_resource_group_name == dns_resource_group_name:
+            errors.append(f"replica `{location}`: `dns_resource_group_name` holds the DNS zone "
+                          "of the home region, whose registry records the replica endpoint "
+                          "would overwrite.")
+    return errors
+
+def data_endpoint_count(config: Union[ContainerRegistryConfig, Dict[str, Any], None]) -> int:
+    """
+    Returns:
+        int: The data endpoints of the registry, one per region it is replicated in.
+    """
+    return 1 + len(ContainerRegistryConfig.from_config(config).replicas)
@@ -0,0 +1,115 @@
+"""
+This module creates the private DNS A record sets of private endpoints, grouped by zone.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from pulumi import Input, Output, Resource, ResourceOptions
+from .constants import RECORDSET_TYPE, RECORDSET_TTL
+from .lazy_imports import lazy_import
+
+network = lazy_import("pulumi_azure_native.network")
+
+def zone_ip_addresses(private_dns_zone_configs: Any, zone_name: str) -> List[str]:
+    """
+    Collect the IP addresses registered in a zone by a private DNS zone group.
+
+    Args:
+        private_dns_zone_configs (Any): The resolved `private_dns_zone_configs` of a
+            `network.PrivateDnsZoneGroup`.
+        zone_name (str): The private DNS zone name.
+
+    Returns:
+        List[str]: The IP addresses of every record set of the zone, in order.
+    """
+    ip_addresses: List[str] = []
+    for zone_config in private_dns_zone_configs or []:
+        if zone_config.get("name") != zone_name:
+            continue
+        for record_set in zone_config.get("record_sets") or []:
+            for ip_address in record_set.get("ip_addresses") or []:
+                if ip_address not in ip_addresses:
+                    ip_addresses.append(ip_address)
+    return ip_addresses
+
+@dataclass
+class _RecordSet:
+    """The A records of a single record set name in a zone."""
+    resource_name: str
+    zone_name: str
+    relative_record_set_name: Input[str]
+    ip_addresses: List[Output[List[str]]] = field(default_factory=list)
+    depends_on: List[Resource] = field(default_factory=list)
+
+class PrivateRecordSetManager:
+    """
+    Groups the A records of private endpoints by zone and record set name, so each zone
+    gets a single `network.PrivateRecordSet` per name, holding all the endpoint IPs.
+    """
+    def __init__(self, resource_group_name: Input[str], opts: Optional[ResourceOptions] = None):
+        self.resource_group_name = resource_group_name
+        self.opts = opts
+        self._record_sets: Dict[Tuple[str, Hashable], _RecordSet] = {}
+
+    def add_records(
+            self,
+            resource_name: str,
+            zone_name: str,
+            relative_record_set_name: Input[str],
+            private_dns_zone_configs: Output[Any],
+            depends_on: Optional[List[Resource]] = None) -> Output[List[str]]:
+        """
+        Add the IPs of an endpoint to the record set of a zone.
+
+        Args:
+            resource_name (str): The resource name of the record set, used by the first
+                endpoint added to it.
+            zone_name (str): The private DNS zone name.
+            relative_record_set_name (Input[str]): The record set name in the zone. Outputs
+                are grouped by identity.
+            private_dns_zone_configs (Output[Any]): The `private_dns_zone_configs` of the
+                endpoint DNS zone group.
+            depends_on (Optional[List[Resource]]): Extra dependencies of the record set.
+
+        Returns:
+            Output[List[str]]: The IP addresses of the endpoint in the zone.
+        """
+        name_key = relative_record_set_name if isinstance(relative_record_set_name, str) \
+            else id(relative_record_set_name)
+        record_set = self._record_sets.setdefault(
+            (zone_name, name_key),
+            _RecordSet(resource_name, zone_name, relative_record_set_name))
+        ip_addresses = private_dns_zone_configs.apply(
+            lambda configs: zone_ip_addresses(configs, zone_name))
+        record_set.ip_addresses.append(ip_addresses)
+        record_set.depends_on.extend(depends_on or [])
+        return ip_addresses
+
+    def create_record_sets(self) -> Dict[str, Any]:
+        """
+        Create a record set per zone and name with all the IPs added to it.
+
+        Returns:
+            Dict[str, network.PrivateRecordSet]: The record sets by resource name.
+        """
+        record_sets: Dict[str, Any] = {}
+        for record_set in self._record_sets.values():
+            a_records = Output.all(*record_set.ip_addresses).apply(
+                lambda ip_lists: [
+                    network.ARecordArgs(ipv4_address=ip_address)
+                    for ip_address in sorted({ip for ip_list in ip_lists for ip in ip_list})
+                ])
+            record_sets[record_set.resource_name] = network.PrivateRecordSet(
+                record_set.resource_name,
+                a_records=a_records,
+                record_type=RECORDSET_TYPE,
+                relative_record_set_name=record_set.relative_record_set_name,
+                resource_group_name=self.resource_group_name,
+                ttl=RECORDSET_TTL,
+                private_zone_name=record_set.zone_name,
+                # A record set moved to another zone keeps its relative name, so the new one
+                # would collide with the old one until it is deleted.
+                opts=ResourceOptions.merge(
+                    self.opts,
+                    ResourceOptions(depends_on=record_set.depends_on, delete_before_replace=True))
+            )
+        return record_sets
@@ -0,0 +1,227 @@
+"""
+This module estimates how long a change of a stack config takes to deploy.
+
+The resource graphs of the current and the proposed config are captured with mocks (see
+`resource_graph`), the resources are classified as created, updated, unchanged or deleted,
+and Pulumi's scheduler is simulated over the graph at a given `--parallel`, with the
+historical duration of each resource type:
+
+    python -m azenv_deploy.azenv_deploy.estimator --stack dev --since HEAD \\
+        --timeline fleet-logs/*.timeline.csv --parallel 4 8 16
+
+compares the working copy of `Pulumi.dev.yaml` with its last commit, and prints e.g.
+"adds 12 Compute, 3 PrivateEndpoint" with the expected wall-clock time at each parallelism.
+"""
+import argparse
+import csv
+import heapq
+import sys
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Optional
+from .replay import parse_stack_config
+from .resource_graph import ResourceGraph, graph_from_replay, load_durations
+from .timeline import ResourceSpan, mean_durations
+from .update_planner import git_stack_file
+
+OP_CREATE = "create"
+OP_UPDATE = "update"
+OP_SAME = "same"
+OP_DELETE = "delete"
+
+@dataclass
+class Estimate:
+    """
+    The changes of a deployment and its expected duration.
+    """
+    # The operation and the type of the custom resources of the proposed config, by URN.
+    ops: Dict[str, str]
+    types: Dict[str, str]
+    # The type of the deleted custom resources, by URN.
+    deleted: Dict[str, str] = field(default_factory=dict)
+    durations_s: Dict[Optional[int], float] = field(default_factory=dict)
+
+    def counts(self, op: str) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: The number of resources with an operation, by short type name,
+                e.g. `Compute`.
+        """
+        types = list(self.deleted.values()) if op == OP_DELETE else [
+            self.types[urn] for urn, urn_op in self.ops.items() if urn_op == op]
+        counts: Dict[str, int] = {}
+        for typ in types:
+            short_type = typ.split(":")[-1]
+            counts[short_type] = counts.get(short_type, 0) + 1
+        return dict(sorted(counts.items()))
+
+def durations_from_timelines(paths: Iterable[str]) -> Dict[str, float]:
+    """
+    Learn the mean duration of each resource type from timeline CSV files.
+    """
+    spans: List[ResourceSpan] = []
+    for path in paths:
+        with open(path, encoding="utf-8", newline="") as csv_file:
+            for row in csv.DictReader(csv_file):
+                spans.append(ResourceSpan(
+                    urn=row["urn"], type=row["type"], op=row["op"], status=row["status"],
+                    start_s=float(row["start_s"]),
+                    finish_s=float(row["finish_s"]) if row["finish_s"] else None))
+    return mean_durations(spans)
+
+def classify(proposed: ResourceGraph, current: Optional[ResourceGraph]) -> Dict[str, str]:
+    """
+    Returns:
+        Dict[str, str]: The operation of each resource of the proposed graph, by URN.
+    """
+    ops: Dict[str, str] = {}
+    for urn, node in proposed.nodes.items():
+        if current is None or urn not in current.nodes:
+            ops[urn] = OP_CREATE
+        elif current.nodes[urn].inputs != node.inputs:
+            ops[urn] = OP_UPDATE
+        else:
+            ops[urn] = OP_SAME
+    return ops
+
+def simulate(
+        graph: ResourceGraph,
+        durations: Dict[str, float],
+        parallel: Optional[int] = None) -> float:
+    """
+    Simulate the step executor of Pulumi: a resource starts once all its dependencies are
+    done and one of the `parallel` slots is free, in registration order.
+
+    Args:
+        graph (ResourceGraph): The resources to deploy.
+        durations (Dict[str, float]): The duration of each resource, by URN.
+        parallel (Optional[int]): The number of concurrent operations, unbounded if `None`.
+
+    Returns:
+        float: The wall-clock duration of the deployment, in seconds.
+
+    Raises:
+        (ValueError): `parallel` is lower than 1.
+    """
+    if parallel is not None and parallel < 1:
+        raise ValueError(f"`parallel` must be at least 1, got {parallel}.")
+    priority = {urn: index for index, urn in enumerate(graph.nodes)}
+    waiting = {urn: {dependency for dependency in node.dependencies if dependency in graph.nodes}
+               for urn, node in graph.nodes.items()}
+    dependents: Dict[str, List[str]] = {urn: [] for urn in graph.nodes}
+    for urn, dependencies in waiting.items():
+        for dependency in dependencies:
+            dependents[dependency].append(urn)
+    ready = [(priority[urn], urn) for urn, dependencies in waiting.items() if not dependencies]
+    heapq.heapify(ready)
+    running: List[tuple] = []
+    now = 0.0
+    while ready or running:
+        while ready and (parallel is None or len(running) < parallel):
+            _, urn = heapq.heappop(ready)
+            heapq.heappush(running, (now + durations.get(urn, 0.0), priority[urn], urn))
+        now, _, done = heapq.heappop(running)
+        for dependent in dependents[done]:
+            waiting[dependent].discard(done)
+            if not waiting[dependent]:
+                heapq.heappush(ready, (priority[dependent], dependent))
+    return now
+
+def estimate(
+        proposed: ResourceGraph,
+        current: Optional[ResourceGraph],
+        durations: Dict[str, float],
+        parallels: Iterable[Optional[int]]) -> Estimate:
+    """
+    Estimate the deployment of a proposed graph over the current one.
+
+    Args:
+        proposed (ResourceGraph): The graph of the proposed config.
+        current (Optional[ResourceGraph]): The graph of the deployed config, `None` for a
+            new stack.
+        durations (Dict[str, float]): The provisioning times by type or URN.
+        parallels (Iterable[Optional[int]]): The `--parallel` values to simulate.
+
+    Returns:
+        Estimate: The changes and the duration at each parallelism.
+    """
+    ops = classify(proposed, current)
+    # Unchanged resources only cost a diff, which is not worth simulating.
+    step_durations = {
+        urn: 0.0 if op == OP_SAME else proposed.duration(urn, durations)
+        for urn, op in ops.items()
+    }
+    deleted = {} if current is None else {
+        urn: node.type for urn, node in current.nodes.items()
+        if urn not in proposed.nodes and node.custom}
+    # Deletions run once the creations and updates are done.
+    deletions = ResourceGraph([replace(current.nodes[urn], dependencies=[])
+                               for urn in deleted]) if deleted else None
+    custom = [urn for urn, node in proposed.nodes.items() if node.custom]
+    result = Estimate(
+        ops={urn: ops[urn] for urn in custom},
+        types={urn: proposed.nodes[urn].type for urn in custom},
+        deleted=deleted)
+    for parallel in parallels:
+        duration = simulate(proposed, step_durations, parallel)
+        if deletions is not None:
+            duration += simulate(deletions, {
+                urn: deletions.duration(urn, durations) for urn in deletions.nodes}, parallel)
+        result.durations_s[parallel] = duration
+    return result
+
+def format_estimate(result: Estimate) -> str:
+    """
+    Returns:
+        str: The changes and the expected duration at each parallelism.
+    """
+    changes = []
+    for op, verb in ((OP_CREATE, "adds"), (OP_UPDATE, "updates"), (OP_DELETE, "deletes")):
+        counts = result.counts(op)
+        if counts:
+            changes.append(f"{verb} " + ", ".join(f"{count} {typ}"
+                                                  for typ, count in counts.items()))
+    lines = [f"this change {'; '.join(changes) if changes else 'changes nothing'}"]
+    for parallel, duration in result.durations_s.items():
+        label = "unbounded" if parallel is None else str(parallel)
+        lines.append(f"  --parallel {label:>9}: {duration / 60:6.1f} min")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Estimate the deployment time of a stack config change.
+    """
+    parser = argparse.ArgumentParser(description="Estimate how long a config change deploys.")
+    parser.add_argument("--project-dir", default="projects/dev")
+    parser.add_argument("--stack", required=True)
+    parser.add_argument("--proposed", help="The proposed stack file, defaults to the current.")
+    current_group = parser.add_mutually_exclusive_group()
+    current_group.add_argument("--current", help="The deployed stack file.")
+    current_group.add_argument("--since", help="Read the deployed stack file at a git ref.")
+    parser.add_argument("--fixtures", help="Recorded invokes, see `replay`.")
+    parser.add_argument("--durations", help="Provisioning times in seconds by type or URN.")
+    parser.add_argument("--timeline", nargs="*", default=[],
+                        help="Timeline CSV files to learn the provisioning times from.")
+    parser.add_argument("--parallel", nargs="*", type=int, default=[],
+                        help="The `--parallel` values to simulate, unbounded by default.")
+    options = parser.parse_args(argv)
+
+    def read(path: str) -> str:
+        with open(path, encoding="utf-8") as stack_file:
+            return stack_file.read()
+
+    durations = load_durations(options.durations)
+    durations.update(durations_from_timelines(options.timeline))
+    proposed_path = options.proposed or f"{options.project_dir}/Pulumi.{options.stack}.yaml"
+    proposed = graph_from_replay(options.project_dir, options.stack, options.fixtures,
+                                 config=parse_stack_config(read(proposed_path)), strict=False)
+    current = None
+    if options.current or options.since:
+        content = read(options.current) if options.current \
+            else git_stack_file(options.project_dir, options.stack, options.since)
+        current = graph_from_replay(options.project_dir, options.stack, options.fixtures,
+                                    config=parse_stack_config(content), strict=False)
+    print(format_estimate(estimate(proposed, current, durations, options.parallel or [None])))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
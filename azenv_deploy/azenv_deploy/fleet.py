@@ -0,0 +1,275 @@
+"""
+This module rolls a change across a fleet of AzureML stacks with the Pulumi Automation API.
+
+The fleet is described by a YAML or JSON manifest. Each stack lists the config that
+`projects/dev/config.py` turns into an `AzEnvConfig`:
+
+    project_dir: projects/dev
+    stacks:
+      - name: team-a
+        config:
+          prefix: teama
+          enable_private_endpoints: true
+          common:
+            resource_group_name: rg-team-a
+            ...
+          azureml:
+            compute_instance_config: ...
+        secrets:
+          some_secret: value
+
+Usage:
+
+    python -m azenv_deploy.azenv_deploy.fleet fleet.yaml preview --workers 4
+
+Every stack runs in a bounded process pool, writes its engine output to
+`<log dir>/<stack>.<operation>.log`, and a summary of all the stacks is printed at the end.
+`up` and `destroy` also write the per-resource timeline of the stack to
+`<log dir>/<stack>.<operation>.timeline.csv`.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import yaml
+from .timeline import TimelineRecorder, write_csv
+
+OPERATIONS = ("preview", "up", "destroy")
+DEFAULT_PROJECT_DIR = os.path.join("projects", "dev")
+DEFAULT_LOG_DIR = "fleet-logs"
+DEFAULT_WORKERS = 4
+
+@dataclass
+class FleetStack:
+    """
+    A stack of the fleet and the config of its `AzEnvConfig`.
+    """
+    name: str
+    config: Dict[str, Any] = field(default_factory=dict)
+    secrets: Dict[str, Any] = field(default_factory=dict)
+    project_dir: Optional[str] = None
+    # Stacks run stage by stage, e.g. a core stack at stage 0 before its compute shards.
+    stage: int = 0
+
+@dataclass
+class FleetManifest:
+    """
+    The stacks of the fleet and the Pulumi project they are deployed with.
+    """
+    stacks: List[FleetStack]
+    project_dir: str = DEFAULT_PROJECT_DIR
+
+@dataclass
+class StackResult:
+    """
+    The outcome of an operation on a stack.
+    """
+    name: str
+    operation: str
+    succeeded: bool
+    duration_s: float
+    log_path: str
+    changes: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+def load_manifest(path: str) -> FleetManifest:
+    """
+    Load a fleet manifest. Relative project directories are resolved from the manifest.
+
+    Raises:
+        (ValueError): The manifest has no stacks, or a stack name is missing or repeated.
+    """
+    with open(path, encoding="utf-8") as manifest_file:
+        raw = yaml.safe_load(manifest_file) or {}
+    base_dir = os.path.dirname(os.path.abspath(path))
+    project_dir = os.path.join(base_dir, raw.get("project_dir", DEFAULT_PROJECT_DIR))
+
+    stacks: List[FleetStack] = []
+    for raw_stack in raw.get("stacks") or []:
+        stack = FleetStack(**raw_stack)
+        if not stack.name:
+            raise ValueError("Every stack of the fleet manifest needs a `name`.")
+        if stack.project_dir:
+            stack.project_dir = os.path.join(base_dir, stack.project_dir)
+        stacks.append(stack)
+    if not stacks:
+        raise ValueError(f"The fleet manifest `{path}` has no stacks.")
+    names = [stack.name for stack in stacks]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Stacks are listed more than once: {', '.join(duplicates)}.")
+    return FleetManifest(stacks=stacks, project_dir=project_dir)
+
+def config_value(value: Any) -> str:
+    """
+    Serialize a config value the way `pulumi config set` stores it, i.e. objects as JSON so
+    `Config.require_object` can parse them back.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return json.dumps(value)
+
+def _change_counts(changes: Optional[Dict[Any, int]]) -> Dict[str, int]:
+    # The Automation API keys the changes by `OpType`.
+    return {getattr(op, "value", str(op)): count for op, count in (changes or {}).items()}
+
+def _run_operation(
+        workspace_stack: Any,
+        operation: str,
+        parallel: Optional[int],
+        on_output: Callable[[str], None],
+        timeline_path: str) -> Optional[Dict[Any, int]]:
+    if operation == "preview":
+        return workspace_stack.preview(parallel=parallel, on_output=on_output).change_summary
+    recorder = TimelineRecorder()
+    run = workspace_stack.up if operation == "up" else workspace_stack.destroy
+    try:
+        return run(parallel=parallel, on_output=on_output,
+                   on_event=recorder.on_event).summary.resource_changes
+    finally:
+        write_csv(recorder.sorted_spans(), timeline_path)
+
+def run_stack(
+        stack: FleetStack,
+        operation: str,
+        project_dir: str,
+        log_dir: str,
+        parallel: Optional[int] = None) -> StackResult:
+    """
+    Run an operation on a single stack. This is the unit of work of the process pool.
+    """
+    # The Automation API is imported in the worker only, so the manifest checks stay fast.
+    from pulumi import automation as auto # pylint: disable=import-outside-toplevel
+
+    log_path = os.path.join(log_dir, f"{stack.name.replace('/', '_')}.{operation}.log")
+    start = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        def on_output(line: str) -> None:
+            log_file.write(line + "\n")
+            log_file.flush()
+
+        try:
+            workspace_stack = auto.create_or_select_stack(
+                stack_name=stack.name, work_dir=stack.project_dir or project_dir)
+            config = {key: auto.ConfigValue(value=config_value(value))
+                      for key, value in stack.config.items()}
+            config.update({key: auto.ConfigValue(value=config_value(value), secret=True)
+                           for key, value in stack.secrets.items()})
+            workspace_stack.set_all_config(config)
+
+            changes = _run_operation(workspace_stack, operation, parallel, on_output,
+                                     log_path[:-len(".log")] + ".timeline.csv")
+        except Exception as error: # pylint: disable=broad-exception-caught
+            # One broken stack must not stop the rest of the fleet.
+            log_file.write(traceback.format_exc())
+            message = str(error).strip()
+            return StackResult(stack.name, operation, False, time.monotonic() - start, log_path,
+                               error=message.splitlines()[-1] if message else type(error).__name__)
+    return StackResult(stack.name, operation, True, time.monotonic() - start, log_path,
+                       changes=_change_counts(changes))
+
+def _skipped(stack: FleetStack, operation: str, failed: List[str]) -> StackResult:
+    return StackResult(stack.name, operation, False, 0.0, "",
+                       error=f"skipped, an earlier stage failed: {', '.join(failed)}")
+
+def _result(future: Future, name: str, operation: str) -> StackResult:
+    # `run_stack` reports its own errors, but the worker process itself can still die.
+    try:
+        return future.result()
+    except Exception as error: # pylint: disable=broad-exception-caught
+        return StackResult(name, operation, False, 0.0, "",
+                           error=str(error).strip() or type(error).__name__)
+
+def run_fleet( # pylint: disable=too-many-arguments
+        manifest: FleetManifest,
+        operation: str,
+        *,
+        workers: int = DEFAULT_WORKERS,
+        log_dir: str = DEFAULT_LOG_DIR,
+        parallel: Optional[int] = None,
+        runner: Callable[..., StackResult] = run_stack) -> List[StackResult]:
+    """
+    Run an operation on every stack of the fleet, at most `workers` stacks at a time. The
+    stages run in order, and `destroy` runs them in reverse order. Once a stack of a stage
+    fails, the later stages are skipped and their stacks reported as failed.
+
+    Returns:
+        List[StackResult]: The results, in the manifest order.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation `{operation}`, expected one of {OPERATIONS}.")
+    os.makedirs(log_dir, exist_ok=True)
+    results: Dict[str, StackResult] = {}
+    stages = sorted({stack.stage for stack in manifest.stacks},
+                    reverse=operation == "destroy")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for stage in stages:
+            failed = sorted(name for name, result in results.items() if not result.succeeded)
+            if failed:
+                results.update({stack.name: _skipped(stack, operation, failed)
+                                for stack in manifest.stacks if stack.stage == stage})
+                continue
+            futures = {
+                executor.submit(runner, stack, operation, manifest.project_dir, log_dir,
+                                parallel): stack.name
+                for stack in manifest.stacks if stack.stage == stage
+            }
+            for future in as_completed(futures):
+                result = _result(future, futures[future], operation)
+                results[futures[future]] = result
+                status = "ok" if result.succeeded else "FAILED"
+                print(f"[{len(results)}/{len(manifest.stacks)}] {result.name}: {status} "
+                      f"in {result.duration_s:.0f}s", flush=True)
+    return [results[stack.name] for stack in manifest.stacks]
+
+def format_summary(results: List[StackResult]) -> str:
+    """
+    Returns:
+        str: A table with the status, duration and changes of every stack.
+    """
+    width = max([len("stack")] + [len(result.name) for result in results])
+    lines = [f"{'stack':<{width}}  {'status':<6}  {'time':>7}  changes"]
+    for result in results:
+        changes = ", ".join(f"{op}={count}" for op, count in sorted(result.changes.items()))
+        details = changes if result.succeeded else result.error
+        if not result.succeeded and result.log_path:
+            details += f" (see {result.log_path})"
+        lines.append(f"{result.name:<{width}}  {'ok' if result.succeeded else 'failed':<6}  "
+                     f"{result.duration_s:>6.0f}s  {details}")
+    failed = sum(1 for result in results if not result.succeeded)
+    lines.append(f"{len(results) - failed} succeeded, {failed} failed")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run an operation across the fleet.
+    """
+    parser = argparse.ArgumentParser(description="Run preview/up/destroy across AzureML stacks.")
+    parser.add_argument("manifest", help="The YAML or JSON fleet manifest.")
+    parser.add_argument("operation", choices=OPERATIONS)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="The number of stacks running at the same time.")
+    parser.add_argument("--parallel", type=int, default=None,
+                        help="The `--parallel` value of each stack operation.")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR)
+    parser.add_argument("--stack", action="append", default=None,
+                        help="Only run these stacks. Can be repeated.")
+    options = parser.parse_args(argv)
+
+    manifest = load_manifest(options.manifest)
+    if options.stack:
+        manifest.stacks = [stack for stack in manifest.stacks if stack.name in options.stack]
+    results = run_fleet(manifest, options.operation, workers=options.workers,
+                        log_dir=options.log_dir, parallel=options.parallel)
+    print(format_summary(results))
+    return 0 if all(result.succeeded for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+This module configures the image builds of the AzureML workspace: a compute cluster of
+`compute_cluster_config` building the environment images, and environments prebuilt at
+deploy time, so the first job of a fresh workspace doesn't wait for its image build:
+
+    dev:azureml:
+      image_build:
+        compute: image-build
+        environments:
+          pytorch-train:
+            version: "3"
+            source_location: https://github.com/my-org/environments.git#main:pytorch-train
+
+Each environment is built from its Docker build context by an ACR task run, pushed to the
+workspace registry as `azureml-prebuilt/<name>:<version>`, and registered as version
+`version` of the workspace environment `<name>`, using that image. The image is rebuilt
+when `version` changes.
+
+The image build compute is a setting of `Microsoft.MachineLearningServices` workspaces, so
+the workspace is created as one when `image_build` is set.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+PREBUILT_REPOSITORY = "azureml-prebuilt"
+# Environment names and versions of the workspace.
+ENVIRONMENT_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9_.-]{0,254}$")
+ENVIRONMENT_VERSION_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9_.-]{0,29}$")
+
+@dataclass
+class PrebuiltEnvironment:
+    """
+    An environment built at deploy time from a Docker build context.
+    """
+    version: str
+    # A git repository, e.g. `https://github.com/org/repo.git#branch:folder`, or the URL of
+    # a tarball of the context.
+    source_location: str
+    dockerfile_path: str = "Dockerfile"
+
+@dataclass
+class ImageBuildConfig:
+    """
+    A class for configuring the image builds of the workspace.
+
+    Attributes:
+        compute (str): The `compute_cluster_config` entry building the environment images.
+        environments (Dict[str, PrebuiltEnvironment]): The environments to prebuild, by name.
+        agent_pool (Optional[str]): The ACR agent pool running the prebuilds, needed when the
+            registry is only reachable through private endpoints.
+    """
+    compute: str
+    environments: Dict[str, PrebuiltEnvironment] = field(default_factory=dict)
+    agent_pool: Optional[str] = None
+
+    def __post_init__(self):
+        errors = validate_environments(self.environments)
+        if errors:
+            raise ValueError(" ".join(errors))
+
+    @classmethod
+    def from_config(
+            cls,
+            config: Union["ImageBuildConfig", Dict[str, Any], None]
+    ) -> Optional["ImageBuildConfig"]:
+        """Build an image build config from the stack config, which may be a plain dict."""
+        if isinstance(config, dict):
+            return cls(
+                compute=config["compute"],
+                environments={name: PrebuiltEnvironment(**environment) for name, environment
+                              in (config.get("environments") or {}).items()},
+                agent_pool=config.get("agent_pool"))
+        return config
+
+def validate_environments(environments: Dict[str, PrebuiltEnvironment]) -> List[str]:
+    """
+    Returns:
+        List[str]: The invalid environment names and versions.
+    """
+    errors = []
+    for name, environment in environments.items():
+        if not ENVIRONMENT_NAME_PATTERN.match(name):
+            errors.append(f"environment `{name}`: invalid name, expected letters, digits, "
+                          "`_`, `.` or `-`.")
+        if not ENVIRONMENT_VERSION_PATTERN.match(str(environment.version)):
+            errors.append(f"environment `{name}`: invalid version `{environment.version}`.")
+    return errors
+
+def prebuilt_image(name: str, environment: PrebuiltEnvironment) -> str:
+    """
+    Returns:
+        str: The repository and tag of the prebuilt image of an environment.
+    """
+    return f"{PREBUILT_REPOSITORY}/{name}:{environment.version}"
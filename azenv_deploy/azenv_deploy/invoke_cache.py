@@ -0,0 +1,437 @@
+"""
+This module provides a program-wide cache for Pulumi invokes, such as subnet, private DNS
+zone, client config and user lookups, so each distinct lookup only runs once per
+`pulumi preview`/`up`.
+
+Slow, rarely-changing lookups can also be persisted on disk with a TTL per invoke token,
+so repeated previews of the same stack skip the ARM/Graph round-trips.
+
+Invoke results can also be recorded to a fixture file during a real preview, e.g.
+`AZENV_RECORD_INVOKES=invokes.json pulumi preview`, and replayed offline with
+`azenv_deploy.azenv_deploy.replay`.
+"""
+import hashlib
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, TypeVar
+import pulumi
+from pulumi.runtime import settings
+from .lazy_imports import lazy_import
+
+network = lazy_import("pulumi_azure_native.network")
+authorization = lazy_import("pulumi_azure_native.authorization")
+azuread = lazy_import("pulumi_azuread")
+
+GET_SUBNET_TOKEN = "azure-native:network:getSubnet"
+GET_PRIVATE_ZONE_TOKEN = "azure-native:network:getPrivateZone"
+GET_CLIENT_CONFIG_TOKEN = "azure-native:authorization:getClientConfig"
+GET_USERS_TOKEN = "azuread:index/getUsers:getUsers"
+
+# The result fields persisted in the disk cache for each invoke token. Only the fields that
+# the components read are kept, so entries stay small and JSON-serializable.
+PERSISTED_FIELDS: Dict[str, Tuple[str, ...]] = {
+    GET_SUBNET_TOKEN: ("id", "name", "address_prefix", "address_prefixes"),
+    GET_PRIVATE_ZONE_TOKEN: ("id", "name"),
+    GET_CLIENT_CONFIG_TOKEN: ("client_id", "object_id", "subscription_id", "tenant_id"),
+    GET_USERS_TOKEN: ("object_ids", "user_principal_names"),
+}
+
+# Default time to live of the disk cache entries, in seconds.
+DEFAULT_TTL_SECONDS: Dict[str, int] = {
+    GET_SUBNET_TOKEN: 24 * 3600,
+    GET_PRIVATE_ZONE_TOKEN: 24 * 3600,
+    GET_CLIENT_CONFIG_TOKEN: 3600,
+    GET_USERS_TOKEN: 24 * 3600,
+}
+
+# Setting this environment variable to `true` ignores the existing disk cache entries and
+# refreshes them, e.g. `AZENV_REFRESH_CACHE=true pulumi preview`.
+REFRESH_CACHE_ENV = "AZENV_REFRESH_CACHE"
+
+# Setting this environment variable to a file path records every invoke result to it.
+RECORD_INVOKES_ENV = "AZENV_RECORD_INVOKES"
+
+T = TypeVar("T")
+
+class _Uncacheable(Exception):
+    """Raised when an invoke argument can't be used as part of a cache key."""
+
+def _freeze(value: Any) -> Hashable:
+    """Turn an invoke argument into a hashable value, or raise `_Uncacheable`."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    # Outputs and other unresolved inputs are only known at runtime.
+    raise _Uncacheable(type(value).__name__)
+
+def make_key(token: str, args: Dict[str, Any]) -> Optional[Tuple[str, Hashable]]:
+    """
+    Build the cache key of an invoke.
+
+    Args:
+        token (str): The invoke token, e.g. `azure-native:network:getSubnet`.
+        args (Dict[str, Any]): The invoke arguments.
+
+    Returns:
+        The cache key, or `None` when any argument is not a plain value.
+    """
+    try:
+        return (token, _freeze(args))
+    except _Uncacheable:
+        return None
+
+class CachedInvokeResult(SimpleNamespace): # pylint: disable=too-few-public-methods
+    """
+    The result of an invoke loaded from the disk cache. Only the persisted fields are set.
+    """
+
+def find_stack_directory(start: Optional[str] = None) -> str:
+    """
+    Find the directory holding the local Pulumi state, i.e. the parent of `.pulumi/`.
+
+    Args:
+        start (Optional[str]): The directory to search from. Defaults to the current directory.
+
+    Returns:
+        str: The closest ancestor containing `.pulumi/`, or `start` when none is found.
+    """
+    start = os.path.abspath(start or os.getcwd())
+    directory = start
+    while True:
+        if os.path.isdir(os.path.join(directory, ".pulumi")):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return start
+        directory = parent
+
+class DiskCache:
+    """
+    Persists invoke results as JSON files, one file per token and arguments.
+    """
+    def __init__(
+            self,
+            directory: str,
+            ttl_seconds: Optional[Dict[str, int]] = None,
+            refresh: bool = False):
+        """
+        Args:
+            directory (str): The directory of the cache entries.
+            ttl_seconds (Optional[Dict[str, int]]): Overrides of `DEFAULT_TTL_SECONDS`.
+                A TTL of 0 disables the disk cache for that token.
+            refresh (bool): Ignore the existing entries and rewrite them.
+        """
+        self.directory = directory
+        self.ttl_seconds = {**DEFAULT_TTL_SECONDS, **(ttl_seconds or {})}
+        self.refresh = refresh
+
+    def is_cached_token(self, token: str) -> bool:
+        """Whether results of the token are persisted at all."""
+        return token in PERSISTED_FIELDS and self.ttl_seconds.get(token, 0) > 0
+
+    def _path(self, key: Tuple[str, Hashable]) -> str:
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, key: Tuple[str, Hashable]) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            The persisted fields of the entry, or `None` if it is missing or expired.
+        """
+        token = key[0]
+        if self.refresh or not self.is_cached_token(token):
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("stored_at", 0) > self.ttl_seconds[token]:
+            return None
+        return entry.get("fields")
+
+    def store(self, key: Tuple[str, Hashable], result: Any) -> None:
+        """Persist the fields of an invoke result."""
+        token = key[0]
+        if not self.is_cached_token(token):
+            return
+        entry = {
+            "token": token,
+            "args": key[1],
+            "stored_at": time.time(),
+            "fields": {field: getattr(result, field, None) for field in PERSISTED_FIELDS[token]}
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so a concurrent preview never reads half an entry.
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as entry_file:
+            json.dump(entry, entry_file)
+        os.replace(tmp_path, path)
+
+def wire_name(name: str) -> str:
+    """
+    Returns:
+        str: The camelCase name of an invoke argument or result field on the wire,
+            e.g. `resourceGroupName` for `resource_group_name`.
+    """
+    head, *tail = name.split("_")
+    return head + "".join(part[:1].upper() + part[1:] for part in tail)
+
+def wire_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns:
+        Dict[str, Any]: The invoke arguments as sent to the engine, i.e. with camelCase
+            names and without the `None` values.
+    """
+    return {wire_name(name): value for name, value in args.items() if value is not None}
+
+class InvokeRecorder: # pylint: disable=too-few-public-methods
+    """
+    Records invoke results to a JSON fixture file, so they can be replayed by mocks.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The fixture file, rewritten after every new invoke.
+        """
+        self.path = path
+        self.invokes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, token: str, args: Dict[str, Any], result: Any) -> None:
+        """Record the persisted fields of an invoke result, with wire names."""
+        entry = {
+            "token": token,
+            "args": wire_args(args),
+            "result": {
+                wire_name(field): getattr(result, field, None)
+                for field in PERSISTED_FIELDS.get(token, ())
+            }
+        }
+        self.invokes[json.dumps([token, entry["args"]], sort_keys=True)] = entry
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fixture_file:
+            json.dump({"invokes": [self.invokes[key] for key in sorted(self.invokes)]},
+                      fixture_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+class InvokeCache:
+    """
+    Memoizes invoke results by token and arguments, and counts hits and misses per token.
+    Results are also persisted through an optional `DiskCache`.
+    """
+    def __init__(self):
+        self._entries: Dict[Tuple[str, Hashable], Any] = {}
+        self._monitor: Any = None
+        self.disk: Optional[DiskCache] = None
+        self.recorder: Optional[InvokeRecorder] = None
+        self.hits: Dict[str, int] = {}
+        self.disk_hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def _check_run(self) -> None:
+        # Entries hold Outputs of a single Pulumi run. A new monitor means a new run
+        # (e.g. `set_mocks` in unit tests), so the entries must not leak into it.
+        monitor = settings.get_monitor()
+        if monitor is not self._monitor:
+            self.clear()
+            self._monitor = monitor
+
+    def get_or_invoke(
+            self,
+            token: str,
+            args: Dict[str, Any],
+            invoke: Callable[[], T],
+            output: bool = False) -> T:
+        """
+        Return the cached result of an invoke, or run it and cache the result.
+
+        Args:
+            token (str): The invoke token.
+            args (Dict[str, Any]): The invoke arguments.
+            invoke (Callable[[], T]): Runs the invoke when there is no cached result.
+            output (bool): Whether `invoke` returns an `Output`, i.e. is an output-form invoke.
+
+        Returns:
+            The result of the invoke.
+        """
+        self._check_run()
+        key = make_key(token, args)
+        if key is not None and key in self._entries:
+            self.hits[token] = self.hits.get(token, 0) + 1
+            return self._entries[key]
+
+        if key is not None and self.disk is not None:
+            fields = self.disk.load(key)
+            if fields is not None:
+                self.disk_hits[token] = self.disk_hits.get(token, 0) + 1
+                result = CachedInvokeResult(**fields)
+                if output:
+                    result = pulumi.Output.from_input(result)
+                self._entries[key] = result
+                self._record(token, args, result, output)
+                return result
+
+        self.misses[token] = self.misses.get(token, 0) + 1
+        result = invoke()
+        if key is not None:
+            self._entries[key] = result
+            if self.disk is not None:
+                disk = self.disk
+                if output:
+                    result.apply(lambda value: disk.store(key, value))
+                else:
+                    disk.store(key, result)
+            self._record(token, args, result, output)
+        return result
+
+    def _record(self, token: str, args: Dict[str, Any], result: Any, output: bool) -> None:
+        if self.recorder is None:
+            return
+        recorder = self.recorder
+        if output:
+            result.apply(lambda value: recorder.record(token, args, value))
+        else:
+            recorder.record(token, args, result)
+
+    def clear(self) -> None:
+        """Drop all the cached results and reset the counters."""
+        self._entries.clear()
+        self.hits.clear()
+        self.disk_hits.clear()
+        self.misses.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            Dict[str, Dict[str, int]]: The number of hits and misses of each invoke token.
+        """
+        return {
+            token: {
+                "hits": self.hits.get(token, 0),
+                "disk_hits": self.disk_hits.get(token, 0),
+                "misses": self.misses.get(token, 0)
+            }
+            for token in sorted(set(self.hits) | set(self.disk_hits) | set(self.misses))
+        }
+
+    def log_stats(self) -> None:
+        """Log the hit and miss counters of the cache."""
+        for token, counters in self.stats().items():
+            pulumi.log.debug(
+                f"invoke cache {token}: {counters['hits']} hits, "
+                f"{counters['disk_hits']} disk hits, {counters['misses']} misses")
+
+# The cache shared by all the components of a Pulumi program.
+INVOKE_CACHE = InvokeCache()
+
+def enable_disk_cache(
+        stack: str,
+        directory: Optional[str] = None,
+        ttl_seconds: Optional[Dict[str, int]] = None,
+        refresh: Optional[bool] = None) -> DiskCache:
+    """
+    Persist the results of `INVOKE_CACHE` on disk.
+
+    Args:
+        stack (str): The stack name, used to keep the entries of each stack apart.
+        directory (Optional[str]): The cache directory. Defaults to `.invoke-cache/<stack>`
+            next to the `.pulumi/` state directory.
+        ttl_seconds (Optional[Dict[str, int]]): The TTL of each invoke token, in seconds.
+        refresh (Optional[bool]): Refresh all the entries. Defaults to the value of the
+            `AZENV_REFRESH_CACHE` environment variable.
+
+    Returns:
+        DiskCache: The disk cache used by `INVOKE_CACHE`.
+    """
+    if refresh is None:
+        refresh = os.environ.get(REFRESH_CACHE_ENV, "").lower() in ("1", "true", "yes")
+    if directory is None:
+        directory = os.path.join(find_stack_directory(), ".invoke-cache", stack)
+    INVOKE_CACHE.disk = DiskCache(directory, ttl_seconds=ttl_seconds, refresh=refresh)
+    return INVOKE_CACHE.disk
+
+def enable_recording(path: str) -> InvokeRecorder:
+    """
+    Record the results of the invokes of `INVOKE_CACHE` to a fixture file.
+
+    Args:
+        path (str): The fixture file.
+
+    Returns:
+        InvokeRecorder: The recorder used by `INVOKE_CACHE`.
+    """
+    INVOKE_CACHE.recorder = InvokeRecorder(path)
+    return INVOKE_CACHE.recorder
+
+def get_subnet_output(
+        resource_group_name: pulumi.Input[str],
+        virtual_network_name: pulumi.Input[str],
+        subnet_name: pulumi.Input[str]) -> "pulumi.Output[network.GetSubnetResult]":
+    """Cached `network.get_subnet_output`."""
+    args = {
+        "resource_group_name": resource_group_name,
+        "virtual_network_name": virtual_network_name,
+        "subnet_name": subnet_name
+    }
+    return INVOKE_CACHE.get_or_invoke(
+        GET_SUBNET_TOKEN, args, lambda: network.get_subnet_output(**args), output=True)
+
+def get_private_zone_output(
+        private_zone_name: pulumi.Input[str],
+        resource_group_name: pulumi.Input[str]) -> "pulumi.Output[network.GetPrivateZoneResult]":
+    """Cached `network.get_private_zone_output`."""
+    args = {
+        "private_zone_name": private_zone_name,
+        "resource_group_name": resource_group_name
+    }
+    return INVOKE_CACHE.get_or_invoke(
+        GET_PRIVATE_ZONE_TOKEN, args, lambda: network.get_private_zone_output(**args),
+        output=True)
+
+def get_client_config() -> "authorization.GetClientConfigResult":
+    """Cached `authorization.get_client_config`."""
+    return INVOKE_CACHE.get_or_invoke(
+        GET_CLIENT_CONFIG_TOKEN, {}, authorization.get_client_config)
+
+def get_users_output(
+        user_principal_names: Sequence[str]) -> "pulumi.Output[azuread.GetUsersResult]":
+    """Cached `azuread.get_users_output` by user principal names."""
+    args = {"user_principal_names": sorted(set(user_principal_names))}
+    return INVOKE_CACHE.get_or_invoke(
+        GET_USERS_TOKEN, args, lambda: azuread.get_users_output(**args), output=True)
+
+def _find_object_id(users: Any, user_principal_name: str) -> str:
+    # The lookup is case insensitive, so match the returned UPNs the same way.
+    object_ids: Dict[str, str] = dict(zip(
+        [upn.lower() for upn in users.user_principal_names or []],
+        users.object_ids or []))
+    object_id = object_ids.get(user_principal_name.lower())
+    if object_id is None:
+        raise ValueError(f"User `{user_principal_name}` can't be found in Azure AD.")
+    return object_id
+
+def get_user_object_ids(user_principal_names: List[str]) -> Dict[str, pulumi.Output[str]]:
+    """
+    Resolve the object IDs of many users with a single, non-blocking lookup.
+
+    Args:
+        user_principal_names (List[str]): The user principal names, e.g. emails.
+
+    Returns:
+        Dict[str, pulumi.Output[str]]: The object ID of each user principal name.
+    """
+    if not user_principal_names:
+        return {}
+    users = get_users_output(user_principal_names)
+    return {
+        upn: users.apply(lambda result, upn=upn: _find_object_id(result, upn))
+        for upn in user_principal_names
+    }
@@ -0,0 +1,70 @@
+"""
+This module defers the import of provider submodules, such as `pulumi_azure_native.network`,
+until a resource or invoke of that kind is actually used, and reports how long each
+deferred import took.
+"""
+import importlib
+import time
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+import pulumi
+
+# The time spent importing each lazily imported module, in seconds.
+IMPORT_TIMES: Dict[str, float] = {}
+
+class LazyModule(ModuleType):
+    """
+    A module placeholder that imports the real module on first attribute access.
+    """
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self.__name__)
+            # Provider packages register their own lazy placeholders in `sys.modules`, so
+            # touch an attribute to load the module now and time the real import.
+            hasattr(module, "__all__")
+            self._module = module
+            IMPORT_TIMES[self.__name__] = time.perf_counter() - start
+        return self._module
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._load(), item)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the real module has been imported."""
+        return self._module is not None
+
+def lazy_import(name: str) -> Any:
+    """
+    Return a placeholder of a module, imported when one of its attributes is first used.
+
+    Args:
+        name (str): The absolute module name, e.g. `pulumi_azure_native.network`.
+
+    Returns:
+        LazyModule: The module placeholder.
+    """
+    return LazyModule(name)
+
+def import_report() -> List[str]:
+    """
+    Returns:
+        List[str]: One line per lazily imported module, slowest first.
+    """
+    return [
+        f"{name}: {seconds * 1000:.0f} ms"
+        for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1])
+    ]
+
+def log_import_report() -> None:
+    """Log the time spent importing each lazily imported module."""
+    for line in import_report():
+        pulumi.log.debug(f"import time {line}")
@@ -0,0 +1,228 @@
+"""
+This module wires the telemetry of the AzureML component: a Log Analytics workspace backing
+the application insights, diagnostic settings of the storage accounts, registry, key vault
+and workspace, and metric alerts with configurable thresholds:
+
+    dev:azureml:
+      observability:
+        retention_in_days: 30
+        action_group_id: /subscriptions/.../actionGroups/ml-oncall
+        alerts:
+          storage_e2e_latency_ms: 100
+          storage_server_latency_ms: 50
+          key_vault_throttled_requests: 0
+
+The end-to-end latency of a storage account includes the network and the client, and its
+server latency only the storage service, so comparing both tells a slow storage service
+from a slow data path. The key vault throttling alert counts its `429` responses. An alert
+set to `null` is not created.
+
+The workspace diagnostic setting and the failed runs alert only apply to the
+`Microsoft.MachineLearningServices` workspace created with `image_build`, the classic
+workspace has neither the run events nor the run metrics.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pulumi import Input, Output, ResourceOptions
+from .constants import LOCATION
+from .lazy_imports import lazy_import
+
+insights = lazy_import("pulumi_azure_native.insights")
+operationalinsights = lazy_import("pulumi_azure_native.operationalinsights")
+
+DIAGNOSTIC_SETTING_NAME = "azenv-diagnostics"
+# The log and metric categories sent to Log Analytics, by kind of diagnostic target.
+DIAGNOSTIC_CATEGORIES: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    # Storage logs are settings of the services, with their transactions and latencies.
+    "blob": (("StorageRead", "StorageWrite", "StorageDelete"), ("Transaction",)),
+    "file": (("StorageRead", "StorageWrite", "StorageDelete"), ("Transaction",)),
+    # The registry metrics have the pull counts and throughput.
+    "acr": (("ContainerRegistryRepositoryEvents", "ContainerRegistryLoginEvents"),
+            ("AllMetrics",)),
+    # The key vault metrics have the API results, i.e. the throttled `429` ones, and latency.
+    "kv": (("AuditEvent",), ("AllMetrics",)),
+    # Only `Microsoft.MachineLearningServices` workspaces have the run events and metrics.
+    "ws": (("AmlComputeClusterEvent", "AmlComputeJobEvent", "AmlRunStatusChangedEvent"),
+           ("AllMetrics",)),
+}
+
+@dataclass(frozen=True)
+class AlertMetric:
+    """
+    The metric of an alert, and the kind of resource it is defined on.
+    """
+    target: str
+    namespace: str
+    metric_name: str
+    time_aggregation: str
+    description: str
+    # Metric dimension filters, e.g. `{"StatusCode": ["429"]}`.
+    dimensions: Dict[str, List[str]] = field(default_factory=dict)
+
+# The metric of each alert threshold of `AlertThresholds`.
+ALERT_METRICS = {
+    "storage_e2e_latency_ms": AlertMetric(
+        "storage", "Microsoft.Storage/storageAccounts", "SuccessE2ELatency", "Average",
+        "The average end-to-end latency of the storage requests, in ms."),
+    "storage_server_latency_ms": AlertMetric(
+        "storage", "Microsoft.Storage/storageAccounts", "SuccessServerLatency", "Average",
+        "The average server latency of the storage requests, in ms."),
+    "key_vault_throttled_requests": AlertMetric(
+        "kv", "Microsoft.KeyVault/vaults", "ServiceApiResult", "Count",
+        "The key vault requests throttled with a 429 response.",
+        {"StatusCode": ["429"]}),
+    "key_vault_latency_ms": AlertMetric(
+        "kv", "Microsoft.KeyVault/vaults", "ServiceApiLatency", "Average",
+        "The average latency of the key vault requests, in ms."),
+    "workspace_failed_runs": AlertMetric(
+        "ws", "Microsoft.MachineLearningServices/workspaces", "Failed Runs", "Total",
+        "The runs of the workspace that failed."),
+}
+
+@dataclass
+class AlertThresholds:
+    """
+    The thresholds of the metric alerts, over 5 minutes windows. `None` disables an alert.
+    """
+    storage_e2e_latency_ms: Optional[float] = 100
+    storage_server_latency_ms: Optional[float] = 50
+    key_vault_throttled_requests: Optional[float] = 0
+    key_vault_latency_ms: Optional[float] = 1000
+    workspace_failed_runs: Optional[float] = None
+
+@dataclass
+class ObservabilityConfig:
+    """
+    A class for configuring the telemetry of the AzureML component.
+
+    Attributes:
+        retention_in_days (int): The retention of the Log Analytics workspace.
+        action_group_id (Optional[str]): The action group notified by the alerts.
+        alerts (AlertThresholds): The thresholds of the metric alerts.
+    """
+    retention_in_days: int = 30
+    action_group_id: Optional[str] = None
+    alerts: AlertThresholds = field(default_factory=AlertThresholds)
+
+    def __post_init__(self):
+        # Log Analytics keeps data 30 to 730 days.
+        if not 30 <= self.retention_in_days <= 730:
+            raise ValueError(f"retention_in_days should be between 30 and 730, got "
+                             f"{self.retention_in_days}.")
+
+    @classmethod
+    def from_config(
+            cls,
+            config: Union["ObservabilityConfig", Dict[str, Any], None]
+    ) -> Optional["ObservabilityConfig"]:
+        """Build the telemetry config from the stack config, which may be a plain dict."""
+        if isinstance(config, dict):
+            return cls(**{**config, "alerts": AlertThresholds(**(config.get("alerts") or {}))})
+        return config
+
+def create_log_analytics(
+        name: str,
+        config: ObservabilityConfig,
+        resource_group_name: Input[str],
+        opts: ResourceOptions) -> Any:
+    """
+    Returns:
+        operationalinsights.Workspace: The Log Analytics workspace of the component.
+    """
+    return operationalinsights.Workspace(
+        f"{name}-law",
+        location=LOCATION,
+        resource_group_name=resource_group_name,
+        retention_in_days=config.retention_in_days,
+        sku=operationalinsights.WorkspaceSkuArgs(name="PerGB2018"),
+        opts=opts)
+
+def create_diagnostic_settings(
+        name: str,
+        targets: Dict[str, Tuple[str, Input[str]]],
+        log_analytics_id: Input[str],
+        opts: ResourceOptions) -> Dict[str, Any]:
+    """
+    Send the logs and metrics of the resources to the Log Analytics workspace.
+
+    Args:
+        name (str): The name of the AzureML component.
+        targets (Dict[str, Tuple[str, Input[str]]]): The kind of each resource, a key of
+            `DIAGNOSTIC_CATEGORIES`, and its id, by resource name suffix.
+        log_analytics_id (Input[str]): The Log Analytics workspace.
+        opts (ResourceOptions): The options of the diagnostic settings.
+
+    Returns:
+        Dict[str, insights.DiagnosticSetting]: The diagnostic settings, by target.
+    """
+    settings: Dict[str, Any] = {}
+    for target, (kind, resource_uri) in targets.items():
+        logs, metrics = DIAGNOSTIC_CATEGORIES[kind]
+        settings[target] = insights.DiagnosticSetting(
+            f"{name}-{target}-diag",
+            logs=[insights.LogSettingsArgs(category=category, enabled=True)
+                  for category in logs],
+            metrics=[insights.MetricSettingsArgs(category=category, enabled=True)
+                     for category in metrics],
+            name=DIAGNOSTIC_SETTING_NAME,
+            resource_uri=resource_uri,
+            workspace_id=log_analytics_id,
+            opts=opts)
+    return settings
+
+def create_metric_alerts(
+        name: str,
+        config: ObservabilityConfig,
+        resources: Dict[str, List[Tuple[str, Input[str]]]],
+        resource_group_name: Input[str],
+        opts: ResourceOptions) -> Dict[str, Any]:
+    """
+    Create a metric alert per threshold and per resource it applies to.
+
+    Args:
+        name (str): The name of the AzureML component.
+        config (ObservabilityConfig): The alert thresholds.
+        resources (Dict[str, List[Tuple[str, Input[str]]]]): The name suffix and id of the
+            resources, by `AlertMetric.target`.
+        resource_group_name (Input[str]): The resource group of the alerts.
+        opts (ResourceOptions): The options of the alerts.
+
+    Returns:
+        Dict[str, insights.MetricAlert]: The alerts, by resource name.
+    """
+    actions = [insights.MetricAlertActionArgs(action_group_id=config.action_group_id)] \
+        if config.action_group_id else None
+    alerts: Dict[str, Any] = {}
+    for alert_name, metric in ALERT_METRICS.items():
+        threshold = getattr(config.alerts, alert_name)
+        if threshold is None:
+            continue
+        for suffix, resource_id in resources.get(metric.target, []):
+            resource_name = f"{name}-{suffix}-{alert_name.replace('_', '-')}"
+            alerts[resource_name] = insights.MetricAlert(
+                resource_name,
+                actions=actions,
+                auto_mitigate=True,
+                criteria=insights.MetricAlertSingleResourceMultipleMetricCriteriaArgs(
+                    all_of=[insights.MetricCriteriaArgs(
+                        criterion_type="StaticThresholdCriterion",
+                        dimensions=[insights.MetricDimensionArgs(
+                            name=dimension, operator="Include", values=values)
+                                    for dimension, values in metric.dimensions.items()] or None,
+                        metric_name=metric.metric_name,
+                        metric_namespace=metric.namespace,
+                        name=alert_name,
+                        operator="GreaterThan",
+                        threshold=threshold,
+                        time_aggregation=metric.time_aggregation)],
+                    odata_type="Microsoft.Azure.Monitor.SingleResourceMultipleMetricCriteria"),
+                description=Output.concat(metric.description, " Threshold: ", str(threshold)),
+                enabled=True,
+                evaluation_frequency="PT1M",
+                location="global",
+                resource_group_name=resource_group_name,
+                scopes=[resource_id],
+                severity=2,
+                window_size="PT5M",
+                opts=opts)
+    return alerts
@@ -0,0 +1,309 @@
+"""
+This module creates the managed online endpoints of the AzureML workspace, their
+deployments, and the autoscale settings of the deployments:
+
+    dev:azureml:
+      online_endpoint_config:
+        churn-scoring:
+          auth_mode: Key
+          deployments:
+            blue:
+              model: azureml:churn-model:3
+              instance_type: Standard_DS3_v2
+              instance_count: 2
+              # A new deployment takes no traffic, set it to 100 in a following update.
+              traffic: 0
+              max_concurrent_requests_per_instance: 4
+              request_timeout_ms: 3000
+              autoscale:
+                min_instances: 2
+                max_instances: 6
+                cpu_scale_out_percent: 70
+                latency_scale_out_ms: 250
+
+With private endpoints, the endpoints are only reachable through the private endpoint of
+the workspace, and the deployments have no public egress.
+
+A new deployment has to be deployed with `traffic: 0` before it takes traffic, since the
+endpoint is updated before its deployments are created, and can't route to a deployment that
+doesn't exist yet. Its traffic is set in a following update.
+"""
+import re
+from typing import Any, Dict, Literal, Optional
+from pydantic import Field, NonNegativeInt, PositiveInt, ValidationInfo, field_validator
+from pydantic.dataclasses import dataclass as pydantic_dataclass
+from pulumi import Input, ResourceOptions
+from .constants import LOCATION, ISO_8601_DURATION_PATTERN, VM_SIZE_PATTERN
+from .lazy_imports import lazy_import
+
+insights = lazy_import("pulumi_azure_native.insights")
+mls = lazy_import("pulumi_azure_native.machinelearningservices")
+
+# Online endpoint and deployment names, unique in the region for endpoints.
+ENDPOINT_NAME_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9-]{1,30}[a-zA-Z0-9]$")
+DEPLOYMENT_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9-]{1,30}[a-zA-Z0-9]$")
+# The longest request timeout of managed online deployments.
+MAX_REQUEST_TIMEOUT_MS = 180000
+CPU_METRIC = "CpuUtilizationPercentage"
+# An endpoint metric, the p99 latency of the requests of all its deployments.
+LATENCY_METRIC = "RequestLatency_P99"
+
+@pydantic_dataclass
+class OnlineAutoscale:
+    """
+    Class for the autoscale rules of an online deployment.
+    """
+    min_instances: PositiveInt
+    max_instances: PositiveInt
+    # Scale out by one instance above this average CPU, and in below `cpu_scale_in_percent`.
+    cpu_scale_out_percent: int = Field(default=70, gt=0, le=100)
+    cpu_scale_in_percent: int = Field(default=30, ge=0, lt=100)
+    # Scale out by one instance above this p99 latency of the endpoint.
+    latency_scale_out_ms: Optional[PositiveInt] = None
+    cooldown: str = "PT5M"
+
+    @field_validator("max_instances")
+    @classmethod
+    def validate_instance_counts(cls, value, info: ValidationInfo): # pylint: disable=no-self-argument
+        """Validate that min_instances is not greater than max_instances"""
+        min_instances = info.data.get("min_instances")
+        if min_instances is not None and min_instances > value:
+            raise ValueError(f"min_instances ({min_instances}) is greater than "
+                             f"max_instances ({value}).")
+        return value
+
+    @field_validator("cpu_scale_in_percent")
+    @classmethod
+    def validate_cpu_thresholds(cls, value, info: ValidationInfo): # pylint: disable=no-self-argument
+        """Validate that the scale in threshold is below the scale out one"""
+        scale_out = info.data.get("cpu_scale_out_percent")
+        if scale_out is not None and value >= scale_out:
+            raise ValueError(f"cpu_scale_in_percent ({value}) should be lower than "
+                             f"cpu_scale_out_percent ({scale_out}).")
+        return value
+
+    @field_validator("cooldown")
+    @classmethod
+    def validate_cooldown(cls, value): # pylint: disable=no-self-argument
+        """Validate that the cooldown is an ISO-8601 duration"""
+        if not ISO_8601_DURATION_PATTERN.match(value):
+            raise ValueError(f"invalid ISO-8601 duration {value!r}, expected e.g. `PT5M`.")
+        return value
+
+@pydantic_dataclass
+class OnlineDeploymentItem: # pylint: disable=too-many-instance-attributes
+    """
+    Class for a managed online deployment config.
+    """
+    # The model asset, e.g. `azureml:churn-model:3`.
+    model: str
+    instance_type: str
+    instance_count: PositiveInt = 1
+    # The environment asset, not needed by MLflow models.
+    environment: Optional[str] = None
+    # The share of the endpoint requests, in percent.
+    traffic: int = Field(default=0, ge=0, le=100)
+    max_concurrent_requests_per_instance: PositiveInt = 1
+    request_timeout_ms: PositiveInt = 5000
+    max_queue_wait_ms: NonNegativeInt = 500
+    autoscale: Optional[OnlineAutoscale] = None
+
+    @field_validator("instance_type")
+    @classmethod
+    def validate_instance_type(cls, value): # pylint: disable=no-self-argument
+        """Validate that instance_type is a VM size"""
+        if not VM_SIZE_PATTERN.match(value):
+            raise ValueError(f"invalid instance type {value!r}, expected e.g. `Standard_DS3_v2`.")
+        return value
+
+    @field_validator("request_timeout_ms")
+    @classmethod
+    def validate_request_timeout(cls, value): # pylint: disable=no-self-argument
+        """Validate that the request timeout is supported by managed deployments"""
+        if value > MAX_REQUEST_TIMEOUT_MS:
+            raise ValueError(f"request_timeout_ms can't exceed {MAX_REQUEST_TIMEOUT_MS}.")
+        return value
+
+    @field_validator("autoscale")
+    @classmethod
+    def validate_autoscale(cls, value, info: ValidationInfo): # pylint: disable=no-self-argument
+        """Validate that instance_count is within the autoscale bounds"""
+        count = info.data.get("instance_count")
+        if value is not None and count is not None and \
+                not value.min_instances <= count <= value.max_instances:
+            raise ValueError(f"instance_count ({count}) is not between min_instances "
+                             f"({value.min_instances}) and max_instances ({value.max_instances}).")
+        return value
+
+@pydantic_dataclass
+class OnlineEndpointItem: # pylint: disable=too-few-public-methods
+    """
+    Class for a managed online endpoint config.
+    """
+    auth_mode: Literal["Key", "AMLToken", "AADToken"] = "Key"
+    deployments: Dict[str, OnlineDeploymentItem] = Field(default_factory=dict)
+
+    @field_validator("deployments")
+    @classmethod
+    def validate_deployments(cls, value): # pylint: disable=no-self-argument
+        """Validate the deployment names, and that their traffic adds up to 100% or 0%"""
+        for deployment_name in value:
+            if not DEPLOYMENT_NAME_PATTERN.match(deployment_name):
+                raise ValueError(f"invalid deployment name {deployment_name!r}, expected 3 to "
+                                 "32 letters, digits or hyphens.")
+        traffic = sum(deployment.traffic for deployment in value.values())
+        if traffic not in (0, 100):
+            raise ValueError(f"the traffic of the deployments adds up to {traffic}%, "
+                             "expected 100%.")
+        return value
+
+def endpoint_items(config: Optional[Dict[str, Any]]) -> Dict[str, OnlineEndpointItem]:
+    """
+    Returns:
+        Dict[str, OnlineEndpointItem]: The endpoints of the config, which may be plain dicts.
+    """
+    return {endpoint_name: OnlineEndpointItem(**item) if isinstance(item, dict) else item
+            for endpoint_name, item in (config or {}).items()}
+
+def iso_duration_ms(milliseconds: int) -> str:
+    """
+    Returns:
+        str: A duration in milliseconds as an ISO-8601 duration, e.g. `PT0.5S`.
+    """
+    return f"PT{milliseconds / 1000:g}S"
+
+def _scale_rule( # pylint: disable=too-many-arguments,too-many-positional-arguments
+        metric_name: str,
+        resource_uri: Input[str],
+        operator: str,
+        threshold: float,
+        direction: str,
+        cooldown: str) -> Any:
+    return insights.ScaleRuleArgs(
+        metric_trigger=insights.MetricTriggerArgs(
+            metric_name=metric_name,
+            metric_resource_uri=resource_uri,
+            operator=operator,
+            statistic=insights.MetricStatisticType.AVERAGE,
+            threshold=threshold,
+            time_aggregation=insights.TimeAggregationType.AVERAGE,
+            time_grain="PT1M",
+            time_window="PT5M"),
+        scale_action=insights.ScaleActionArgs(
+            cooldown=cooldown,
+            direction=direction,
+            type=insights.ScaleType.CHANGE_COUNT,
+            value="1"))
+
+def autoscale_rules(autoscale: OnlineAutoscale, deployment_id: Input[str],
+                    endpoint_id: Input[str]) -> list:
+    """
+    Returns:
+        List[insights.ScaleRuleArgs]: The CPU rules of a deployment, and its latency rule.
+    """
+    rules = [
+        _scale_rule(CPU_METRIC, deployment_id, insights.ComparisonOperationType.GREATER_THAN,
+                    autoscale.cpu_scale_out_percent, insights.ScaleDirection.INCREASE,
+                    autoscale.cooldown),
+        _scale_rule(CPU_METRIC, deployment_id, insights.ComparisonOperationType.LESS_THAN,
+                    autoscale.cpu_scale_in_percent, insights.ScaleDirection.DECREASE,
+                    autoscale.cooldown),
+    ]
+    if autoscale.latency_scale_out_ms:
+        rules.append(_scale_rule(
+            LATENCY_METRIC, endpoint_id, insights.ComparisonOperationType.GREATER_THAN,
+            autoscale.latency_scale_out_ms, insights.ScaleDirection.INCREASE,
+            autoscale.cooldown))
+    return rules
+
+def create_online_endpoints( # pylint: disable=too-many-arguments,too-many-locals
+        name: str,
+        config: Optional[Dict[str, Any]],
+        *,
+        resource_group_name: Input[str],
+        workspace_name: Input[str],
+        enable_private_endpoints: bool,
+        opts: ResourceOptions) -> Dict[str, Any]:
+    """
+    Create the managed online endpoints of a workspace, with their deployments and the
+    autoscale settings of the deployments.
+
+    Args:
+        name (str): The name of the AzureML component.
+        config (Optional[Dict[str, Any]]): The endpoints, by name.
+        resource_group_name (Input[str]): The resource group of the workspace.
+        workspace_name (Input[str]): The workspace of the endpoints.
+        enable_private_endpoints (bool): Keep the endpoints and deployments private.
+        opts (ResourceOptions): The options of the resources.
+
+    Returns:
+        Dict[str, mls.OnlineEndpoint]: The endpoints by name.
+    """
+    endpoints: Dict[str, Any] = {}
+    for endpoint_name, endpoint_config in endpoint_items(config).items():
+        # Deployments without traffic, e.g. a new one being rolled out, are left out.
+        traffic = {deployment_name: deployment.traffic for deployment_name, deployment
+                   in endpoint_config.deployments.items() if deployment.traffic}
+        endpoint = mls.OnlineEndpoint(
+            f"{name}-{endpoint_name}",
+            endpoint_name=endpoint_name,
+            identity=mls.ManagedServiceIdentityArgs(
+                type=mls.ManagedServiceIdentityType.SYSTEM_ASSIGNED
+            ),
+            kind="Managed",
+            location=LOCATION,
+            online_endpoint_properties=mls.OnlineEndpointArgs(
+                auth_mode=endpoint_config.auth_mode,
+                public_network_access=mls.PublicNetworkAccessType.DISABLED \
+                    if enable_private_endpoints else mls.PublicNetworkAccessType.ENABLED,
+                traffic=traffic or None),
+            resource_group_name=resource_group_name,
+            workspace_name=workspace_name,
+            opts=opts)
+        endpoints[endpoint_name] = endpoint
+        for deployment_name, deployment_config in endpoint_config.deployments.items():
+            autoscale = deployment_config.autoscale
+            deployment = mls.OnlineDeployment(
+                f"{name}-{endpoint_name}-{deployment_name}",
+                deployment_name=deployment_name,
+                endpoint_name=endpoint_name,
+                location=LOCATION,
+                online_deployment_properties=mls.ManagedOnlineDeploymentArgs(
+                    app_insights_enabled=True,
+                    egress_public_network_access=mls.EgressPublicNetworkAccessType.DISABLED \
+                        if enable_private_endpoints \
+                            else mls.EgressPublicNetworkAccessType.ENABLED,
+                    endpoint_compute_type="Managed",
+                    environment_id=deployment_config.environment,
+                    instance_type=deployment_config.instance_type,
+                    model=deployment_config.model,
+                    request_settings=mls.OnlineRequestSettingsArgs(
+                        max_concurrent_requests_per_instance=
+                            deployment_config.max_concurrent_requests_per_instance,
+                        max_queue_wait=iso_duration_ms(deployment_config.max_queue_wait_ms),
+                        request_timeout=iso_duration_ms(deployment_config.request_timeout_ms)),
+                    scale_settings=mls.DefaultScaleSettingsArgs(scale_type="Default")),
+                resource_group_name=resource_group_name,
+                sku=mls.SkuArgs(name="Default", capacity=deployment_config.instance_count),
+                workspace_name=workspace_name,
+                opts=ResourceOptions.merge(opts, ResourceOptions(
+                    depends_on=[endpoint],
+                    # The instance count is owned by the autoscale setting once deployed.
+                    ignore_changes=["sku.capacity"] if autoscale else None)))
+            if autoscale is None:
+                continue
+            insights.AutoscaleSetting(
+                f"{name}-{endpoint_name}-{deployment_name}-autoscale",
+                enabled=True,
+                location=LOCATION,
+                profiles=[insights.AutoscaleProfileArgs(
+                    name="default",
+                    capacity=insights.ScaleCapacityArgs(
+                        default=str(deployment_config.instance_count),
+                        maximum=str(autoscale.max_instances),
+                        minimum=str(autoscale.min_instances)),
+                    rules=autoscale_rules(autoscale, deployment.id, endpoint.id))],
+                resource_group_name=resource_group_name,
+                target_resource_uri=deployment.id,
+                opts=opts)
+    return endpoints
@@ -1,10 +1,59 @@
 """
 This module creates an Azure private endpoint that is used by AzureML.
 """
-from dataclasses import dataclass
-from typing import Optional, List
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, List, Union
 from pulumi import Input, ComponentResource, ResourceOptions
-from pulumi_azure_native import network
+from . import invoke_cache
+from .lazy_imports import lazy_import
+
+network = lazy_import("pulumi_azure_native.network")
+
+# The properties of a private endpoint that can't be updated in place. Changing anything
+# else, e.g. tags or the connection request message, updates the endpoint without an outage.
+DEFAULT_REPLACE_ON_CHANGES = [
+    "location",
+    "subnet",
+    "privateLinkServiceConnections[*].privateLinkServiceId",
+    "privateLinkServiceConnections[*].groupIds",
+]
+
+@dataclass
+class PrivateEndpointReplacementPolicy:
+    """
+    A class for configuring when and how a private endpoint is replaced.
+
+    Attributes:
+        replace_on_changes (List[str]): The properties whose changes recreate the endpoint.
+            Use `["*"]` to recreate it on any change.
+        create_before_delete (bool): Create the new endpoint before deleting the old one. It
+            needs a second free IP in the subnet while both endpoints exist, but traffic keeps
+            flowing through the old endpoint until the DNS zone group is swapped.
+    """
+    replace_on_changes: List[str] = field(
+        default_factory=lambda: list(DEFAULT_REPLACE_ON_CHANGES))
+    create_before_delete: bool = False
+
+    @classmethod
+    def from_config(
+            cls,
+            config: Union["PrivateEndpointReplacementPolicy", Dict[str, Any], None]
+    ) -> "PrivateEndpointReplacementPolicy":
+        """Build a policy from the stack config, which may be a plain dict."""
+        if config is None:
+            return cls()
+        if isinstance(config, dict):
+            return cls(**config)
+        return config
+
+    def resource_options(self) -> ResourceOptions:
+        """
+        Returns:
+            ResourceOptions: The replacement options of the `network.PrivateEndpoint`.
+        """
+        return ResourceOptions(
+            replace_on_changes=list(self.replace_on_changes),
+            delete_before_replace=not self.create_before_delete)
 
 @dataclass
 class PrivateEndpointArgs:
@@ -17,7 +66,13 @@ class PrivateEndpointArgs:
     subnet_id: Input[str]
     dns_resource_group_name: Input[str]
     group_id: Input[str]
+    # The zones the endpoint registers its IPs in. Without zones, no DNS zone group is created.
     private_dns_zones: List[str]
+    replacement_policy: Optional[PrivateEndpointReplacementPolicy] = None
+    # The region of the virtual network of the subnet, the resource group one by default.
+    location: Optional[Input[str]] = None
+    # The prefix of the DNS zone group name, the first part of the endpoint name by default.
+    dns_group_name_prefix: Optional[str] = None
 
 class PrivateEndpoint(ComponentResource):
     """
@@ -44,22 +99,29 @@ class PrivateEndpoint(ComponentResource):
             # of private endpoints. By passing empty custom dns configs list we ensure the state
             # is constant with out configurations.
             custom_dns_configs=[],
+            location=args.location,
             resource_group_name=args.resource_group_name,
             subnet=network.SubnetArgs(
                 id=args.subnet_id,
             ),
             opts=ResourceOptions.merge(
-                child_opts,
-                # Recreate the private endpoint when the related parent resource has been updated.
-                # pylint: disable=line-too-long
-                ResourceOptions(replace_on_changes=["*"], delete_before_replace=True,ignore_changes=["tags"]))
+                # The dependencies of the component, e.g. the replications of a registry,
+                # have to exist before the endpoint is created.
+                ResourceOptions.merge(
+                    child_opts, ResourceOptions(depends_on=opts.depends_on if opts else None)),
+                # Recreate the private endpoint only when a property that can't be updated in
+                # place has changed, e.g. when the related parent resource has been replaced.
+                ResourceOptions.merge(
+                    PrivateEndpointReplacementPolicy.from_config(
+                        args.replacement_policy).resource_options(),
+                    ResourceOptions(ignore_changes=["tags"])))
         )
 
         # The creation of Private DNS Zone Group needs the DNS Zone ID to register the IP of the
         # private endpoint with the DNS Zone.
         private_dns_zone_config_args: List[network.PrivateDnsZoneConfigArgs] = []
         for dns_zone_name in args.private_dns_zones:
-            dns_zone = network.get_private_zone_output(
+            dns_zone = invoke_cache.get_private_zone_output(
                 private_zone_name=dns_zone_name,
                 resource_group_name=args.dns_resource_group_name
             )
@@ -70,25 +132,27 @@ class PrivateEndpoint(ComponentResource):
                 )
             )
 
-        # Extract the parent resource name as the prefix of dns group name.
-        dns_group_name_prefix = name.split("-")[0]
-        self.dns_group = network.PrivateDnsZoneGroup(
-            # Use component name as part of the private dns zone group to avoid name
-            # conflicts when we have 2 endpoints for the same group.
-            f"{dns_group_name_prefix}-{args.group_id}-dnsgrp",
-            private_dns_zone_configs=private_dns_zone_config_args,
-            private_endpoint_name=private_endpoint.name,
-            resource_group_name=args.resource_group_name,
-            opts=ResourceOptions.merge(
-                child_opts,
-                ResourceOptions(delete_before_replace=True))
-        )
-
-        self.private_dns_zone_configs = self.dns_group.private_dns_zone_configs
+        self.dns_group = None
+        self.private_dns_zone_configs = None
+        if private_dns_zone_config_args:
+            # Extract the parent resource name as the prefix of dns group name.
+            dns_group_name_prefix = args.dns_group_name_prefix or name.split("-")[0]
+            self.dns_group = network.PrivateDnsZoneGroup(
+                # Use component name as part of the private dns zone group to avoid name
+                # conflicts when we have 2 endpoints for the same group.
+                f"{dns_group_name_prefix}-{args.group_id}-dnsgrp",
+                private_dns_zone_configs=private_dns_zone_config_args,
+                private_endpoint_name=private_endpoint.name,
+                resource_group_name=args.resource_group_name,
+                opts=ResourceOptions.merge(
+                    child_opts,
+                    ResourceOptions(delete_before_replace=True))
+            )
+            self.private_dns_zone_configs = self.dns_group.private_dns_zone_configs
 
         self.register_outputs({
             "resource_id": private_endpoint.id,
             "dns_group": self.dns_group,
-            "private_dns_zone_group_id": self.dns_group.id,
+            "private_dns_zone_group_id": self.dns_group.id if self.dns_group else None,
             "dns_zone_configs": self.private_dns_zone_configs
             })
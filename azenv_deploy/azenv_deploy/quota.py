@@ -0,0 +1,279 @@
+"""
+This module plans the vCPU quota the computes of a stack need, offline.
+
+The demand of every compute is its vCPUs at full scale, i.e. `max_node_count` nodes of a
+cluster and one node of an instance, summed by VM family. It is checked against a local
+SKU catalog and a local quota file of the region, both as YAML or JSON:
+
+    # The SKU catalog, by VM size. The output of `az vm list-skus --location eastus
+    # --resource-type virtualMachines -o json` is read as well.
+    Standard_DS11_v2: {family: standardDSv2Family, vcpus: 2, memory_gb: 14}
+
+    # The quotas, by family. The output of `az ml compute list-usage` or
+    # `az vm list-usage --location eastus -o json` is read as well, and the quotas can be
+    # keyed by location.
+    eastus:
+      standardDSv2Family: {limit: 100, current: 12}
+      lowPriorityCores: {limit: 200}
+
+Usage:
+
+    python -m azenv_deploy.azenv_deploy.quota --stack dev --catalog skus.json --quota quota.json
+
+A cluster that could never reach full scale, even with the rest of the fleet idle, fails
+the check. A family whose computes can't all run at full scale at once is a warning.
+"""
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import yaml
+from .azureml import AzureMLYamlConfig
+from .constants import LOCATION
+from .update_planner import load_stack_config, project_name
+from . import roster
+
+# Low priority nodes of all families share this quota.
+LOW_PRIORITY_FAMILY = "lowPriorityCores"
+# All the dedicated cores of the region share this quota.
+REGIONAL_FAMILY = "cores"
+# `az vm list-usage` names of the shared quotas.
+QUOTA_ALIASES = {
+    "totalregionalvcpus": REGIONAL_FAMILY,
+    "total regional vcpus": REGIONAL_FAMILY,
+    "lowprioritycores": LOW_PRIORITY_FAMILY,
+    "total regional low-priority vcpus": LOW_PRIORITY_FAMILY,
+}
+
+@dataclass
+class VmSku:
+    """
+    The family, vCPUs and memory of a VM size.
+    """
+    name: str
+    family: str
+    vcpus: int
+    memory_gb: float = 0.0
+
+@dataclass
+class FamilyQuota:
+    """
+    The vCPU limit of a quota, and the vCPUs already in use.
+    """
+    family: str
+    limit: int
+    current: int = 0
+
+    @property
+    def available(self) -> int:
+        """The vCPUs left to allocate."""
+        return max(self.limit - self.current, 0)
+
+@dataclass
+class ComputeDemand:
+    """
+    The vCPUs a compute needs at full scale.
+    """
+    name: str
+    kind: str
+    vm_size: str
+    nodes: int
+    sku: VmSku
+    low_priority: bool = False
+
+    @property
+    def vcpus(self) -> int:
+        """The vCPUs of all the nodes."""
+        return self.nodes * self.sku.vcpus
+
+    @property
+    def quota_family(self) -> str:
+        """The quota the compute draws from."""
+        return LOW_PRIORITY_FAMILY if self.low_priority else self.sku.family
+
+@dataclass
+class QuotaReport:
+    """
+    The vCPU demand by quota, and the problems found.
+    """
+    demand: Dict[str, int] = field(default_factory=dict)
+    memory_gb: Dict[str, float] = field(default_factory=dict)
+    quotas: Dict[str, FamilyQuota] = field(default_factory=dict)
+    # Computes that could never reach full scale, or can't be planned.
+    errors: List[str] = field(default_factory=list)
+    # Quotas that can't hold all their computes at full scale at once.
+    warnings: List[str] = field(default_factory=list)
+
+def _capability(sku: Dict[str, Any], name: str) -> Optional[str]:
+    for capability in sku.get("capabilities") or []:
+        if capability.get("name") == name:
+            return capability.get("value")
+    return None
+
+def load_sku_catalog(path: str) -> Dict[str, VmSku]:
+    """
+    Load a SKU catalog, by VM size. Sizes are case insensitive, as in Azure.
+
+    Raises:
+        (ValueError): A SKU has no family or vCPUs.
+    """
+    with open(path, encoding="utf-8") as catalog_file:
+        raw = yaml.safe_load(catalog_file) or {}
+    if isinstance(raw, list):
+        # `az vm list-skus` output.
+        raw = {sku["name"]: {"family": sku.get("family"),
+                             "vcpus": _capability(sku, "vCPUs"),
+                             "memory_gb": _capability(sku, "MemoryGB") or 0}
+               for sku in raw if sku.get("resourceType", "virtualMachines") == "virtualMachines"}
+    catalog: Dict[str, VmSku] = {}
+    for name, values in raw.items():
+        if not values.get("family") or values.get("vcpus") is None:
+            raise ValueError(f"The SKU `{name}` of `{path}` needs a `family` and `vcpus`.")
+        catalog[name.lower()] = VmSku(name, values["family"], int(values["vcpus"]),
+                                      float(values.get("memory_gb") or 0))
+    return catalog
+
+def _quota_family(name: str) -> str:
+    return QUOTA_ALIASES.get(name.lower(), name)
+
+def load_quotas(path: str, location: str = LOCATION) -> Dict[str, FamilyQuota]:
+    """
+    Load the vCPU quotas of a region, by family.
+    """
+    with open(path, encoding="utf-8") as quota_file:
+        raw = yaml.safe_load(quota_file) or {}
+    if isinstance(raw, dict) and isinstance(raw.get(location), (dict, list)):
+        raw = raw[location]
+    quotas: Dict[str, FamilyQuota] = {}
+    if isinstance(raw, list):
+        # `az vm list-usage` or `az ml compute list-usage` output.
+        for usage in raw:
+            name = usage.get("name")
+            family = _quota_family(name.get("value", "") if isinstance(name, dict) else name)
+            quotas[family] = FamilyQuota(family, int(usage.get("limit", 0)),
+                                         int(usage.get("currentValue", 0)))
+        return quotas
+    for name, values in raw.items():
+        family = _quota_family(name)
+        if isinstance(values, dict):
+            quotas[family] = FamilyQuota(family, int(values.get("limit", 0)),
+                                         int(values.get("current", 0)))
+        else:
+            quotas[family] = FamilyQuota(family, int(values))
+    return quotas
+
+def compute_demands(
+        config: AzureMLYamlConfig,
+        catalog: Dict[str, VmSku]) -> Tuple[List[ComputeDemand], List[str]]:
+    """
+    Returns:
+        Tuple[List[ComputeDemand], List[str]]: The demand of every compute, and the VM sizes
+            missing from the catalog.
+    """
+    demands, errors = [], []
+    entries = [(name, "instance", item.vm_size, 1, False)
+               for name, item in config.compute_instance_config.items()] + [
+        (name, "cluster", item.vm_size, item.max_node_count, item.vm_priority == "LowPriority")
+        for name, item in config.compute_cluster_config.items()]
+    for name, kind, vm_size, nodes, low_priority in entries:
+        sku = catalog.get(vm_size.lower())
+        if sku is None:
+            errors.append(f"{kind} `{name}`: the VM size `{vm_size}` is not in the catalog.")
+            continue
+        demands.append(ComputeDemand(name, kind, vm_size, nodes, sku, low_priority))
+    return demands, errors
+
+def plan_quota(
+        config: AzureMLYamlConfig,
+        catalog: Dict[str, VmSku],
+        quotas: Dict[str, FamilyQuota]) -> QuotaReport:
+    """
+    Check the vCPU demand of the computes at full scale against the quotas.
+
+    Args:
+        config (AzureMLYamlConfig): The AzureML config, with all its compute instances.
+        catalog (Dict[str, VmSku]): The SKUs, by lower case VM size.
+        quotas (Dict[str, FamilyQuota]): The quotas of the region, by family.
+
+    Returns:
+        QuotaReport: The demand by quota, the computes that could never reach full scale,
+            and the quotas that can't hold all the computes at full scale at once.
+    """
+    demands, errors = compute_demands(config, catalog)
+    report = QuotaReport(quotas=quotas, errors=errors)
+    for demand in demands:
+        families = [demand.quota_family]
+        if not demand.low_priority:
+            families.append(REGIONAL_FAMILY)
+        for family in families:
+            report.demand[family] = report.demand.get(family, 0) + demand.vcpus
+            report.memory_gb[family] = report.memory_gb.get(family, 0.0) + \
+                demand.nodes * demand.sku.memory_gb
+            quota = quotas.get(family)
+            if quota is None:
+                if family != REGIONAL_FAMILY:
+                    report.errors.append(f"{demand.kind} `{demand.name}`: no quota for "
+                                         f"`{family}` in the quota file.")
+            elif demand.vcpus > quota.available:
+                report.errors.append(
+                    f"{demand.kind} `{demand.name}` could never reach full scale: "
+                    f"{demand.nodes} x {demand.vm_size} need {demand.vcpus} `{family}` vCPUs, "
+                    f"{quota.available} are available.")
+    for family, vcpus in report.demand.items():
+        quota = quotas.get(family)
+        if quota is not None and vcpus > quota.available:
+            report.warnings.append(
+                f"`{family}`: the computes need {vcpus} vCPUs at full scale, "
+                f"{quota.available} of {quota.limit} are available.")
+    return report
+
+def format_report(report: QuotaReport) -> str:
+    """
+    Returns:
+        str: A table of the demand and quota of each family, then the problems found.
+    """
+    lines = [f"{'quota':<32} {'demand':>7} {'memory':>9} {'used':>6} {'limit':>6}"]
+    for family, vcpus in sorted(report.demand.items()):
+        quota = report.quotas.get(family)
+        used, limit = ("-", "-") if quota is None else (quota.current, quota.limit)
+        lines.append(f"{family:<32} {vcpus:>7} {report.memory_gb[family]:>7.0f}GB "
+                     f"{used:>6} {limit:>6}")
+    lines.extend(f"error: {error}" for error in report.errors)
+    lines.extend(f"warning: {warning}" for warning in report.warnings)
+    return "\n".join(lines)
+
+def load_azureml_config(project_dir: str, stack: str) -> AzureMLYamlConfig:
+    """
+    Load the AzureML config of a stack, with the compute instances of its roster.
+    """
+    with open(os.path.join(project_dir, f"Pulumi.{stack}.yaml"), encoding="utf-8") as file:
+        raw = load_stack_config(file.read(), project_name(project_dir)).get("azureml") or {}
+    config = AzureMLYamlConfig(**raw)
+    if config.compute_instance_roster:
+        instances, _ = roster.merge_roster(
+            config.model_dump()["compute_instance_config"],
+            os.path.join(project_dir, config.compute_instance_roster))
+        config = AzureMLYamlConfig(**{**raw, "compute_instance_config": instances})
+    return config
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Check the vCPU quota of the computes of a stack.
+    """
+    parser = argparse.ArgumentParser(description="Check the vCPU quota of a stack's computes.")
+    parser.add_argument("--project-dir", default="projects/dev")
+    parser.add_argument("--stack", required=True)
+    parser.add_argument("--catalog", required=True, help="The SKU catalog, by VM size.")
+    parser.add_argument("--quota", required=True, help="The vCPU quotas, by family.")
+    parser.add_argument("--location", default=LOCATION)
+    options = parser.parse_args(argv)
+
+    report = plan_quota(load_azureml_config(options.project_dir, options.stack),
+                        load_sku_catalog(options.catalog),
+                        load_quotas(options.quota, options.location))
+    print(format_report(report))
+    return 1 if report.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
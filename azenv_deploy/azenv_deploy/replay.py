@@ -0,0 +1,255 @@
+"""
+This module replays recorded invoke results to render the resources of a Pulumi program
+offline, as a JSON snapshot that can be compared against a golden file.
+
+Record the invokes of a stack once, with cloud access:
+
+    AZENV_RECORD_INVOKES=invokes.json pulumi preview --stack dev
+
+Then render the program with mocks, with no cloud access:
+
+    python -m azenv_deploy.azenv_deploy.replay --project-dir projects/dev --stack dev \\
+        --fixtures invokes.json --output snapshot.json
+
+`--check snapshot.json` compares the rendered resources with a golden snapshot instead,
+and prints the differences.
+"""
+import argparse
+import difflib
+import json
+import os
+import runpy
+import sys
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import pulumi
+import yaml
+from pulumi.runtime import config as runtime_config
+from pulumi.runtime.mocks import MockMonitor
+from .fleet import config_value
+from .invoke_cache import GET_USERS_TOKEN, INVOKE_CACHE, make_key
+
+# Secrets can't be decrypted offline, so the snapshot holds this value instead.
+SECRET_PLACEHOLDER = "[secret]"
+
+class ReplayError(Exception):
+    """Raised when the program runs an invoke that was not recorded."""
+
+def load_fixtures(path: str) -> Dict[Tuple[str, Hashable], Dict[str, Any]]:
+    """
+    Load the invoke results recorded by `invoke_cache.InvokeRecorder`.
+
+    Returns:
+        Dict[Tuple[str, Hashable], Dict[str, Any]]: The results by invoke cache key.
+    """
+    with open(path, encoding="utf-8") as fixture_file:
+        fixtures = json.load(fixture_file)
+    return {
+        make_key(invoke["token"], invoke["args"]): invoke["result"]
+        for invoke in fixtures.get("invokes") or []
+    }
+
+def synthesize_result(token: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns:
+        Dict[str, Any]: A stand-in result for an invoke that was not recorded, enough for
+            the components to register their resources.
+    """
+    if token == GET_USERS_TOKEN:
+        upns = list(args.get("userPrincipalNames") or [])
+        return {"userPrincipalNames": upns, "objectIds": [f"{upn}_object_id" for upn in upns]}
+    return {}
+
+class ReplayMocks(pulumi.runtime.Mocks):
+    """
+    Mocks answering invokes with recorded results and recording the resource inputs.
+    """
+    def __init__(self, fixtures: Dict[Tuple[str, Hashable], Dict[str, Any]], strict: bool = True):
+        """
+        Args:
+            fixtures (Dict[Tuple[str, Hashable], Dict[str, Any]]): The recorded results.
+            strict (bool): Fail on invokes that were not recorded, rather than answering
+                them with `synthesize_result`.
+        """
+        self.fixtures = fixtures
+        self.strict = strict
+        self.resources: List[Dict[str, Any]] = []
+        self.missing: List[str] = []
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        self.resources.append({"type": args.typ, "name": args.name, "inputs": args.inputs})
+        outputs = dict(args.inputs)
+        # Inputs referring to a missing output are dropped with their dependency, so the
+        # `name` of custom resources, e.g. `workspace.name`, is stood in by the logical name.
+        if args.custom:
+            outputs.setdefault("name", args.name)
+        return [f"{args.name}_id", outputs]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        result = self.fixtures.get(make_key(args.token, dict(args.args)))
+        if result is None and not self.strict:
+            return synthesize_result(args.token, dict(args.args))
+        if result is None:
+            invoke = f"{args.token} {json.dumps(dict(args.args), sort_keys=True)}"
+            self.missing.append(invoke)
+            raise ReplayError(f"No recorded result for the invoke {invoke}.")
+        return result
+
+def _plain(value: Any) -> Any:
+    # Mock inputs are protobuf-decoded values, turn them into JSON-friendly ones.
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+def parse_stack_config(content: str) -> Dict[str, str]:
+    """
+    Parse the config of a `Pulumi.<stack>.yaml` file as the engine passes it to the program.
+
+    Returns:
+        Dict[str, str]: The serialized config values by namespaced key.
+    """
+    raw = (yaml.safe_load(content) or {}).get("config") or {}
+    config: Dict[str, str] = {}
+    for key, value in raw.items():
+        if isinstance(value, dict) and set(value) == {"secure"}:
+            value = SECRET_PLACEHOLDER
+        config[key] = config_value(value)
+    return config
+
+def load_stack_config(project_dir: str, stack: str) -> Dict[str, str]:
+    """
+    Load the config of a stack as the engine passes it to the program.
+
+    Returns:
+        Dict[str, str]: The serialized config values by namespaced key.
+    """
+    with open(os.path.join(project_dir, f"Pulumi.{stack}.yaml"), encoding="utf-8") as stack_file:
+        return parse_stack_config(stack_file.read())
+
+def run_program(
+        project_dir: str,
+        stack: str,
+        mocks: ReplayMocks,
+        monitor: Optional[MockMonitor] = None,
+        config: Optional[Dict[str, str]] = None) -> str:
+    """
+    Run a Pulumi program with the config of a stack and mocks replaying recorded invokes.
+
+    Args:
+        project_dir (str): The directory of the Pulumi project.
+        stack (str): The stack name.
+        mocks (ReplayMocks): The mocks answering the invokes.
+        monitor (Optional[MockMonitor]): A mock monitor wrapping `mocks`, to capture more
+            of the registrations than the mocks get.
+        config (Optional[Dict[str, str]]): The stack config, e.g. from `parse_stack_config`.
+            Defaults to the config of `Pulumi.<stack>.yaml`.
+
+    Returns:
+        str: The project name.
+
+    Raises:
+        (ReplayError): The program ran an invoke that was not recorded.
+    """
+    with open(os.path.join(project_dir, "Pulumi.yaml"), encoding="utf-8") as project_file:
+        project = yaml.safe_load(project_file)["name"]
+    config = dict(load_stack_config(project_dir, stack) if config is None else config)
+    # The invokes must come from the fixtures, not from the disk cache of the stack.
+    config.pop(f"{project}:invoke_cache", None)
+
+    previous_config = dict(runtime_config.CONFIG.get())
+    pulumi.runtime.set_all_config(config)
+    pulumi.runtime.set_mocks(mocks, project=project, stack=stack, preview=False, monitor=monitor)
+    disk, recorder = INVOKE_CACHE.disk, INVOKE_CACHE.recorder
+    INVOKE_CACHE.disk, INVOKE_CACHE.recorder = None, None
+    # The project modules, e.g. `config`, are imported from the project directory.
+    sys.path.insert(0, os.path.abspath(project_dir))
+    sys.modules.pop("config", None)
+
+    @pulumi.runtime.test
+    def run_main():
+        runpy.run_path(os.path.join(project_dir, "__main__.py"), run_name="__main__")
+
+    try:
+        run_main()
+    except Exception as error:
+        if mocks.missing:
+            raise ReplayError("\n".join(sorted(set(mocks.missing)))) from error
+        raise
+    finally:
+        sys.path.remove(os.path.abspath(project_dir))
+        sys.modules.pop("config", None)
+        INVOKE_CACHE.disk, INVOKE_CACHE.recorder = disk, recorder
+        pulumi.runtime.set_all_config(previous_config)
+    return project
+
+def render_snapshot(project_dir: str, stack: str, fixtures_path: str) -> Dict[str, Any]:
+    """
+    Render the resources of a stack from recorded invokes.
+
+    Args:
+        project_dir (str): The directory of the Pulumi project.
+        stack (str): The stack whose config is used.
+        fixtures_path (str): The recorded invokes.
+
+    Returns:
+        Dict[str, Any]: The snapshot of the registered resources and their inputs.
+
+    Raises:
+        (ReplayError): The program ran an invoke that was not recorded.
+    """
+    mocks = ReplayMocks(load_fixtures(fixtures_path))
+    project = run_program(project_dir, stack, mocks)
+    resources = sorted(mocks.resources, key=lambda resource: (resource["type"], resource["name"]))
+    return {
+        "project": project,
+        "stack": stack,
+        "resources": _plain(resources),
+    }
+
+def dump_snapshot(snapshot: Dict[str, Any]) -> str:
+    """
+    Returns:
+        str: The snapshot as stable, diff-friendly JSON.
+    """
+    return json.dumps(snapshot, indent=2, sort_keys=True) + "\n"
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Render a snapshot of a stack, or check it against a golden snapshot.
+    """
+    parser = argparse.ArgumentParser(description="Render a Pulumi program from recorded invokes.")
+    parser.add_argument("--project-dir", default=os.path.join("projects", "dev"))
+    parser.add_argument("--stack", required=True)
+    parser.add_argument("--fixtures", required=True, help="The recorded invokes.")
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument("--output", help="Write the snapshot to this file.")
+    output_group.add_argument("--check", help="Compare the snapshot with this golden file.")
+    options = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rendered = dump_snapshot(render_snapshot(options.project_dir, options.stack, options.fixtures))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if options.check:
+        with open(options.check, encoding="utf-8") as golden_file:
+            golden = golden_file.read()
+        diff = list(difflib.unified_diff(
+            golden.splitlines(keepends=True), rendered.splitlines(keepends=True),
+            fromfile=options.check, tofile="rendered"))
+        sys.stdout.writelines(diff)
+        print(f"rendered in {elapsed_ms:.0f}ms, {'differs' if diff else 'matches'}",
+              file=sys.stderr)
+        return 1 if diff else 0
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as output_file:
+            output_file.write(rendered)
+    else:
+        sys.stdout.write(rendered)
+    print(f"rendered in {elapsed_ms:.0f}ms", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
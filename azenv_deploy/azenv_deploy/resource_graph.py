@@ -0,0 +1,360 @@
+"""
+This module captures the resource dependency graph of a stack, exports it as DOT or JSON,
+and finds its critical path, i.e. the longest dependency chain weighted by the time each
+resource type takes to provision.
+
+The graph is read either from a stack state file, or from a replay of the program with
+recorded invokes (see `replay`):
+
+    python -m azenv_deploy.azenv_deploy.resource_graph --state .pulumi/stacks/dev/dev.json
+    python -m azenv_deploy.azenv_deploy.resource_graph --stack dev \\
+        --fixtures invokes.json --durations durations.json --dot graph.dot
+
+Explicit `depends_on` edges on the critical path are listed with the time the deployment
+would save without them.
+"""
+import argparse
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pulumi.runtime import rpc
+from pulumi.runtime.mocks import MockMonitor
+from .replay import ReplayMocks, load_fixtures, run_program
+from .state import load_state_resources, urn_name
+
+# Rough provisioning times, in seconds, used for the types missing from the durations file.
+DEFAULT_DURATIONS: Dict[str, float] = {
+    "azure-native:storage:StorageAccount": 30,
+    "azure-native:containerregistry:Registry": 60,
+    "azure-native:keyvault:Vault": 30,
+    "azure-native:insights:Component": 15,
+    "azure-native:machinelearning:Workspace": 120,
+    "azure-native:machinelearningservices:Workspace": 120,
+    "azure-native:machinelearningservices:Compute": 240,
+    "azure-native:network:PrivateEndpoint": 60,
+    "azure-native:network:PrivateDnsZoneGroup": 20,
+    "azure-native:network:PrivateRecordSet": 5,
+    "random:index/randomString:RandomString": 0,
+}
+DEFAULT_CUSTOM_DURATION = 10.0
+
+# Resources of these types are not provisioned, so they are left out of the graph.
+IGNORED_TYPES = ("pulumi:pulumi:Stack",)
+IGNORED_TYPE_PREFIXES = ("pulumi:providers:",)
+
+@dataclass
+class ResourceNode:
+    """
+    A resource and the resources it waits for.
+    """
+    urn: str
+    type: str
+    custom: bool = True
+    dependencies: List[str] = field(default_factory=list)
+    # The `depends_on` dependencies that no input refers to.
+    explicit_dependencies: List[str] = field(default_factory=list)
+    inputs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        """The logical name of the resource."""
+        return urn_name(self.urn)
+
+@dataclass
+class CriticalPath:
+    """
+    The longest dependency chain of a graph.
+    """
+    urns: List[str]
+    duration_s: float
+
+def _is_ignored(typ: str) -> bool:
+    return typ in IGNORED_TYPES or typ.startswith(IGNORED_TYPE_PREFIXES)
+
+def _explicit(dependencies: List[str], property_dependencies: List[List[str]]) -> List[str]:
+    from_inputs = {urn for urns in property_dependencies for urn in urns}
+    return [urn for urn in dependencies if urn not in from_inputs]
+
+def load_durations(path: Optional[str]) -> Dict[str, float]:
+    """
+    Load historical provisioning times, in seconds, by resource type or by URN.
+
+    Returns:
+        Dict[str, float]: `DEFAULT_DURATIONS` updated with the durations of the file.
+    """
+    durations = dict(DEFAULT_DURATIONS)
+    if path:
+        with open(path, encoding="utf-8") as durations_file:
+            durations.update({
+                key: float(value) for key, value in json.load(durations_file).items()})
+    return durations
+
+class ResourceGraph:
+    """
+    The resources of a stack and their dependencies.
+    """
+    def __init__(self, nodes: Optional[List[ResourceNode]] = None):
+        self.nodes: Dict[str, ResourceNode] = {}
+        for node in nodes or []:
+            self.add(node)
+
+    def add(self, node: ResourceNode) -> None:
+        """Add a resource to the graph, unless it is not provisioned."""
+        if not _is_ignored(node.type):
+            self.nodes[node.urn] = node
+
+    def edges(self) -> List[Tuple[str, str, bool]]:
+        """
+        Returns:
+            List[Tuple[str, str, bool]]: The `(dependency, dependent, explicit)` edges
+                between the resources of the graph.
+        """
+        return [
+            (dependency, node.urn, dependency in node.explicit_dependencies)
+            for node in self.nodes.values()
+            for dependency in node.dependencies
+            if dependency in self.nodes
+        ]
+
+    def duration(self, urn: str, durations: Dict[str, float]) -> float:
+        """
+        Returns:
+            float: The provisioning time of a resource, by URN first, then by type.
+        """
+        node = self.nodes[urn]
+        if not node.custom:
+            return 0.0
+        return durations.get(urn, durations.get(node.type, DEFAULT_CUSTOM_DURATION))
+
+    def topological_order(self) -> List[str]:
+        """
+        Returns:
+            List[str]: The URNs, every resource after its dependencies.
+        """
+        order: List[str] = []
+        visited: Set[str] = set()
+        for urn in self.nodes:
+            stack = [(urn, False)]
+            while stack:
+                current, expanded = stack.pop()
+                if expanded:
+                    order.append(current)
+                    continue
+                if current in visited:
+                    continue
+                visited.add(current)
+                stack.append((current, True))
+                stack.extend((dependency, False)
+                             for dependency in self.nodes[current].dependencies
+                             if dependency in self.nodes and dependency not in visited)
+        return order
+
+    def critical_path(
+            self,
+            durations: Dict[str, float],
+            without: Optional[Tuple[str, str]] = None) -> CriticalPath:
+        """
+        Find the longest dependency chain, i.e. the shortest possible deployment time with
+        unlimited parallelism. Chains that take as long are ordered by URN, so the path is
+        the same from one run to the next.
+
+        Args:
+            durations (Dict[str, float]): The provisioning times by type or URN.
+            without (Optional[Tuple[str, str]]): A `(dependency, dependent)` edge to ignore.
+
+        Returns:
+            CriticalPath: The chain, from the first resource to provision to the last.
+        """
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for urn in self.topological_order():
+            start, previous[urn] = 0.0, None
+            for dependency in sorted(self.nodes[urn].dependencies):
+                if dependency in finish and (dependency, urn) != without \
+                        and finish[dependency] > start:
+                    start, previous[urn] = finish[dependency], dependency
+            finish[urn] = start + self.duration(urn, durations)
+        if not finish:
+            return CriticalPath([], 0.0)
+
+        last: Optional[str] = max(sorted(finish), key=lambda urn: finish[urn])
+        duration = finish[last]
+        urns: List[str] = []
+        while last is not None:
+            urns.append(last)
+            last = previous[last]
+        return CriticalPath(urns[::-1], duration)
+
+    def explicit_edge_savings(self, durations: Dict[str, float]) -> List[Tuple[str, str, float]]:
+        """
+        Measure how much each explicit `depends_on` edge of the critical path lengthens it.
+
+        Returns:
+            List[Tuple[str, str, float]]: The `(dependency, dependent, saving in seconds)`
+                of the edges whose removal shortens the critical path, longest saving first.
+        """
+        path = self.critical_path(durations)
+        savings = []
+        for dependency, dependent in zip(path.urns, path.urns[1:]):
+            if dependency in self.nodes[dependent].explicit_dependencies:
+                saving = path.duration_s - self.critical_path(
+                    durations, without=(dependency, dependent)).duration_s
+                if saving > 0:
+                    savings.append((dependency, dependent, saving))
+        return sorted(savings, key=lambda saving: -saving[2])
+
+    def to_json(self, durations: Dict[str, float]) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: The nodes, edges and critical path of the graph.
+        """
+        path = self.critical_path(durations)
+        return {
+            "nodes": [
+                {"urn": node.urn, "type": node.type, "name": node.name,
+                 "duration_s": self.duration(node.urn, durations)}
+                for node in self.nodes.values()
+            ],
+            "edges": [
+                {"from": dependency, "to": dependent, "explicit": explicit}
+                for dependency, dependent, explicit in self.edges()
+            ],
+            "critical_path": {"urns": path.urns, "duration_s": path.duration_s},
+        }
+
+    def to_dot(self, durations: Dict[str, float]) -> str:
+        """
+        Returns:
+            str: The graph in the Graphviz DOT format. The critical path is red and the
+                explicit `depends_on` edges are dashed.
+        """
+        critical = set(self.critical_path(durations).urns)
+        ids = {urn: f"n{index}" for index, urn in enumerate(self.nodes)}
+        lines = ["digraph resources {", "  rankdir=LR;", "  node [shape=box];"]
+        for node in self.nodes.values():
+            label = f"{node.name}\n{node.type}\n{self.duration(node.urn, durations):.0f}s"
+            color = ", color=red" if node.urn in critical else ""
+            style = "" if node.custom else ", style=dotted"
+            lines.append(f"  {ids[node.urn]} [label={json.dumps(label)}{color}{style}];")
+        for dependency, dependent, explicit in self.edges():
+            attributes = []
+            if explicit:
+                attributes.append("style=dashed")
+            if dependency in critical and dependent in critical:
+                attributes.append("color=red")
+            suffix = f" [{', '.join(attributes)}]" if attributes else ""
+            lines.append(f"  {ids[dependency]} -> {ids[dependent]}{suffix};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+def graph_from_state(path: str) -> ResourceGraph:
+    """
+    Read the resource graph of a stack state file.
+    """
+    graph = ResourceGraph()
+    for resource in load_state_resources(path):
+        dependencies = list(resource.get("dependencies") or [])
+        graph.add(ResourceNode(
+            urn=resource["urn"],
+            type=resource["type"],
+            custom=resource.get("custom", True),
+            dependencies=dependencies,
+            explicit_dependencies=_explicit(
+                dependencies, list((resource.get("propertyDependencies") or {}).values())),
+            inputs=resource.get("inputs") or {}))
+    return graph
+
+class GraphMonitor(MockMonitor):
+    """
+    A mock monitor also capturing the dependencies of each registered resource.
+    """
+    def __init__(self, mocks: ReplayMocks):
+        super().__init__(mocks)
+        self.graph = ResourceGraph()
+
+    def RegisterResource(self, request): # pylint: disable=invalid-name
+        response = super().RegisterResource(request)
+        if _is_ignored(request.type):
+            return response
+        dependencies = list(request.dependencies)
+        self.graph.add(ResourceNode(
+            urn=response.urn,
+            type=request.type,
+            custom=request.custom,
+            dependencies=dependencies,
+            explicit_dependencies=_explicit(
+                dependencies,
+                [list(deps.urns) for deps in request.propertyDependencies.values()]),
+            inputs=rpc.deserialize_properties(request.object)))
+        return response
+
+def graph_from_replay(
+        project_dir: str,
+        stack: str,
+        fixtures_path: Optional[str],
+        config: Optional[Dict[str, str]] = None,
+        strict: bool = True) -> ResourceGraph:
+    """
+    Capture the resource graph of a program replayed with recorded invokes.
+
+    Args:
+        project_dir (str): The directory of the Pulumi project.
+        stack (str): The stack name.
+        fixtures_path (Optional[str]): The recorded invokes. Without them, stand-in results
+            are used.
+        config (Optional[Dict[str, str]]): The stack config, defaults to its stack file.
+        strict (bool): Fail on the invokes missing from the fixtures, rather than using
+            stand-in results, e.g. for the new users of a proposed config.
+    """
+    fixtures = load_fixtures(fixtures_path) if fixtures_path else {}
+    monitor = GraphMonitor(ReplayMocks(fixtures, strict=strict and fixtures_path is not None))
+    run_program(project_dir, stack, monitor.mocks, monitor=monitor, config=config)
+    return monitor.graph
+
+def format_critical_path(graph: ResourceGraph, durations: Dict[str, float]) -> str:
+    """
+    Returns:
+        str: The critical path and the explicit edges lengthening it.
+    """
+    path = graph.critical_path(durations)
+    lines = [f"critical path: {path.duration_s / 60:.1f} min, {len(path.urns)} resources"]
+    for urn in path.urns:
+        node = graph.nodes[urn]
+        lines.append(f"  {graph.duration(urn, durations):>6.0f}s  {node.name} ({node.type})")
+    for dependency, dependent, saving in graph.explicit_edge_savings(durations):
+        lines.append(f"depends_on {urn_name(dependent)} -> {urn_name(dependency)} "
+                     f"adds {saving:.0f}s")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Export the resource graph of a stack and print its critical path.
+    """
+    parser = argparse.ArgumentParser(description="Export the resource graph of a stack.")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--state", help="A stack state file.")
+    source_group.add_argument("--fixtures", help="Recorded invokes to replay the program with.")
+    parser.add_argument("--project-dir", default="projects/dev")
+    parser.add_argument("--stack", help="The stack to replay, with `--fixtures`.")
+    parser.add_argument("--durations", help="Provisioning times in seconds by type or URN.")
+    parser.add_argument("--dot", help="Write the graph in the DOT format to this file.")
+    parser.add_argument("--json", help="Write the graph as JSON to this file.")
+    options = parser.parse_args(argv)
+    if options.fixtures and not options.stack:
+        parser.error("`--fixtures` needs `--stack`.")
+
+    graph = graph_from_state(options.state) if options.state \
+        else graph_from_replay(options.project_dir, options.stack, options.fixtures)
+    durations = load_durations(options.durations)
+    if options.dot:
+        with open(options.dot, "w", encoding="utf-8") as dot_file:
+            dot_file.write(graph.to_dot(durations))
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as json_file:
+            json.dump(graph.to_json(durations), json_file, indent=2)
+    print(format_critical_path(graph, durations))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
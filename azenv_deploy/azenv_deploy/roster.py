@@ -0,0 +1,167 @@
+"""
+This module loads compute instances from a roster file, instead of inlining them all in
+`compute_instance_config` of the stack config:
+
+    dev:azureml:
+      compute_instance_roster: rosters/dev.csv
+
+The roster is a CSV file with a header, or a JSONL file with an object per line, with the
+`name`, `user_email` and optional `vm_size` of each compute instance:
+
+    name,user_email,vm_size
+    ci-jdoe,jdoe@example.com,Standard_DS12_v2
+
+It is streamed and validated row by row, and all the invalid rows are reported at once with
+their line numbers. A user listed more than once keeps their first compute instance.
+"""
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Tuple
+from .constants import STANDARD_DS11_V2
+from .azureml import COMPUTE_INSTANCE_NAME_PATTERN, VM_SIZE_PATTERN
+
+ROSTER_FIELDS = ("name", "user_email", "vm_size")
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+MAX_REPORTED_ERRORS = 50
+
+class RosterError(ValueError):
+    """
+    Raised when rows of a roster are invalid, with the line of each error.
+    """
+    def __init__(self, path: str, errors: List[Tuple[int, str]]):
+        self.path = path
+        self.errors = errors
+        lines = [f"{path}:{line}: {message}" for line, message in errors[:MAX_REPORTED_ERRORS]]
+        if len(errors) > MAX_REPORTED_ERRORS:
+            lines.append(f"... and {len(errors) - MAX_REPORTED_ERRORS} more errors")
+        super().__init__(f"Invalid compute instance roster `{path}`:\n" + "\n".join(lines))
+
+@dataclass
+class Roster:
+    """
+    The compute instances of a roster, with the lines of the users listed more than once.
+    """
+    compute_instance_config: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    # The line of each compute instance.
+    lines: Dict[str, int] = field(default_factory=dict)
+    # The line of each duplicated row, and the line of the row that was kept.
+    duplicates: List[Tuple[int, int]] = field(default_factory=list)
+
+def _csv_rows(path: str) -> Iterator[Tuple[int, Any]]:
+    with open(path, encoding="utf-8", newline="") as roster_file:
+        reader = csv.DictReader(roster_file)
+        columns = reader.fieldnames or []
+        missing = [name for name in ("name", "user_email") if name not in columns]
+        if missing:
+            raise RosterError(path, [(1, f"missing column(s): {', '.join(missing)}")])
+        for row in reader:
+            # `line_num` is the last line of the row, i.e. its line unless it has newlines.
+            yield reader.line_num, row
+
+def _jsonl_rows(path: str) -> Iterator[Tuple[int, Any]]:
+    with open(path, encoding="utf-8") as roster_file:
+        for line, text in enumerate(roster_file, start=1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError as error:
+                yield line, error
+
+def iter_roster_rows(path: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Stream the rows of a roster, `.jsonl` files as JSON lines and other files as CSV.
+
+    Returns:
+        Iterator[Tuple[int, Any]]: The line and the raw value of each row.
+    """
+    return _jsonl_rows(path) if path.endswith((".jsonl", ".ndjson")) else _csv_rows(path)
+
+def validate_row(row: Any) -> List[str]:
+    """
+    Returns:
+        List[str]: The problems of a raw roster row, empty if it is valid.
+    """
+    if isinstance(row, json.JSONDecodeError):
+        return [f"invalid JSON: {row.msg}"]
+    if not isinstance(row, dict):
+        return ["expected an object with `name`, `user_email` and `vm_size`"]
+    errors = []
+    unknown = sorted(str(key) for key in row if key not in ROSTER_FIELDS)
+    if unknown:
+        errors.append(f"unknown field(s): {', '.join(unknown)}")
+    name = row.get("name")
+    if not isinstance(name, str) or not COMPUTE_INSTANCE_NAME_PATTERN.match(name.strip()):
+        errors.append(f"invalid compute instance name {name!r}, expected 3 to 24 letters, "
+                      "digits or hyphens starting with a letter")
+    user_email = row.get("user_email")
+    if not isinstance(user_email, str) or not EMAIL_PATTERN.match(user_email.strip()):
+        errors.append(f"invalid user_email {user_email!r}")
+    vm_size = row.get("vm_size")
+    # An empty vm_size, e.g. an empty CSV cell, defaults to `STANDARD_DS11_V2`.
+    if vm_size is not None and (not isinstance(vm_size, str) or (
+            vm_size.strip() and not VM_SIZE_PATTERN.match(vm_size.strip()))):
+        errors.append(f"invalid vm_size {vm_size!r}, expected e.g. `{STANDARD_DS11_V2}`")
+    return errors
+
+def load_roster(path: str) -> Roster:
+    """
+    Load the compute instances of a roster, one row at a time.
+
+    Args:
+        path (str): The CSV or JSONL roster file.
+
+    Returns:
+        Roster: The `compute_instance_config` entries of the roster.
+
+    Raises:
+        (RosterError): Rows are invalid, or compute instance names are repeated.
+    """
+    roster = Roster()
+    errors: List[Tuple[int, str]] = []
+    # The line of the first row of each user.
+    user_lines: Dict[str, int] = {}
+    for line, row in iter_roster_rows(path):
+        row_errors = validate_row(row)
+        if row_errors:
+            errors.extend((line, message) for message in row_errors)
+            continue
+        name, user_email = row["name"].strip(), row["user_email"].strip()
+        user = user_email.lower()
+        if user in user_lines:
+            roster.duplicates.append((line, user_lines[user]))
+            continue
+        if name in roster.lines:
+            errors.append((line, f"compute instance `{name}` is already defined on line "
+                                 f"{roster.lines[name]}"))
+            continue
+        user_lines[user], roster.lines[name] = line, line
+        roster.compute_instance_config[name] = {
+            "user_email": user_email,
+            "vm_size": (row.get("vm_size") or "").strip() or STANDARD_DS11_V2,
+        }
+    if errors:
+        raise RosterError(path, errors)
+    return roster
+
+def merge_roster(
+        compute_instance_config: Dict[str, Any],
+        path: str) -> Tuple[Dict[str, Any], Roster]:
+    """
+    Add the compute instances of a roster to the inline `compute_instance_config`.
+
+    Returns:
+        Tuple[Dict[str, Any], Roster]: The merged config, and the loaded roster.
+
+    Raises:
+        (RosterError): The roster is invalid, or defines an inline compute instance again.
+    """
+    roster = load_roster(path)
+    repeated = [name for name in roster.compute_instance_config
+                if name in compute_instance_config]
+    if repeated:
+        raise RosterError(path, [(roster.lines[name], f"compute instance `{name}` is also "
+                                  "defined in compute_instance_config") for name in repeated])
+    return {**compute_instance_config, **roster.compute_instance_config}, roster
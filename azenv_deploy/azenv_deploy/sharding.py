@@ -0,0 +1,108 @@
+"""
+This module assigns the computes of a large AzureML fleet to compute shard stacks.
+
+A single stack holding hundreds of computes has one big checkpoint, rewritten on every step,
+and one lock serializing every change. With sharding, the core stack deploys the workspace and
+its resources, and each shard stack deploys a slice of `compute_instance_config` and
+`compute_cluster_config` into the workspace of the core stack, read with a stack reference.
+Every stack shares the same `azureml` config, plus e.g.:
+
+    sharding:
+      core_stack: my-org/dev/core
+      shards: [shard-a, shard-b, shard-c]
+
+The computes are assigned with rendezvous hashing: each compute goes to the shard with the
+highest hash of the shard and compute names. The assignment only depends on the names, and
+adding a shard only moves the computes that the new shard wins, i.e. about `1/N` of them.
+
+    python -m azenv_deploy.azenv_deploy.sharding --stack core
+
+prints the computes of each shard of a stack config.
+"""
+import argparse
+import hashlib
+import os
+import sys
+from typing import Dict, Iterable, List, Optional
+import yaml
+
+def _weight(shard: str, key: str) -> int:
+    return int.from_bytes(hashlib.sha256(f"{shard}/{key}".encode("utf-8")).digest()[:8], "big")
+
+def shard_for(key: str, shards: Iterable[str]) -> str:
+    """
+    Args:
+        key (str): The compute name.
+        shards (Iterable[str]): The shard stacks.
+
+    Returns:
+        str: The shard the compute is deployed by.
+
+    Raises:
+        (ValueError): There are no shards.
+    """
+    shards = list(shards)
+    if not shards:
+        raise ValueError(f"No shard to deploy the compute `{key}` with.")
+    return max(shards, key=lambda shard: (_weight(shard, key), shard))
+
+def assign_shards(keys: Iterable[str], shards: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Returns:
+        Dict[str, List[str]]: The computes of each shard, in the order of `keys`.
+    """
+    shards = list(shards)
+    assignment: Dict[str, List[str]] = {shard: [] for shard in shards}
+    for key in keys:
+        assignment[shard_for(key, shards)].append(key)
+    return assignment
+
+def shard_computes(keys: Iterable[str], shards: Iterable[str], shard: str) -> List[str]:
+    """
+    Returns:
+        List[str]: The computes deployed by a shard.
+
+    Raises:
+        (ValueError): `shard` is not one of `shards`.
+    """
+    shards = list(shards)
+    if shard not in shards:
+        raise ValueError(f"`{shard}` is not one of the compute shards {shards}.")
+    return assign_shards(keys, shards)[shard]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Print the computes of each shard of a stack config.
+    """
+    parser = argparse.ArgumentParser(description="Print the compute shard assignment.")
+    parser.add_argument("--project-dir", default="projects/dev")
+    parser.add_argument("--stack", required=True)
+    parser.add_argument("--shards", nargs="*",
+                        help="The shard stacks, defaults to the `sharding` stack config.")
+    options = parser.parse_args(argv)
+
+    stack_path = os.path.join(options.project_dir, f"Pulumi.{options.stack}.yaml")
+    with open(stack_path, encoding="utf-8") as stack_file:
+        raw = (yaml.safe_load(stack_file) or {}).get("config") or {}
+    # Drop the project namespace of the keys, e.g. `dev:azureml`.
+    config = {key.split(":", 1)[-1]: value for key, value in raw.items()}
+    shards = options.shards
+    if shards is None:
+        shards = (config.get("sharding") or {}).get("shards") or []
+    azureml_config = config.get("azureml") or {}
+    keys = list(azureml_config.get("compute_instance_config") or {}) + \
+        list(azureml_config.get("compute_cluster_config") or {})
+    # The core stack creates the image build cluster.
+    build_compute = (azureml_config.get("image_build") or {}).get("compute")
+    keys = [key for key in keys if key != build_compute]
+    if not shards:
+        print(f"The stack `{options.stack}` has no compute shards.", file=sys.stderr)
+        return 1
+    for shard, computes in assign_shards(keys, shards).items():
+        print(f"{shard}: {len(computes)} computes")
+        for compute in computes:
+            print(f"  {compute}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+This module reads the resources of a stack from a Pulumi state file, either a checkpoint
+under `.pulumi/stacks/<project>/<stack>.json` or the output of `pulumi stack export`.
+"""
+import json
+from typing import Any, Dict, List
+
+def load_state_resources(path: str) -> List[Dict[str, Any]]:
+    """
+    Load the resources of a stack state file.
+
+    Args:
+        path (str): The path of the state file.
+
+    Returns:
+        List[Dict[str, Any]]: The resources, in the order they are stored in the state.
+    """
+    with open(path, encoding="utf-8") as state_file:
+        state = json.load(state_file)
+    # `pulumi stack export` stores the resources under `deployment`, while the checkpoints
+    # of the file backend store them under `checkpoint.latest`.
+    deployment = state.get("deployment")
+    if deployment is None:
+        checkpoint = state.get("checkpoint", {})
+        deployment = checkpoint.get("latest") or checkpoint.get("Latest") or {}
+    return deployment.get("resources") or []
+
+def urn_name(urn: str) -> str:
+    """
+    Returns:
+        str: The logical name of a resource, i.e. the last part of its URN.
+    """
+    return urn.split("::")[-1]
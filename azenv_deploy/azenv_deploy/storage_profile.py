@@ -0,0 +1,136 @@
+"""
+This module selects the storage accounts of the AzureML component by named profile:
+
+    dev:azureml:
+      storage_profile:
+        name: adls_gen2
+        redundancy: ZRS
+
+* `standard` (the default): the workspace storage account is StorageV2, Standard_GZRS.
+* `standard_zrs` and `standard_lrs`: the workspace storage account is StorageV2 with zone or
+  locally redundant storage, for a lower write latency than geo redundant storage.
+* `premium_block_blob`: a premium BlockBlobStorage data account, registered as the
+  `datastore_name` datastore of the workspace.
+* `adls_gen2`: a StorageV2 data account with hierarchical namespace (ADLS Gen2), registered
+  as the `datastore_name` datastore of the workspace.
+
+The workspace storage account has to stay a StorageV2 account without hierarchical
+namespace, so the premium and ADLS Gen2 profiles add a data account next to it rather than
+changing it. Every account gets private endpoints for the services it serves, in the
+matching `PRIVATE_DNS_ZONE_STORAGE_*` zones.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Literal, Optional, Tuple, Union
+from .constants import (
+    PRIVATE_DNS_ZONE_STORAGE_FILE,
+    PRIVATE_DNS_ZONE_STORAGE_BLOB,
+    PRIVATE_DNS_ZONE_STORAGE_DFS,
+)
+from .lazy_imports import lazy_import
+
+storage = lazy_import("pulumi_azure_native.storage")
+
+PROFILE_STANDARD = "standard"
+PROFILE_STANDARD_ZRS = "standard_zrs"
+PROFILE_STANDARD_LRS = "standard_lrs"
+PROFILE_PREMIUM_BLOCK_BLOB = "premium_block_blob"
+PROFILE_ADLS_GEN2 = "adls_gen2"
+DATA_ACCOUNT_PROFILES = (PROFILE_PREMIUM_BLOCK_BLOB, PROFILE_ADLS_GEN2)
+
+# The private DNS zone of each storage service, by private endpoint group id.
+STORAGE_DNS_ZONES = {
+    "file": PRIVATE_DNS_ZONE_STORAGE_FILE,
+    "blob": PRIVATE_DNS_ZONE_STORAGE_BLOB,
+    "dfs": PRIVATE_DNS_ZONE_STORAGE_DFS,
+}
+# The workspace storage account serves the file shares of the notebooks as well.
+WORKSPACE_GROUP_IDS = ("file", "blob", "dfs")
+
+@dataclass(frozen=True)
+class StorageAccountSpec:
+    """
+    The kind, SKU and private endpoints of a storage account.
+    """
+    kind: str
+    sku: str
+    is_hns_enabled: bool = False
+    # Premium accounts have no access tier.
+    access_tier: Optional[str] = "Hot"
+    # The private endpoint group ids, one endpoint each.
+    group_ids: Tuple[str, ...] = WORKSPACE_GROUP_IDS
+
+    def private_dns_zones(self) -> Tuple[Tuple[str, str], ...]:
+        """
+        Returns:
+            Tuple[Tuple[str, str], ...]: The private DNS zone and group id of each endpoint.
+        """
+        return tuple((STORAGE_DNS_ZONES[group_id], group_id) for group_id in self.group_ids)
+
+@dataclass
+class StorageProfile:
+    """
+    A class for selecting the storage accounts of the AzureML component.
+
+    Attributes:
+        name (str): The profile, see the module docstring.
+        redundancy (Optional[str]): `ZRS` or `LRS` for the data account of the
+            `premium_block_blob` and `adls_gen2` profiles, `ZRS` by default.
+        datastore_name (str): The workspace datastore of the data account.
+        container_name (str): The blob container, or ADLS Gen2 file system, of the datastore.
+    """
+    name: Literal["standard", "standard_zrs", "standard_lrs", "premium_block_blob",
+                  "adls_gen2"] = PROFILE_STANDARD
+    redundancy: Optional[Literal["ZRS", "LRS"]] = None
+    datastore_name: str = "training_data"
+    container_name: str = "training-data"
+
+    def __post_init__(self):
+        if self.redundancy and self.name not in DATA_ACCOUNT_PROFILES:
+            raise ValueError(f"`redundancy` only applies to the data account profiles, "
+                             f"`{self.name}` sets the SKU of the workspace storage account.")
+
+    @classmethod
+    def from_config(
+            cls,
+            config: Union["StorageProfile", Dict[str, Any], None]
+    ) -> "StorageProfile":
+        """Build a profile from the stack config, which may be a plain dict."""
+        if isinstance(config, dict):
+            return cls(**config)
+        return config if config is not None else cls()
+
+    def workspace_account(self) -> StorageAccountSpec:
+        """
+        Returns:
+            StorageAccountSpec: The workspace storage account.
+        """
+        sku = {
+            PROFILE_STANDARD_ZRS: "Standard_ZRS",
+            PROFILE_STANDARD_LRS: "Standard_LRS",
+        }.get(self.name, "Standard_GZRS")
+        return StorageAccountSpec(kind="StorageV2", sku=sku)
+
+    def data_account(self) -> Optional[StorageAccountSpec]:
+        """
+        Returns:
+            Optional[StorageAccountSpec]: The data account, if the profile has one.
+        """
+        redundancy = self.redundancy or "ZRS"
+        if self.name == PROFILE_PREMIUM_BLOCK_BLOB:
+            return StorageAccountSpec(kind="BlockBlobStorage", sku=f"Premium_{redundancy}",
+                                      access_tier=None, group_ids=("blob",))
+        if self.name == PROFILE_ADLS_GEN2:
+            return StorageAccountSpec(kind="StorageV2", sku=f"Standard_{redundancy}",
+                                      is_hns_enabled=True, group_ids=("blob", "dfs"))
+        return None
+
+def network_rule_set(enable_private_endpoints: bool) -> Any:
+    """
+    Returns:
+        storage.NetworkRuleSetArgs: The network rules of the storage accounts, denying
+            public traffic when they are reached through private endpoints.
+    """
+    return storage.NetworkRuleSetArgs(
+        bypass=storage.Bypass.AZURE_SERVICES,
+        default_action=storage.DefaultAction.DENY if enable_private_endpoints
+        else storage.DefaultAction.ALLOW)
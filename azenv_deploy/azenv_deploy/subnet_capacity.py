@@ -0,0 +1,304 @@
+"""
+This module plans the IP addresses the AzureML component takes in its subnet.
+
+Every compute instance, every compute cluster node and every private endpoint gets an IP in
+the subnet of `private_endpoint_subnet_name`. The peak consumption counts the clusters at
+`max_node_count`, and the private endpoints twice when they are created before being
+deleted. Azure reserves 5 addresses of every address prefix of a subnet.
+
+With `subnet_min_headroom` in the stack config, e.g. `0.2`, `pulumi preview` fails when
+less than that share of the usable addresses is left at peak. The check can run
+offline as well, from CIDRs, a subnet file, or the invoke disk cache:
+
+    python -m azenv_deploy.azenv_deploy.subnet_capacity --stack dev --cidr 10.0.1.0/24
+    python -m azenv_deploy.azenv_deploy.subnet_capacity --stack dev --cache-dir .invoke-cache/dev
+"""
+import argparse
+import ipaddress
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+import pulumi
+import yaml
+from . import invoke_cache
+from .quota import load_azureml_config
+from .storage_profile import StorageProfile
+from .container_registry import data_endpoint_count
+from .update_planner import load_stack_config, project_name
+
+# Addresses Azure reserves in every address prefix: network, gateway, 2 for DNS, broadcast.
+AZURE_RESERVED_ADDRESSES = 5
+DEFAULT_MIN_HEADROOM = 0.2
+# The IPs of each private endpoint of the component, by name suffix. The registry endpoint
+# has a data endpoint IP per region of the registry as well, and the workspace one has its
+# API, cert and notebook IPs.
+PRIVATE_ENDPOINT_IPS = {
+    "file-pe": 1,
+    "blob-pe": 1,
+    "dfs-pe": 1,
+    "acr-pe": 2,
+    "kv-pe": 1,
+    "ws-pe": 3,
+}
+
+class SubnetCapacityError(ValueError):
+    """
+    Raised when the subnet has less headroom than required at peak.
+    """
+
+@dataclass
+class IpDemand:
+    """
+    The IPs the component takes at peak, by consumer.
+    """
+    instances: int = 0
+    cluster_nodes: Dict[str, int] = field(default_factory=dict)
+    private_endpoints: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        """All the IPs taken at peak."""
+        return self.instances + sum(self.cluster_nodes.values()) + \
+            sum(self.private_endpoints.values())
+
+@dataclass
+class SubnetCapacity:
+    """
+    The usable addresses of a subnet and the IPs the component takes at peak.
+    """
+    prefixes: List[str]
+    usable: int
+    demand: IpDemand
+
+    @property
+    def free(self) -> int:
+        """The addresses left at peak, negative when the subnet is too small."""
+        return self.usable - self.demand.total
+
+    @property
+    def headroom(self) -> float:
+        """The share of the usable addresses left at peak."""
+        return self.free / self.usable if self.usable else 0.0
+
+def usable_addresses(prefixes: Sequence[str]) -> int:
+    """
+    Returns:
+        int: The addresses of the IPv4 prefixes, without the ones Azure reserves.
+    """
+    usable = 0
+    for prefix in prefixes:
+        network = ipaddress.ip_network(prefix, strict=False)
+        if network.version == 4:
+            usable += max(network.num_addresses - AZURE_RESERVED_ADDRESSES, 0)
+    return usable
+
+def ip_demand(args: Any) -> IpDemand:
+    """
+    Count the IPs of the component at peak.
+
+    Args:
+        args (AzureMLArgs): The component arguments, or any object with their compute
+            configs, `enable_private_endpoints`, `private_endpoint_replacement`,
+            `storage_profile` and `container_registry`.
+
+    Returns:
+        IpDemand: The IPs of the compute instances, cluster nodes and private endpoints.
+    """
+    demand = IpDemand(
+        instances=len(args.compute_instance_config),
+        cluster_nodes={name: cluster["max_node_count"]
+                       for name, cluster in args.compute_cluster_config.items()})
+    if getattr(args, "enable_private_endpoints", False):
+        replacement = getattr(args, "private_endpoint_replacement", None)
+        if isinstance(replacement, dict):
+            create_before_delete = replacement.get("create_before_delete", False)
+        else:
+            create_before_delete = getattr(replacement, "create_before_delete", False)
+        # Replaced endpoints take a second IP until the old one is deleted.
+        factor = 2 if create_before_delete else 1
+        demand.private_endpoints = {
+            name: ips * factor for name, ips in PRIVATE_ENDPOINT_IPS.items()}
+        # The replica endpoints are in the subnets of their regions, but their data
+        # endpoints take an IP in the registry endpoint of this subnet too.
+        demand.private_endpoints["acr-pe"] += factor * (
+            data_endpoint_count(getattr(args, "container_registry", None)) - 1)
+        # The data account of the storage profile has an endpoint per storage service.
+        data_account = StorageProfile.from_config(
+            getattr(args, "storage_profile", None)).data_account()
+        for group_id in data_account.group_ids if data_account else ():
+            demand.private_endpoints[f"dat-{group_id}-pe"] = factor
+    return demand
+
+def check_capacity(
+        prefixes: Sequence[str],
+        demand: IpDemand,
+        min_headroom: float = DEFAULT_MIN_HEADROOM) -> SubnetCapacity:
+    """
+    Check the subnet keeps enough free addresses at peak.
+
+    Args:
+        prefixes (Sequence[str]): The address prefixes of the subnet.
+        demand (IpDemand): The IPs taken at peak.
+        min_headroom (float): The share of the usable addresses to keep free.
+
+    Returns:
+        SubnetCapacity: The capacity of the subnet.
+
+    Raises:
+        (SubnetCapacityError): The headroom at peak is lower than `min_headroom`.
+    """
+    capacity = SubnetCapacity(list(prefixes), usable_addresses(prefixes), demand)
+    if capacity.headroom < min_headroom:
+        raise SubnetCapacityError(
+            f"The subnet {', '.join(prefixes)} has {capacity.usable} usable IPs, and "
+            f"{demand.total} are taken at peak ({format_demand(demand)}): "
+            f"{capacity.headroom:.0%} headroom, {min_headroom:.0%} is required.")
+    return capacity
+
+def format_demand(demand: IpDemand) -> str:
+    """
+    Returns:
+        str: The IPs of each kind of consumer.
+    """
+    return (f"{demand.instances} compute instances, "
+            f"{sum(demand.cluster_nodes.values())} cluster nodes, "
+            f"{sum(demand.private_endpoints.values())} private endpoint IPs")
+
+def subnet_prefixes(subnet: Any) -> List[str]:
+    """
+    Returns:
+        List[str]: The address prefixes of a `get_subnet` result, or of a dict with either
+            snake_case or camelCase fields.
+    """
+    if isinstance(subnet, dict):
+        prefixes = subnet.get("address_prefixes") or subnet.get("addressPrefixes")
+        prefix = subnet.get("address_prefix") or subnet.get("addressPrefix")
+    else:
+        prefixes = getattr(subnet, "address_prefixes", None)
+        prefix = getattr(subnet, "address_prefix", None)
+    return list(prefixes or ([prefix] if prefix else []))
+
+def load_subnet_prefixes(path: str, subnet_name: Optional[str] = None) -> List[str]:
+    """
+    Load the address prefixes of a subnet from a YAML or JSON file: a CIDR, a list of CIDRs,
+    a subnet with `address_prefix(es)`, or invokes recorded with `AZENV_RECORD_INVOKES`.
+
+    Raises:
+        (ValueError): The file has no prefixes.
+    """
+    with open(path, encoding="utf-8") as subnet_file:
+        raw = yaml.safe_load(subnet_file)
+    if isinstance(raw, dict) and "invokes" in raw:
+        raw = next((invoke["result"] for invoke in raw["invokes"]
+                    if invoke["token"] == invoke_cache.GET_SUBNET_TOKEN and (
+                        subnet_name is None or invoke["args"].get("subnetName") == subnet_name)),
+                   None)
+    if isinstance(raw, str):
+        prefixes = [raw]
+    elif isinstance(raw, list):
+        prefixes = [str(prefix) for prefix in raw]
+    else:
+        prefixes = subnet_prefixes(raw or {})
+    if not prefixes:
+        raise ValueError(f"No subnet address prefix in `{path}`.")
+    return prefixes
+
+def cached_subnet_prefixes(
+        cache_dir: str,
+        resource_group_name: str,
+        virtual_network_name: str,
+        subnet_name: str) -> List[str]:
+    """
+    Read the address prefixes of a subnet from the invoke disk cache, even if expired.
+
+    Raises:
+        (ValueError): The subnet is not in the cache.
+    """
+    key = invoke_cache.make_key(invoke_cache.GET_SUBNET_TOKEN, {
+        "resource_group_name": resource_group_name,
+        "virtual_network_name": virtual_network_name,
+        "subnet_name": subnet_name,
+    })
+    # The capacity plan doesn't mind stale entries, subnets are rarely resized.
+    disk = invoke_cache.DiskCache(cache_dir, ttl_seconds={invoke_cache.GET_SUBNET_TOKEN: 2**62})
+    fields = disk.load(key)
+    if not fields or not subnet_prefixes(fields):
+        raise ValueError(f"The subnet `{subnet_name}` is not in the invoke cache `{cache_dir}`.")
+    return subnet_prefixes(fields)
+
+def check_subnet_output(args: Any, min_headroom: float) -> "pulumi.Output[SubnetCapacity]":
+    """
+    Check the capacity of the subnet of the component, with the cached `get_subnet` result
+    it uses as well.
+
+    Args:
+        args (AzureMLArgs): The component arguments.
+        min_headroom (float): The share of the usable addresses to keep free.
+
+    Returns:
+        Output[SubnetCapacity]: The capacity of the subnet. It fails the deployment with a
+            `SubnetCapacityError` when the headroom is too low.
+    """
+    demand = ip_demand(args)
+    subnet = invoke_cache.get_subnet_output(
+        resource_group_name=args.vnet_resource_group_name,
+        virtual_network_name=args.vnet_name,
+        subnet_name=args.private_endpoint_subnet_name)
+    return subnet.apply(lambda result: check_capacity(
+        subnet_prefixes(result), demand, min_headroom))
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Check the IP capacity of the subnet of a stack.
+    """
+    parser = argparse.ArgumentParser(description="Check the IP capacity of a stack's subnet.")
+    parser.add_argument("--project-dir", default="projects/dev")
+    parser.add_argument("--stack", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--cidr", nargs="+", help="The address prefixes of the subnet.")
+    source.add_argument("--subnet-file", help="A file with the subnet address prefixes.")
+    source.add_argument("--cache-dir", help="The invoke disk cache of the stack.")
+    parser.add_argument("--min-headroom", type=float, default=None,
+                        help="Defaults to `subnet_min_headroom` of the stack, or "
+                             f"{DEFAULT_MIN_HEADROOM}.")
+    options = parser.parse_args(argv)
+
+    with open(os.path.join(options.project_dir, f"Pulumi.{options.stack}.yaml"),
+              encoding="utf-8") as stack_file:
+        config = load_stack_config(stack_file.read(), project_name(options.project_dir))
+    common = config.get("common") or {}
+    azureml_config = load_azureml_config(options.project_dir, options.stack)
+    # `ip_demand` reads the stack-wide settings next to the compute configs.
+    args = argparse.Namespace(
+        compute_instance_config=azureml_config.compute_instance_config,
+        compute_cluster_config=azureml_config.compute_cluster_config,
+        enable_private_endpoints=str(config.get("enable_private_endpoints", True)).lower()
+        == "true",
+        private_endpoint_replacement=azureml_config.private_endpoint_replacement,
+        storage_profile=azureml_config.storage_profile,
+        container_registry=azureml_config.container_registry)
+    if options.cidr:
+        prefixes = options.cidr
+    elif options.subnet_file:
+        prefixes = load_subnet_prefixes(options.subnet_file,
+                                        common.get("private_endpoint_subnet_name"))
+    else:
+        prefixes = cached_subnet_prefixes(
+            options.cache_dir, common.get("vnet_resource_group_name"),
+            common.get("vnet_name"), common.get("private_endpoint_subnet_name"))
+    min_headroom = options.min_headroom
+    if min_headroom is None:
+        min_headroom = float(config.get("subnet_min_headroom", DEFAULT_MIN_HEADROOM))
+    demand = ip_demand(args)
+    try:
+        capacity = check_capacity(prefixes, demand, min_headroom)
+    except SubnetCapacityError as error:
+        print(f"error: {error}")
+        return 1
+    print(f"{', '.join(prefixes)}: {capacity.usable} usable IPs, {demand.total} taken at peak "
+          f"({format_demand(demand)}), {capacity.free} free ({capacity.headroom:.0%} headroom)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+This module builds a per-resource deploy timeline from the Pulumi engine events, grouped by
+the sections of the `AzureML` component, i.e. storage, ACR, key vault, insights, workspace,
+computes and endpoints.
+
+The events come either from an event log:
+
+    pulumi up --event-log events.jsonl
+    python -m azenv_deploy.azenv_deploy.timeline events.jsonl --html timeline.html \\
+        --csv timeline.csv --durations durations.json
+
+or from the Automation API, with `stack.up(on_event=recorder.on_event)` and a
+`TimelineRecorder`. The durations file holds the mean duration of each resource type, for
+`resource_graph --durations`.
+"""
+import argparse
+import csv
+import html
+import json
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .state import urn_name
+
+SECTIONS = ("storage", "acr", "kv", "insights", "workspace", "computes", "endpoints", "other")
+SECTION_COLORS = {
+    "storage": "#4e79a7",
+    "acr": "#f28e2b",
+    "kv": "#e15759",
+    "insights": "#76b7b2",
+    "workspace": "#59a14f",
+    "computes": "#edc948",
+    "endpoints": "#b07aa1",
+    "other": "#9c755f",
+}
+# The section of each resource type module, e.g. `storage` in
+# `azure-native:storage:StorageAccount`.
+MODULE_SECTIONS = {
+    "storage": "storage",
+    "containerregistry": "acr",
+    "keyvault": "kv",
+    "insights": "insights",
+    "operationalinsights": "insights",
+    "network": "endpoints",
+}
+CSV_FIELDS = ("section", "name", "type", "op", "status", "start_s", "finish_s", "duration_s",
+              "urn")
+
+@dataclass
+class ResourceSpan:
+    """
+    The time a resource operation took, in seconds since the first operation started.
+    """
+    urn: str
+    type: str
+    op: str
+    start_s: float
+    finish_s: Optional[float] = None
+    status: str = "running"
+
+    @property
+    def name(self) -> str:
+        """The logical name of the resource."""
+        return urn_name(self.urn)
+
+    @property
+    def section(self) -> str:
+        """The `AzureML` section of the resource."""
+        return resource_section(self.type)
+
+    @property
+    def duration_s(self) -> float:
+        """The duration of the operation, 0 while it is running."""
+        return 0.0 if self.finish_s is None else self.finish_s - self.start_s
+
+def resource_section(typ: str) -> str:
+    """
+    Returns:
+        str: The `AzureML` section a resource type belongs to.
+    """
+    parts = typ.split(":")
+    if typ == "random:index/randomString:RandomString":
+        return "computes"
+    if len(parts) == 3 and parts[1] in ("machinelearning", "machinelearningservices"):
+        return "computes" if parts[2] == "Compute" else "workspace"
+    if len(parts) == 3 and parts[0] == "azure-native":
+        return MODULE_SECTIONS.get(parts[1], "other")
+    return "other"
+
+def _op_name(op: Any) -> str:
+    # `OpType` is an enum in the Automation API, and a string in the event log.
+    return getattr(op, "value", str(op))
+
+class TimelineRecorder:
+    """
+    Turns engine events into resource spans. Pass `on_event` to the Automation API.
+
+    A replacement runs several steps on the same URN, e.g. `create-replacement`, `replace`
+    and `delete-replaced`, so the spans are keyed by URN and operation.
+    """
+    def __init__(self):
+        self.spans: Dict[Tuple[str, str], ResourceSpan] = {}
+        self._origin: Optional[float] = None
+
+    def _time(self, timestamp: float) -> float:
+        if self._origin is None:
+            self._origin = timestamp
+        return timestamp - self._origin
+
+    def on_event(self, event: Any) -> None:
+        """
+        Consume an `EngineEvent` of the Automation API.
+        """
+        if event.resource_pre_event is not None:
+            metadata = event.resource_pre_event.metadata
+            op = _op_name(metadata.op)
+            # Components and unchanged resources don't provision anything.
+            if op in ("same", "read") or metadata.type.startswith(("pulumi:", "azenv_deploy:")):
+                return
+            self.spans[(metadata.urn, op)] = ResourceSpan(
+                metadata.urn, metadata.type, op, self._time(event.timestamp))
+            return
+        for finished, status in ((event.res_outputs_event, "done"),
+                                 (event.res_op_failed_event, "failed")):
+            if finished is None:
+                continue
+            key = (finished.metadata.urn, _op_name(finished.metadata.op))
+            if key in self.spans:
+                span = self.spans[key]
+                span.finish_s, span.status = self._time(event.timestamp), status
+
+    def sorted_spans(self) -> List[ResourceSpan]:
+        """
+        Returns:
+            List[ResourceSpan]: The spans by section, then start time.
+        """
+        return sorted(self.spans.values(),
+                      key=lambda span: (SECTIONS.index(span.section), span.start_s, span.name))
+
+def load_event_log(path: str) -> TimelineRecorder:
+    """
+    Read the events of a `pulumi up --event-log` file.
+    """
+    # pylint: disable=import-outside-toplevel
+    from pulumi.automation.events import EngineEvent
+    recorder = TimelineRecorder()
+    with open(path, encoding="utf-8") as event_log:
+        for line in event_log:
+            if line.strip():
+                recorder.on_event(EngineEvent.from_json(json.loads(line)))
+    return recorder
+
+def write_csv(spans: Iterable[ResourceSpan], path: str) -> None:
+    """Write the spans as CSV, one row per resource operation."""
+    with open(path, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for span in spans:
+            writer.writerow({
+                "section": span.section, "name": span.name, "type": span.type, "op": span.op,
+                "status": span.status, "start_s": span.start_s,
+                "finish_s": "" if span.finish_s is None else span.finish_s,
+                "duration_s": span.duration_s, "urn": span.urn,
+            })
+
+def section_bounds(spans: Iterable[ResourceSpan]) -> Dict[str, Tuple[float, float]]:
+    """
+    Returns:
+        Dict[str, Tuple[float, float]]: The first start and last finish of each section.
+    """
+    bounds: Dict[str, Tuple[float, float]] = {}
+    for span in spans:
+        finish = span.start_s if span.finish_s is None else span.finish_s
+        start, end = bounds.get(span.section, (span.start_s, finish))
+        bounds[span.section] = (min(start, span.start_s), max(end, finish))
+    return bounds
+
+def _html_bar(total: float, bounds: Tuple[float, float], color: str, label: str,
+              tooltip: str) -> str:
+    start, end = bounds
+    left, width = 100 * start / total, max(100 * (end - start) / total, 0.2)
+    return (f'<div class="bar" style="left:{left:.3f}%;width:{width:.3f}%;'
+            f'background:{color}" title="{html.escape(tooltip)}">{html.escape(label)}</div>')
+
+def render_html(spans: List[ResourceSpan], title: str = "Deploy timeline") -> str:
+    """
+    Returns:
+        str: A self-contained HTML page with a bar per section and a bar per resource.
+    """
+    total = max([span.finish_s or span.start_s for span in spans] + [1.0])
+    rows = []
+    bounds = section_bounds(spans)
+    for section in SECTIONS:
+        section_spans = [span for span in spans if span.section == section]
+        if not section_spans:
+            continue
+        start, end = bounds[section]
+        section_bar = _html_bar(total, (start, end), SECTION_COLORS[section], section,
+                                f"{section}: {end - start:.0f}s")
+        rows.append(f'<div class="row section">{section_bar}</div>')
+        for span in section_spans:
+            end = span.start_s if span.finish_s is None else span.finish_s
+            tooltip = f"{span.name} ({span.type}) {span.op} {span.status}: {span.duration_s:.0f}s"
+            color = "#d62728" if span.status == "failed" else SECTION_COLORS[section]
+            span_bar = _html_bar(total, (span.start_s, end), color, span.name, tooltip)
+            rows.append(f'<div class="row">{span_bar}</div>')
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; font-size: 12px; }}
+.row {{ position: relative; height: 18px; margin: 1px 0; }}
+.section {{ height: 22px; margin-top: 8px; font-weight: bold; }}
+.bar {{ position: absolute; height: 100%; overflow: hidden; white-space: nowrap;
+        color: #fff; padding-left: 2px; box-sizing: border-box; border-radius: 2px; }}
+</style></head>
+<body><h1>{html.escape(title)}</h1><p>{len(spans)} resources, {total / 60:.1f} min</p>
+{chr(10).join(rows)}
+</body></html>
+"""
+
+def mean_durations(spans: Iterable[ResourceSpan]) -> Dict[str, float]:
+    """
+    Returns:
+        Dict[str, float]: The mean duration of the finished creations and updates of each
+            resource type, in seconds.
+    """
+    totals: Dict[str, List[float]] = {}
+    for span in spans:
+        # The `replace` step itself provisions nothing, its `create-replacement` does.
+        if span.status == "done" and span.op in ("create", "update", "create-replacement"):
+            totals.setdefault(span.type, []).append(span.duration_s)
+    return {typ: sum(values) / len(values) for typ, values in sorted(totals.items())}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Build the timeline of a deployment from its event log.
+    """
+    parser = argparse.ArgumentParser(description="Build a deploy timeline from an event log.")
+    parser.add_argument("event_log", help="The `pulumi up --event-log` file.")
+    parser.add_argument("--html", help="Write the flame chart to this file.")
+    parser.add_argument("--csv", help="Write the spans to this file.")
+    parser.add_argument("--durations", help="Write the mean duration by type to this file.")
+    options = parser.parse_args(argv)
+
+    spans = load_event_log(options.event_log).sorted_spans()
+    if options.html:
+        with open(options.html, "w", encoding="utf-8") as html_file:
+            html_file.write(render_html(spans, title=f"Deploy timeline of {options.event_log}"))
+    if options.csv:
+        write_csv(spans, options.csv)
+    if options.durations:
+        with open(options.durations, "w", encoding="utf-8") as durations_file:
+            json.dump(mean_durations(spans), durations_file, indent=2)
+    for section, (start, end) in sorted(section_bounds(spans).items(),
+                                        key=lambda item: item[1][0]):
+        print(f"{section:<10} {start:>7.0f}s -> {end:>7.0f}s  ({end - start:.0f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
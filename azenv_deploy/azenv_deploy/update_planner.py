@@ -0,0 +1,284 @@
+"""
+This module plans targeted updates of an AzureML stack from a change of its stack config.
+
+When only `compute_instance_config` or `compute_cluster_config` entries changed, only the
+compute resources of those entries need to be updated. The planner compares the previous
+and the new `azureml` config, maps the changed entries to their resource URNs, and runs
+`pulumi up --target <urn> ... --target-dependents`. Any other change falls back to a full
+`pulumi up`.
+
+A change of the image build cluster updates the workspace as well, so it gets a full
+update. The previous content of a `compute_instance_roster` file is unknown, so the stacks with a
+roster get a full update as well.
+
+With compute shards, a shard stack only targets the computes it deploys, children of its
+`AzureMLComputeShard` component. The core stack deploys no computes, so its compute changes
+fall back to a full update.
+
+Usage, from the project directory:
+
+    python -m azenv_deploy.azenv_deploy.update_planner --stack dev --since HEAD~1
+    python -m azenv_deploy.azenv_deploy.update_planner --stack dev --previous old.yaml --run
+"""
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+import yaml
+from .azureml import AzureMLYamlConfig
+from . import compute_names, sharding
+
+AZUREML_TYPE = "azenv_deploy:azureml:AzureML"
+SHARD_TYPE = "azenv_deploy:azureml:AzureMLComputeShard"
+COMPUTE_TYPE = "azure-native:machinelearningservices:Compute"
+# The stack config keys that only affect the compute resources.
+COMPUTE_CONFIG_KEYS = {
+    "compute_instance_config",
+    "compute_cluster_config",
+    "compute_cluster_suffix_mode",
+    "compute_cluster_suffixes",
+}
+
+@dataclass
+class EntryChanges:
+    """
+    The names of the added, removed and changed entries of a config section.
+    """
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+
+    @property
+    def names(self) -> List[str]:
+        """All the names of the entries to update."""
+        return sorted(set(self.added) | set(self.removed) | set(self.changed))
+
+@dataclass
+class UpdatePlan:
+    """
+    The targets of an update, or `None` targets for a full update.
+    """
+    targets: Optional[List[str]]
+    reason: str
+    instances: EntryChanges = field(default_factory=EntryChanges)
+    clusters: EntryChanges = field(default_factory=EntryChanges)
+
+    @property
+    def is_full_update(self) -> bool:
+        """Whether the whole stack has to be updated."""
+        return self.targets is None
+
+    def command(self, stack: str) -> List[str]:
+        """
+        Returns:
+            List[str]: The `pulumi up` command line of the plan, empty when there is nothing
+                to update.
+        """
+        if self.targets == []:
+            return []
+        command = ["pulumi", "up", "--stack", stack]
+        for target in self.targets or []:
+            command += ["--target", target]
+        if self.targets:
+            command.append("--target-dependents")
+        return command
+
+def diff_entries(previous: Dict[str, Any], new: Dict[str, Any]) -> EntryChanges:
+    """
+    Compare the entries of a config section by name.
+    """
+    return EntryChanges(
+        added=sorted(set(new) - set(previous)),
+        removed=sorted(set(previous) - set(new)),
+        changed=sorted(name for name in set(previous) & set(new)
+                       if previous[name] != new[name]))
+
+def child_urn(stack: str, project: str, typ: str, name: str,
+              parent_type: str = AZUREML_TYPE) -> str:
+    """
+    Returns:
+        str: The URN of a resource registered by the AzureML component, or by the
+            `parent_type` component, e.g. `SHARD_TYPE`.
+    """
+    return f"urn:pulumi:{stack}::{project}::{parent_type}${typ}::{name}"
+
+def shard_entries(changes: EntryChanges, computes: Set[str]) -> EntryChanges:
+    """
+    Returns:
+        EntryChanges: The changes of the entries deployed by a compute shard.
+    """
+    return EntryChanges(
+        added=[name for name in changes.added if name in computes],
+        removed=[name for name in changes.removed if name in computes],
+        changed=[name for name in changes.changed if name in computes])
+
+def _suffixes(config: Dict[str, Any], stack: str, name: str) -> Dict[str, str]:
+    return compute_names.cluster_suffixes(
+        config["compute_cluster_suffix_mode"], stack, name,
+        config["compute_cluster_config"].keys(),
+        pinned=config["compute_cluster_suffixes"],
+        reserved_names=config["compute_instance_config"].keys())
+
+def _has_random_suffix(config: Dict[str, Any], suffixes: Dict[str, str], cluster: str) -> bool:
+    return cluster in config["compute_cluster_config"] and cluster not in suffixes
+
+def _shard_computes(
+        previous: Dict[str, Any], new: Dict[str, Any], shards: List[str], stack: str) -> Set[str]:
+    # The core stack creates the image build cluster, which is unchanged here.
+    build_compute = (new.get("image_build") or {}).get("compute")
+    keys = {key for config in (previous, new)
+            for section in ("compute_instance_config", "compute_cluster_config")
+            for key in config[section]} - {build_compute}
+    return set(sharding.shard_computes(sorted(keys), shards, stack))
+
+def plan_update( # pylint: disable=too-many-locals,too-many-return-statements
+        previous: Dict[str, Any],
+        new: Dict[str, Any],
+        stack: str,
+        project: str) -> UpdatePlan:
+    """
+    Plan the update of a stack from its previous and new config.
+
+    Args:
+        previous (Dict[str, Any]): The previous stack config, without the project namespace,
+            i.e. `prefix`, `common`, `azureml`, etc.
+        new (Dict[str, Any]): The new stack config.
+        stack (str): The stack name.
+        project (str): The Pulumi project name.
+
+    Returns:
+        UpdatePlan: The plan of the update.
+    """
+    other_keys = sorted(key for key in set(previous) | set(new)
+                        if key != "azureml" and previous.get(key) != new.get(key))
+    if other_keys:
+        return UpdatePlan(None, f"changed stack config: {', '.join(other_keys)}")
+
+    previous_azureml = AzureMLYamlConfig(**(previous.get("azureml") or {})).model_dump()
+    new_azureml = AzureMLYamlConfig(**(new.get("azureml") or {})).model_dump()
+    other_keys = sorted(key for key in new_azureml
+                        if key not in COMPUTE_CONFIG_KEYS
+                        and previous_azureml[key] != new_azureml[key])
+    if other_keys:
+        return UpdatePlan(None, f"changed azureml config: {', '.join(other_keys)}")
+    if new_azureml["compute_instance_roster"]:
+        return UpdatePlan(None, "the compute instance roster may have changed")
+
+    instances = diff_entries(
+        previous_azureml["compute_instance_config"], new_azureml["compute_instance_config"])
+    clusters = diff_entries(
+        previous_azureml["compute_cluster_config"], new_azureml["compute_cluster_config"])
+
+    # A cluster is renamed when its suffix changes, e.g. when switching the suffix mode.
+    previous_suffixes = _suffixes(previous_azureml, stack, f"{previous['prefix']}azml")
+    new_suffixes = _suffixes(new_azureml, stack, f"{new['prefix']}azml")
+    renamed = {cluster for cluster in new_azureml["compute_cluster_config"]
+               if cluster in previous_azureml["compute_cluster_config"]
+               and previous_suffixes.get(cluster) != new_suffixes.get(cluster)}
+    clusters.changed = sorted(set(clusters.changed) | renamed)
+
+    # The workspace builds its images on the image build cluster, by its compute name.
+    build_compute = (new_azureml.get("image_build") or {}).get("compute")
+    if build_compute in clusters.names:
+        return UpdatePlan(None, f"changed image build compute: {build_compute}",
+                          instances, clusters)
+
+    # The `sharding` config is unchanged here, so the computes keep their shard.
+    shards = (new.get("sharding") or {}).get("shards") or []
+    parent_type = AZUREML_TYPE
+    if shards and stack not in shards:
+        if instances.names or clusters.names:
+            return UpdatePlan(None, "the computes of a sharded core stack are deployed by "
+                              "its shards", instances, clusters)
+        return UpdatePlan([], "no compute change", instances, clusters)
+    if shards:
+        computes = _shard_computes(previous_azureml, new_azureml, shards, stack)
+        instances = shard_entries(instances, computes)
+        clusters = shard_entries(clusters, computes)
+        renamed &= computes
+        parent_type = SHARD_TYPE
+
+    targets: Set[str] = {child_urn(stack, project, COMPUTE_TYPE, compute, parent_type)
+                         for compute in instances.names + clusters.names}
+    # The `RandomString` suffix is created or deleted with its cluster, and when the
+    # cluster switches between a random and a known suffix. Only existing or new
+    # `RandomString` resources can be targeted.
+    for cluster in set(clusters.added) | set(clusters.removed) | renamed:
+        if _has_random_suffix(previous_azureml, previous_suffixes, cluster) \
+                or _has_random_suffix(new_azureml, new_suffixes, cluster):
+            targets.add(child_urn(
+                stack, project, compute_names.RANDOM_STRING_TYPE, f"{cluster}-suffix",
+                parent_type))
+    if not targets:
+        return UpdatePlan([], "no compute change", instances, clusters)
+    return UpdatePlan(sorted(targets), "compute changes only", instances, clusters)
+
+def load_stack_config(content: str, project: str) -> Dict[str, Any]:
+    """
+    Load the config of a `Pulumi.<stack>.yaml` file, without the project namespace.
+    """
+    raw = (yaml.safe_load(content) or {}).get("config") or {}
+    namespace = f"{project}:"
+    return {key[len(namespace):]: value for key, value in raw.items()
+            if key.startswith(namespace)}
+
+def project_name(project_dir: str) -> str:
+    """
+    Returns:
+        str: The name of the Pulumi project in a directory.
+    """
+    with open(os.path.join(project_dir, "Pulumi.yaml"), encoding="utf-8") as project_file:
+        return yaml.safe_load(project_file)["name"]
+
+def git_stack_file(project_dir: str, stack: str, ref: str) -> str:
+    """
+    Returns:
+        str: The content of `Pulumi.<stack>.yaml` at a git ref, e.g. `HEAD~1`.
+    """
+    return subprocess.run(
+        ["git", "show", f"{ref}:./Pulumi.{stack}.yaml"],
+        cwd=project_dir, capture_output=True, text=True, check=True).stdout
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Plan, and optionally run, the targeted update of a stack.
+    """
+    parser = argparse.ArgumentParser(description="Plan a targeted `pulumi up` of a stack.")
+    parser.add_argument("--stack", required=True)
+    parser.add_argument("--project-dir", default=".")
+    previous_group = parser.add_mutually_exclusive_group(required=True)
+    previous_group.add_argument("--previous", help="The previous Pulumi.<stack>.yaml file.")
+    previous_group.add_argument("--since", help="Read the previous stack file at a git ref.")
+    parser.add_argument("--run", action="store_true", help="Run the planned update.")
+    options = parser.parse_args(argv)
+
+    project = project_name(options.project_dir)
+    stack_file = os.path.join(options.project_dir, f"Pulumi.{options.stack}.yaml")
+    with open(stack_file, encoding="utf-8") as new_file:
+        new = load_stack_config(new_file.read(), project)
+    if options.previous:
+        with open(options.previous, encoding="utf-8") as previous_file:
+            previous_content = previous_file.read()
+    else:
+        previous_content = git_stack_file(options.project_dir, options.stack, options.since)
+    plan = plan_update(load_stack_config(previous_content, project), new, options.stack, project)
+
+    if plan.targets == []:
+        print(f"no update needed: {plan.reason}")
+        return 0
+    print(f"{'full' if plan.is_full_update else 'targeted'} update: {plan.reason}")
+    print(shlex.join(plan.command(options.stack)))
+    if not options.run:
+        return 0
+
+    # pylint: disable=import-outside-toplevel
+    from pulumi import automation as auto
+    stack = auto.select_stack(stack_name=options.stack, work_dir=options.project_dir)
+    stack.up(target=plan.targets, target_dependents=bool(plan.targets), on_output=print)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,28 @@
 # import pulumi
 # from pulumi_azure_native import storage
 # from pulumi_azure_native import resources
+import pulumi
 from config import AzEnvConfig
-from azenv_deploy.azenv_deploy import azureml
+from azenv_deploy.azenv_deploy import azureml, subnet_capacity
+from azenv_deploy.azenv_deploy.invoke_cache import INVOKE_CACHE
+from azenv_deploy.azenv_deploy.lazy_imports import log_import_report
 
 # Get configuration from Yaml
 config = AzEnvConfig()
-azureml.AzureML(f"{config.prefix}azml",
-                config.azureml_args)
+if config.sharding.is_shard(pulumi.get_stack()):
+    # A compute shard deploys its computes into the workspace of the core stack.
+    core = pulumi.StackReference(config.sharding.core_stack)
+    azureml.AzureMLComputeShard(f"{config.prefix}azml",
+                                config.azureml_args,
+                                shard=pulumi.get_stack(),
+                                workspace_name=core.require_output("workspace_name"),
+                                core_stack=config.sharding.core_stack.split("/")[-1])
+else:
+    ml = azureml.AzureML(f"{config.prefix}azml",
+                         config.azureml_args)
+    pulumi.export("workspace_name", ml.workspace.name)
+    if config.subnet_min_headroom is not None and config.azureml_args.private_endpoint_subnet_name:
+        # Fails the preview when the subnet can't hold the computes at full scale.
+        subnet_capacity.check_subnet_output(config.azureml_args, config.subnet_min_headroom)
+INVOKE_CACHE.log_stats()
+log_import_report()
@@ -1,9 +1,11 @@
 """Configuration of the project"""
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import os
 import re
 import pulumi
-from azenv_deploy.azenv_deploy import azureml
+import pydantic
+from azenv_deploy.azenv_deploy import azureml, container_registry, invoke_cache, roster
 
 @dataclass
 class CommonArgs: # pylint: disable=too-few-public-methods
@@ -14,21 +16,119 @@ class CommonArgs: # pylint: disable=too-few-public-methods
     vnet_name: str
     private_endpoint_subnet_name: str
 
+@dataclass
+class InvokeCacheArgs: # pylint: disable=too-few-public-methods
+    """Class for storing the settings of the on-disk invoke cache."""
+    enabled: bool = False
+    directory: Optional[str] = None
+    # TTL in seconds by invoke token, e.g. `azure-native:network:getSubnet: 3600`.
+    ttl_seconds: Dict[str, int] = field(default_factory=dict)
+    refresh: bool = False
+
+    def enable(self) -> None:
+        """Enable the on-disk invoke cache, and the invoke recording, if they are set."""
+        if self.enabled:
+            invoke_cache.enable_disk_cache(
+                pulumi.get_stack(),
+                directory=self.directory,
+                ttl_seconds=self.ttl_seconds,
+                # The `AZENV_REFRESH_CACHE` environment variable refreshes the cache as well.
+                refresh=self.refresh or None)
+        if os.environ.get(invoke_cache.RECORD_INVOKES_ENV):
+            invoke_cache.enable_recording(os.environ[invoke_cache.RECORD_INVOKES_ENV])
+
+@dataclass
+class ShardingArgs: # pylint: disable=too-few-public-methods
+    """Class for the compute shard stacks of a large fleet, see `sharding`."""
+    # The shard stacks, deploying the computes of the core stack's workspace.
+    shards: List[str] = field(default_factory=list)
+    # The fully qualified core stack, e.g. `my-org/dev/core`, the shards reference.
+    core_stack: Optional[str] = None
+
+    def is_shard(self, stack: str) -> bool:
+        """Whether a stack is a compute shard."""
+        return stack in self.shards
+
+class ConfigValidationError(ValueError):
+    """Raised with all the errors of the stack config at once."""
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid stack config:\n" + "\n".join(f"  - {error}" for error in errors))
+
+def pydantic_errors(key: str, error: pydantic.ValidationError) -> List[str]:
+    """
+    Returns:
+        List[str]: The errors of a config object, with the path of each invalid value.
+    """
+    return [".".join([key] + [str(loc) for loc in item["loc"]]) + f": {item['msg']}"
+            for item in error.errors()]
+
 class AzEnvConfig: # pylint: disable=too-few-public-methods
     """Turning the pulumi configuration file into objects."""
     def __init__(self):
         config = pulumi.Config()
-        self.prefix = config.require("prefix")
-        validate_prefix(self.prefix)
-        self.common = CommonArgs(**config.require_object("common"))
-        enable_private_endpoints = config.get_bool("enable_private_endpoints", True)
-        if enable_private_endpoints:
-            validate_private_endpoint_config(
-                enable_private_endpoints,
-                self.common.private_endpoint_subnet_name,
-                self.common.dns_resource_group_name)
-
-        azml_yaml_config = azureml.AzureMLYamlConfig(**config.require_object('azureml'))
+        # Every value is validated before the first invoke, and all the errors are raised
+        # at once in a `ConfigValidationError`.
+        errors: List[str] = []
+        self.prefix = read_config(errors, "prefix", config.require)
+        if self.prefix is not None:
+            try:
+                validate_prefix(self.prefix)
+            except ValueError as error:
+                errors.append(f"prefix: {error}")
+        self.invoke_cache = read_config(
+            errors, "invoke_cache", config.get_object, InvokeCacheArgs)
+        self.sharding = read_config(errors, "sharding", config.get_object, ShardingArgs)
+        if self.sharding and self.sharding.shards and not self.sharding.core_stack:
+            errors.append("sharding: `core_stack` is required with compute shards.")
+        self.common = read_config(errors, "common", config.require_object, CommonArgs)
+        # The share of the subnet IPs to keep free at peak, see `subnet_capacity`.
+        self.subnet_min_headroom = read_config(errors, "subnet_min_headroom", config.get_float)
+        if self.subnet_min_headroom is not None and not 0 <= self.subnet_min_headroom < 1:
+            errors.append("subnet_min_headroom: should be between 0 and 1, got "
+                          f"{self.subnet_min_headroom}.")
+        enable_private_endpoints = read_config(
+            errors, "enable_private_endpoints", lambda key: config.get_bool(key, True))
+        if enable_private_endpoints and self.common:
+            try:
+                validate_private_endpoint_config(
+                    enable_private_endpoints,
+                    self.common.private_endpoint_subnet_name,
+                    self.common.dns_resource_group_name)
+            except ValueError as error:
+                errors.append(f"common: {error}")
+
+        azml_config = None
+        azml_raw = read_config(errors, "azureml", config.require_object)
+        try:
+            azml_yaml_config = azureml.AzureMLYamlConfig(**(azml_raw or {}))
+            azml_config = azml_yaml_config.model_dump(exclude={"compute_instance_roster"})
+            if azml_yaml_config.compute_instance_roster:
+                azml_config["compute_instance_config"] = load_compute_instance_roster(
+                    azml_config["compute_instance_config"],
+                    azml_yaml_config.compute_instance_roster)
+            errors.extend(f"azureml.{error}" for error in azureml.validate_compute_names(
+                azml_yaml_config.model_copy(
+                    update={"compute_instance_config": azml_config["compute_instance_config"]}),
+                f"{self.prefix}azml",
+                pulumi.get_stack()))
+            if enable_private_endpoints and self.common:
+                errors.extend(f"azureml.container_registry.{error}" for error in
+                              container_registry.validate_replica_subnets(
+                                  azml_yaml_config.container_registry,
+                                  self.common.dns_resource_group_name))
+        except pydantic.ValidationError as error:
+            errors.extend(pydantic_errors("azureml", error))
+        except roster.RosterError as error:
+            errors.extend(f"{error.path}:{line}: {message}" for line, message in error.errors)
+        except TypeError as error:
+            errors.append(f"azureml: {error}")
+        if errors:
+            raise ConfigValidationError(errors)
+
+        # The invoke cache and recording are only set up once the whole config is valid.
+        self.invoke_cache.enable()
+
         self.azureml_args = azureml.AzureMLArgs(
             # Set stack args first
             resource_group_name=self.common.resource_group_name,
@@ -37,10 +137,39 @@ class AzEnvConfig: # pylint: disable=too-few-public-methods
             enable_private_endpoints=enable_private_endpoints,
             private_endpoint_subnet_name=self.common.private_endpoint_subnet_name,
             dns_resource_group_name=self.common.dns_resource_group_name,
+            compute_shards=self.sharding.shards or None,
             # Allow component args to override
-            **azml_yaml_config.model_dump()
+            **azml_config
         )
 
+def read_config(
+        errors: List[str],
+        key: str,
+        read: Callable[[str], Any],
+        args_class: Optional[type] = None) -> Any:
+    """
+    Read a value of the stack config, and build its `args_class` from it if any.
+
+    Args:
+        errors (List[str]): The errors of the stack config, the error of the value is added to.
+        key (str): The config key, e.g. `common`.
+        read (Callable[[str], Any]): The `pulumi.Config` getter of the value.
+        args_class (Optional[type]): The dataclass of an object value, e.g. `CommonArgs`.
+
+    Returns:
+        Any: The value, or `None` if it is missing or invalid.
+    """
+    try:
+        value = read(key)
+        return args_class(**(value or {})) if args_class is not None else value
+    except (pulumi.ConfigMissingError, pulumi.ConfigTypeError) as error:
+        # The first line names the variable, the next ones explain how to set it.
+        errors.append(f"{key}: {str(error).splitlines()[0]}")
+    except TypeError as error:
+        # Unknown or missing fields of the dataclass, or a value that isn't an object.
+        errors.append(f"{key}: {error}")
+    return None
+
 def validate_prefix(prefix: str):
     """
     Validate the format of prefix from input parameters.
@@ -82,3 +211,26 @@ def validate_private_endpoint_config(
         if private_endpoint_subnet_name is None or private_endpoint_subnet_name.strip() == "" \
             or dns_resource_group_name is None or dns_resource_group_name.strip() == "":
             raise ValueError("`subnet_name` or `dns_resource_group_name` can not be empty.")
+
+def load_compute_instance_roster(
+        compute_instance_config: Dict[str, Dict[str, str]],
+        path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Add the compute instances of a roster file to the inline ones.
+
+    Args:
+        compute_instance_config (Dict[str, Dict[str, str]]): The inline compute instances.
+        path (str): The roster file, relative to the project directory.
+
+    Returns:
+        Dict[str, Dict[str, str]]: All the compute instances.
+
+    Raises:
+        (RosterError): The roster is invalid. Every invalid row is reported with its line.
+    """
+    merged, loaded = roster.merge_roster(
+        compute_instance_config, os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+    for line, first_line in loaded.duplicates:
+        pulumi.log.warn(f"{path}:{line}: the user already has a compute instance on line "
+                        f"{first_line}, skipping it.")
+    return merged
@@ -11,7 +11,8 @@ import pytest
 import os
 from unittest import mock
 import test_util_path
-from projects.dev.config import AzEnvConfig, validate_prefix, validate_private_endpoint_config
+from projects.dev.config import (
+    AzEnvConfig, ConfigValidationError, validate_prefix, validate_private_endpoint_config)
 
 class AzEnvConfigMocks(pulumi.runtime.Mocks):
     def new_resource(self, args: pulumi.runtime.MockResourceArgs):
@@ -116,8 +117,33 @@ def test_parse_config_with_missing_vaues():
     """
     Test parse_config() with missing values.
     """
-    with pytest.raises(pulumi.ConfigMissingError):
+    with pytest.raises(ConfigValidationError) as error:
         AzEnvConfig()
+    assert [message.split(":")[0] for message in error.value.errors] == [
+        "prefix", "common", "azureml"]
+    assert "Missing required configuration variable" in error.value.errors[0]
+
+@pulumi.runtime.test
+def test_invalid_config_objects_are_reported_before_side_effects():
+    """
+    Test unknown keys of the config objects are reported with the other errors, and the
+    invoke cache isn't enabled when the config is invalid.
+    """
+    set_mocks({
+        **mock_config_settings,
+        "project:common": json.dumps({**json.loads(expected_common_dump), "vnet": "typo"}),
+        "project:sharding": json.dumps({"shard": ["shard-a"]}),
+        "project:invoke_cache": json.dumps({"enabled": True}),
+    })
+    try:
+        with mock.patch("azenv_deploy.azenv_deploy.invoke_cache.enable_disk_cache") as enable, \
+                pytest.raises(ConfigValidationError) as error:
+            AzEnvConfig()
+    finally:
+        set_mocks(mock_config_settings)
+    assert [message.split(":")[0] for message in error.value.errors] == ["sharding", "common"]
+    assert "unexpected keyword argument 'vnet'" in error.value.errors[1]
+    enable.assert_not_called()
 
 def test_validate_prefix():
     """
@@ -189,3 +215,58 @@ def test_private_endpoint_invalid_config():
             private_endpoint_subnet_name="foo",
             enable_private_endpoints=True,
             dns_resource_group_name="   ")
+
+@pulumi.runtime.test
+def test_config_reports_all_errors():
+    """
+    Test every invalid value of the stack config is reported at once.
+    """
+    invalid_cluster = {**expected_azureml_cluster_dump["comp-cluster-01"],
+                       "min_node_count": 9, "vm_priority": "Spot"}
+    set_mocks({
+        **mock_config_settings,
+        "project:prefix": "Bad_Prefix",
+        "project:azureml": json.dumps({
+            "compute_cluster_config": {"comp-cluster-01": invalid_cluster},
+            "compute_instance_config": {"comp-inst-ax01": {"user_email": "test@123.com",
+                                                           "vm_size": "large"}}})
+    })
+    try:
+        with pytest.raises(ConfigValidationError) as error:
+            AzEnvConfig()
+    finally:
+        set_mocks(mock_config_settings)
+    assert [message.split(":")[0] for message in error.value.errors] == [
+        "prefix",
+        "azureml.compute_instance_config.comp-inst-ax01.vm_size",
+        "azureml.compute_cluster_config.comp-cluster-01.min_node_count",
+        "azureml.compute_cluster_config.comp-cluster-01.vm_priority",
+    ]
+
+@pulumi.runtime.test
+def test_registry_replicas_need_a_subnet():
+    """
+    Test the registry replicas need the subnet of their private endpoint.
+    """
+    set_mocks({
+        **mock_config_settings,
+        "project:azureml": json.dumps({
+            **json.loads(expected_azureml_dump),
+            "container_registry": {"sku": "Premium", "replicas": {"westus2": {}}}})
+    })
+    try:
+        with pytest.raises(ConfigValidationError, match="replica `westus2`: `vnet_resource"):
+            AzEnvConfig()
+        set_mocks({
+            **mock_config_settings,
+            "project:azureml": json.dumps({
+                **json.loads(expected_azureml_dump),
+                "container_registry": {"sku": "Premium", "replicas": {"westus2": {
+                    "vnet_resource_group_name": "rg-west", "vnet_name": "vnet-west",
+                    "subnet_name": "snet-west",
+                    "dns_resource_group_name": expected_common_dns_resource_group_name}}}})
+        })
+        with pytest.raises(ConfigValidationError, match="DNS zone of the home region"):
+            AzEnvConfig()
+    finally:
+        set_mocks(mock_config_settings)
@@ -0,0 +1,62 @@
+"""
+Module to test the cluster autoscale simulator
+"""
+import pytest
+from azenv_deploy.azenv_deploy import autoscale
+from azenv_deploy.azenv_deploy.autoscale import ClusterSettings, Job
+
+def test_parse_duration():
+    """
+    Test ISO-8601 durations are turned into seconds.
+    """
+    assert autoscale.parse_duration("PT5M") == 300
+    assert autoscale.parse_duration("P1DT1H30S") == 90030
+    for value in ("5M", "PT", "P1Y"):
+        with pytest.raises(ValueError):
+            autoscale.parse_duration(value)
+
+def test_scale_from_zero():
+    """
+    Test a job waits for its nodes to be allocated, which are released once idle.
+    """
+    result = autoscale.simulate([Job(0, 2, 1000)], ClusterSettings(0, 4, "PT5M"),
+                                allocation_latency_s=100)
+    assert result.waits_s == [100]
+    assert result.node_seconds == 2 * (1000 + 300)
+    assert result.idle_node_hours == pytest.approx(2 * 300 / 3600)
+
+def test_warm_nodes_and_queue():
+    """
+    Test `min_node_count` nodes start jobs at once, and jobs over `max_node_count` never run.
+    """
+    jobs = [Job(0, 2, 1000), Job(10, 2, 1000), Job(20, 5, 10)]
+    result = autoscale.simulate(jobs, ClusterSettings(2, 2, "PT5M"), allocation_latency_s=100)
+    # The second job waits for the first one, as the cluster can't grow.
+    assert result.waits_s == [0, 990]
+    assert result.unschedulable == 1
+    assert result.node_seconds == 2 * (2000 + 300)
+
+def test_low_priority_preemptions():
+    """
+    Test preempted jobs restart from the queue, so they wait longer.
+    """
+    jobs = [Job(index * 600, 4, 3600) for index in range(20)]
+    dedicated = autoscale.simulate(jobs, ClusterSettings(0, 8, "PT5M", "Dedicated"))
+    low_priority = autoscale.simulate(jobs, ClusterSettings(0, 8, "PT5M", "LowPriority"),
+                                      preemption_rate=0.2, seed=1)
+    assert dedicated.preemptions == 0
+    assert low_priority.preemptions > 0
+    assert len(low_priority.waits_s) == len(jobs)
+    assert low_priority.wait_percentile(99) > dedicated.wait_percentile(99)
+
+def test_recommend():
+    """
+    Test the recommended settings meet the wait target at a lower cost.
+    """
+    jobs = [Job(index * 900, 1 + index % 3, 1200) for index in range(24)]
+    current = ClusterSettings(4, 10, "PT30M", "Dedicated")
+    best = autoscale.recommend(jobs, current, max_p99_wait_s=600, preemption_rate=0.0)
+    assert best is not None
+    assert best.wait_percentile(99) <= 600
+    assert best.cost() < autoscale.simulate(jobs, current, preemption_rate=0.0).cost()
+    assert autoscale.recommend(jobs, current, max_p99_wait_s=-1) is None
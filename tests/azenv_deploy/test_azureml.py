@@ -0,0 +1,395 @@
+"""
+Module to test the AzureML component
+"""
+from typing import Dict, List
+import pulumi
+import pydantic
+import pytest
+from pulumi_azure_native import containerregistry
+from azenv_deploy.azenv_deploy import azureml, compute_names, sharding
+
+FAKE_IP_ADDRESS = "10.0.0.4"
+
+class AzureMLMocks(pulumi.runtime.Mocks):
+    """
+    Mocking class for pulumi component: AzureML
+    """
+    def __init__(self):
+        self.resources: List[pulumi.runtime.MockResourceArgs] = []
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        self.resources.append(args)
+        outputs = dict(args.inputs)
+        if args.typ == "azure-native:network:PrivateDnsZoneGroup":
+            outputs["privateDnsZoneConfigs"] = [
+                {**zone_config, "recordSets": [{"ipAddresses": [FAKE_IP_ADDRESS]}]}
+                for zone_config in args.inputs.get("privateDnsZoneConfigs", [])
+            ]
+        if args.typ == "azure-native:containerregistry:Registry":
+            outputs["loginServer"] = f"{args.name}.azurecr.io"
+        return [args.name + '_id', outputs]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        match args.token:
+            case "azure-native:network:getSubnet":
+                return {"id": f"{args.token}_id"}
+            case "azure-native:network:getPrivateZone":
+                return {"id": f"{args.args['resourceGroupName']}/{args.args['privateZoneName']}"}
+            case "azure-native:authorization:getClientConfig":
+                return {"tenantId": "fake_tenant_id"}
+            case "azuread:index/getUsers:getUsers":
+                upns = args.args["userPrincipalNames"]
+                return {
+                    "userPrincipalNames": upns,
+                    "objectIds": [f"{upn}_object_id" for upn in upns]
+                }
+            case _:
+                return {}
+
+mocks = AzureMLMocks()
+
+def setup_module():
+    """
+    Setup mocks to the execution of the module.
+    """
+    pulumi.runtime.set_mocks(
+        mocks,
+        preview=False,
+    )
+
+def build_args(**overrides) -> azureml.AzureMLArgs:
+    """
+    Build the arguments of an AzureML component with two clusters and one instance.
+    """
+    cluster = {
+        "max_node_count": 4,
+        "min_node_count": 0,
+        "node_idle_time_before_scale_down": "PT5M",
+        "vm_priority": "LowPriority",
+        "vm_size": "Standard_DS11_v2"
+    }
+    args = {
+        "resource_group_name": "resource_group_name_foo",
+        "compute_instance_subnet_name": None,
+        "compute_cluster_subnet_name": None,
+        "vnet_resource_group_name": "vnet_resource_group_name_foo",
+        "vnet_name": "vnet_name_foo",
+        "enable_private_endpoints": True,
+        "dns_resource_group_name": "dns_resource_group_name_foo",
+        "private_endpoint_subnet_name": "private_endpoint_subnet_name_foo",
+        "compute_instance_config": {
+            "inst-01": {"user_email": "foo@bar.com", "vm_size": "Standard_DS11_v2"}},
+        "compute_cluster_config": {"cluster-01": cluster, "cluster-02": dict(cluster)},
+        **overrides
+    }
+    return azureml.AzureMLArgs(**args)
+
+def resources_by_type(typ: str) -> Dict[str, pulumi.runtime.MockResourceArgs]:
+    """
+    Fetch the registered resources of a type by name.
+    """
+    return {resource.name: resource for resource in mocks.resources if resource.typ == typ}
+
+def build_azureml(args: azureml.AzureMLArgs, opts: pulumi.ResourceOptions = None) -> None:
+    """
+    Build an AzureML component and wait for all its resources to be registered.
+    """
+    mocks.resources.clear()
+
+    @pulumi.runtime.test
+    def construct():
+        azureml.AzureML("foo", args, opts)
+
+    construct()
+
+def test_hash_suffix_mode_registers_no_random_string():
+    """
+    Test the hash mode names clusters without `RandomString` resources, keeping pinned
+    suffixes.
+    """
+    build_azureml(build_args(
+        compute_cluster_suffix_mode="hash",
+        compute_cluster_suffixes={"cluster-01": "k3"}))
+
+    assert not resources_by_type(compute_names.RANDOM_STRING_TYPE)
+    computes = resources_by_type("azure-native:machinelearningservices:Compute")
+    assert computes["cluster-01"].inputs["computeName"] == "cluster-01-k3"
+    hash_suffix = compute_names.hash_suffix(pulumi.get_stack(), "foo", "cluster-02")
+    assert computes["cluster-02"].inputs["computeName"] == f"cluster-02-{hash_suffix}"
+
+def test_random_suffix_mode_registers_random_strings():
+    """
+    Test the default mode keeps a `RandomString` per cluster.
+    """
+    build_azureml(build_args())
+
+    assert sorted(resources_by_type(compute_names.RANDOM_STRING_TYPE)) == [
+        "cluster-01-suffix", "cluster-02-suffix"]
+
+def test_storage_record_sets_hold_endpoint_ips():
+    """
+    Test each storage DNS zone gets one record set holding the endpoint IPs.
+    """
+    build_azureml(build_args())
+
+    record_sets = resources_by_type("azure-native:network:PrivateRecordSet")
+    assert sorted(record_sets) == ["foostg-blob-rs", "foostg-dfs-rs", "foostg-file-rs"]
+    for record_set in record_sets.values():
+        assert record_set.inputs["aRecords"] == [{"ipv4Address": FAKE_IP_ADDRESS}]
+
+def test_storage_profiles():
+    """
+    Test the standard profiles set the SKU of the workspace storage account, and the data
+    profiles add a data account with its endpoints and datastore.
+    """
+    build_azureml(build_args(storage_profile={"name": "standard_lrs"}))
+    accounts = resources_by_type("azure-native:storage:StorageAccount")
+    assert list(accounts) == ["foostg"]
+    assert accounts["foostg"].inputs["sku"] == {"name": "Standard_LRS"}
+    assert not resources_by_type("azure-native:machinelearningservices:Datastore")
+
+    build_azureml(build_args(storage_profile={"name": "adls_gen2", "redundancy": "LRS"}))
+    accounts = resources_by_type("azure-native:storage:StorageAccount")
+    assert accounts["foostg"].inputs["sku"] == {"name": "Standard_GZRS"}
+    assert not accounts["foostg"].inputs["isHnsEnabled"]
+    assert accounts["foodat"].inputs["isHnsEnabled"]
+    assert accounts["foodat"].inputs["sku"] == {"name": "Standard_LRS"}
+    assert accounts["foodat"].inputs["networkRuleSet"]["defaultAction"] == "Deny"
+    assert sorted(resources_by_type("azure-native:network:PrivateRecordSet")) == [
+        "foodat-blob-rs", "foodat-dfs-rs", "foostg-blob-rs", "foostg-dfs-rs", "foostg-file-rs"]
+    endpoints = resources_by_type("azure-native:network:PrivateEndpoint")
+    assert {"foodat-blob-pe", "foodat-dfs-pe"} <= set(endpoints)
+    datastore = resources_by_type("azure-native:machinelearningservices:Datastore")[
+        "foo-training_data"]
+    assert datastore.inputs["datastoreProperties"]["datastoreType"] == "AzureDataLakeGen2"
+
+    build_azureml(build_args(storage_profile={"name": "premium_block_blob"}))
+    accounts = resources_by_type("azure-native:storage:StorageAccount")
+    assert accounts["foodat"].inputs["kind"] == "BlockBlobStorage"
+    assert accounts["foodat"].inputs["sku"] == {"name": "Premium_ZRS"}
+    assert "accessTier" not in accounts["foodat"].inputs
+    assert "foodat-dfs-pe" not in resources_by_type("azure-native:network:PrivateEndpoint")
+
+    with pytest.raises(pydantic.ValidationError, match="only applies to the data account"):
+        azureml.AzureMLYamlConfig(storage_profile={"name": "standard", "redundancy": "LRS"})
+
+def test_container_registry_replicas_and_cache_rules():
+    """
+    Test a Premium registry gets its replicas, each with a private endpoint in its own
+    region registered in the registry zone of its region, and its cache rules.
+    """
+    replica = {"vnet_resource_group_name": "rg-west", "vnet_name": "vnet-west",
+               "subnet_name": "snet-west", "zone_redundancy": True,
+               "dns_resource_group_name": "rg-west-dns"}
+    endpoint_dependencies = {}
+
+    def record_dependencies(args: pulumi.ResourceTransformationArgs):
+        if args.type_ == "azure-native:network:PrivateEndpoint":
+            endpoint_dependencies[args.name] = args.opts.depends_on
+
+    build_azureml(build_args(container_registry={
+        "sku": "Premium",
+        "replicas": {"westus2": replica, "westeurope": {**replica,
+                                                         "dns_resource_group_name": None}},
+        "cache_rules": {"python": {"source_repository": "docker.io/library/python"}}}),
+        pulumi.ResourceOptions(transformations=[record_dependencies]))
+
+    registry = resources_by_type("azure-native:containerregistry:Registry")["fooacr"]
+    assert registry.inputs["sku"] == {"name": "Premium"}
+    replication = resources_by_type("azure-native:containerregistry:Replication")[
+        "fooacr-westus2"]
+    assert (replication.inputs["location"], replication.inputs["zoneRedundancy"]) == (
+        "westus2", "Enabled")
+    cache_rule = resources_by_type("azure-native:containerregistry:CacheRule")["fooacr-python"]
+    assert cache_rule.inputs["targetRepository"] == "library/python"
+    endpoints = resources_by_type("azure-native:network:PrivateEndpoint")
+    assert endpoints["foo-westus2-acr-pe"].inputs["location"] == "westus2"
+    assert "location" not in endpoints["foo-acr-pe"].inputs
+    # The registry endpoints are created once the replications exist.
+    for endpoint_name in ("foo-acr-pe", "foo-westus2-acr-pe", "foo-westeurope-acr-pe"):
+        assert sum(isinstance(dependency, containerregistry.Replication)
+                   for dependency in endpoint_dependencies[endpoint_name]) == 2
+    assert not endpoint_dependencies["foo-kv-pe"]
+    zone_groups = {name: [zone["privateDnsZoneId"] for zone in group.inputs[
+        "privateDnsZoneConfigs"]] for name, group in resources_by_type(
+            "azure-native:network:PrivateDnsZoneGroup").items() if "-registry-" in name}
+    assert zone_groups == {
+        "foo-registry-dnsgrp": ["dns_resource_group_name_foo/privatelink.azurecr.io"],
+        "foo-westus2-registry-dnsgrp": ["rg-west-dns/privatelink.azurecr.io"]}
+
+    with pytest.raises(pydantic.ValidationError, match="replicas need the `Premium` SKU"):
+        azureml.AzureMLYamlConfig(container_registry={"replicas": {"westus2": {}}})
+    with pytest.raises(pydantic.ValidationError, match="5 to 50 letters"):
+        azureml.AzureMLYamlConfig(container_registry={
+            "cache_rules": {"py": {"source_repository": "docker.io/library/python"}}})
+
+def test_image_build_compute_and_prebuilt_environments():
+    """
+    Test the image build config creates a `machinelearningservices` workspace building its
+    images on the named cluster, and prebuilds its environments in the registry.
+    """
+    image_build = {
+        "compute": "cluster-02",
+        "environments": {"torch": {"version": "3", "source_location": "https://x/y.git"}}}
+    build_azureml(build_args(compute_cluster_suffix_mode="hash", image_build=image_build))
+
+    assert not resources_by_type("azure-native:machinelearning:Workspace")
+    workspace = resources_by_type("azure-native:machinelearningservices:Workspace")["foo-ws"]
+    computes = resources_by_type("azure-native:machinelearningservices:Compute")
+    assert workspace.inputs["imageBuildCompute"] == computes["cluster-02"].inputs["computeName"]
+    build = resources_by_type("azure-native:containerregistry:TaskRun")["foo-torch-build"]
+    assert build.inputs["forceUpdateTag"] == "3"
+    assert build.inputs["runRequest"]["imageNames"] == ["azureml-prebuilt/torch:3"]
+    environment = resources_by_type("azure-native:machinelearningservices:EnvironmentVersion")[
+        "foo-torch-env"]
+    assert environment.inputs["environmentVersionProperties"]["image"] == \
+        "fooacr.azurecr.io/azureml-prebuilt/torch:3"
+
+    # With compute shards, the core stack still creates the image build cluster.
+    build_azureml(build_args(compute_cluster_suffix_mode="hash", image_build=image_build,
+                             compute_shards=["shard-a"]))
+    assert list(resources_by_type("azure-native:machinelearningservices:Compute")) == [
+        "cluster-02"]
+
+    with pytest.raises(pydantic.ValidationError, match="`cluster-03` is not in"):
+        azureml.AzureMLYamlConfig(
+            compute_cluster_config=build_args().compute_cluster_config,
+            image_build={"compute": "cluster-03"})
+
+def test_observability():
+    """
+    Test the telemetry config backs the application insights with a Log Analytics workspace,
+    sends the diagnostics of the resources to it, and creates the alerts with a threshold.
+    The workspace diagnostics and alert are only created for a `machinelearningservices`
+    workspace.
+    """
+    build_azureml(build_args())
+    assert not resources_by_type("azure-native:operationalinsights:Workspace")
+    assert "workspaceResourceId" not in resources_by_type(
+        "azure-native:insights:Component")["foo-app-insights"].inputs
+
+    observability = {"action_group_id": "ag_id", "alerts": {
+        "key_vault_latency_ms": None, "workspace_failed_runs": 1}}
+    build_azureml(build_args(storage_profile={"name": "adls_gen2"},
+                             observability=observability))
+    assert resources_by_type("azure-native:machinelearning:Workspace")
+    workspace = resources_by_type("azure-native:operationalinsights:Workspace")["foo-law"]
+    assert workspace.inputs["retentionInDays"] == 30
+    component = resources_by_type("azure-native:insights:Component")["foo-app-insights"]
+    assert component.inputs["workspaceResourceId"] == "foo-law_id"
+    assert component.inputs["ingestionMode"] == "LogAnalytics"
+
+    settings = resources_by_type("azure-native:insights:DiagnosticSetting")
+    assert sorted(settings) == ["foo-acr-diag", "foo-dat-blob-diag", "foo-kv-diag",
+                                "foo-st-blob-diag", "foo-st-file-diag"]
+    blob = settings["foo-st-blob-diag"].inputs
+    assert blob["resourceUri"] == "foostg_id/blobServices/default"
+    assert blob["workspaceId"] == "foo-law_id"
+    assert [metric["category"] for metric in blob["metrics"]] == ["Transaction"]
+
+    alerts = resources_by_type("azure-native:insights:MetricAlert")
+    assert sorted(alerts) == [
+        "foo-dat-storage-e2e-latency-ms", "foo-dat-storage-server-latency-ms",
+        "foo-kv-key-vault-throttled-requests", "foo-st-storage-e2e-latency-ms",
+        "foo-st-storage-server-latency-ms"]
+    throttling = alerts["foo-kv-key-vault-throttled-requests"].inputs
+    assert throttling["scopes"] == ["foo_id"]
+    assert throttling["actions"] == [{"actionGroupId": "ag_id"}]
+    criterion = throttling["criteria"]["allOf"][0]
+    assert (criterion["metricName"], criterion["threshold"]) == ("ServiceApiResult", 0)
+    assert criterion["dimensions"] == [
+        {"name": "StatusCode", "operator": "Include", "values": ["429"]}]
+
+    build_azureml(build_args(observability=observability, image_build={"compute": "cluster-02"}))
+    settings = resources_by_type("azure-native:insights:DiagnosticSetting")
+    assert settings["foo-ws-diag"].inputs["resourceUri"] == "foo-ws_id"
+    assert [log["category"] for log in settings["foo-ws-diag"].inputs["logs"]] == [
+        "AmlComputeClusterEvent", "AmlComputeJobEvent", "AmlRunStatusChangedEvent"]
+    failed_runs = resources_by_type("azure-native:insights:MetricAlert")[
+        "foo-ws-workspace-failed-runs"].inputs
+    assert failed_runs["scopes"] == ["foo-ws_id"]
+    assert failed_runs["criteria"]["allOf"][0]["metricNamespace"] == \
+        "Microsoft.MachineLearningServices/workspaces"
+
+    with pytest.raises(pydantic.ValidationError, match="between 30 and 730"):
+        azureml.AzureMLYamlConfig(observability={"retention_in_days": 7})
+
+def test_compute_shards():
+    """
+    Test the core stack of sharded computes registers no compute, and each shard only its
+    own computes, named with the suffixes of the core stack.
+    """
+    shards = ["shard-a", "shard-b"]
+    args = build_args(compute_cluster_suffix_mode="hash", compute_shards=shards)
+    build_azureml(args)
+    assert not resources_by_type("azure-native:machinelearningservices:Compute")
+    assert resources_by_type("azure-native:machinelearning:Workspace")
+
+    deployed = []
+    for shard in shards:
+        mocks.resources.clear()
+
+        @pulumi.runtime.test
+        def construct(shard=shard):
+            azureml.AzureMLComputeShard("foo", args, shard=shard,
+                                        workspace_name="foo-ws", core_stack="core")
+
+        construct()
+        computes = resources_by_type("azure-native:machinelearningservices:Compute")
+        assert sorted(computes) == sorted(sharding.shard_computes(
+            ["inst-01", "cluster-01", "cluster-02"], shards, shard))
+        assert not resources_by_type("azure-native:machinelearning:Workspace")
+        for compute in computes.values():
+            assert compute.inputs["workspaceName"] == "foo-ws"
+        if "cluster-01" in computes:
+            hash_suffix = compute_names.hash_suffix("core", "foo", "cluster-01")
+            assert computes["cluster-01"].inputs["computeName"] == f"cluster-01-{hash_suffix}"
+        deployed.extend(computes)
+    assert sorted(deployed) == ["cluster-01", "cluster-02", "inst-01"]
+
+def test_compute_items_are_validated():
+    """
+    Test every invalid compute value of the config is reported in one validation error.
+    """
+    cluster = {"max_node_count": 1, "min_node_count": 2, "vm_priority": "Spot",
+               "node_idle_time_before_scale_down": "5 minutes", "vm_size": ""}
+    with pytest.raises(pydantic.ValidationError) as error:
+        azureml.AzureMLYamlConfig(
+            compute_cluster_config={"cluster-01": cluster},
+            compute_instance_config={"inst-01": {"user_email": "foo", "vm_size": "DS11"}})
+    locations = sorted(".".join(map(str, item["loc"])) for item in error.value.errors())
+    assert locations == [
+        "compute_cluster_config.cluster-01.min_node_count",
+        "compute_cluster_config.cluster-01.node_idle_time_before_scale_down",
+        "compute_cluster_config.cluster-01.vm_priority",
+        "compute_cluster_config.cluster-01.vm_size",
+        "compute_instance_config.inst-01.user_email",
+        "compute_instance_config.inst-01.vm_size",
+    ]
+
+    cluster.update(vm_priority="LowPriority", node_idle_time_before_scale_down="PT5M",
+                   vm_size="Standard_DS11_v2")
+    with pytest.raises(pydantic.ValidationError, match="greater than max_node_count"):
+        azureml.AzureMLYamlConfig(compute_cluster_config={"cluster-01": cluster})
+
+def test_validate_compute_names():
+    """
+    Test compute names that collide in the workspace are reported.
+    """
+    config = azureml.AzureMLYamlConfig(
+        compute_instance_config={"Inst-01": {"user_email": "foo@bar.com"},
+                                 "cluster-01-k3": {"user_email": "bar@bar.com"}},
+        compute_cluster_config={"inst-01": build_args().compute_cluster_config["cluster-01"],
+                                "cluster-01": build_args().compute_cluster_config["cluster-01"]},
+        compute_cluster_suffix_mode="hash",
+        compute_cluster_suffixes={"cluster-01": "K3"})
+    errors = azureml.validate_compute_names(config, "fooazml", "dev")
+    assert len(errors) == 1
+    assert "`cluster-01-k3` and `cluster-01-K3` collide" in errors[0]
+
+    # Too short for both instances and clusters, and used by both.
+    config.compute_instance_config = {"x": config.compute_instance_config["Inst-01"]}
+    config.compute_cluster_config = {"x": config.compute_cluster_config["inst-01"]}
+    errors = azureml.validate_compute_names(config, "fooazml", "dev")
+    assert [error.split(":")[0] for error in errors] == [
+        "compute_instance_config.x", "compute_cluster_config.x", "compute_cluster_config.x"]
@@ -0,0 +1,65 @@
+"""
+Module to test compute cluster name suffixes
+"""
+import json
+import pytest
+from azenv_deploy.azenv_deploy import compute_names
+
+def test_hash_suffix_is_stable():
+    """
+    Test hash suffixes only depend on the stack, component and cluster names.
+    """
+    suffix = compute_names.hash_suffix("dev", "fooazml", "cluster-01")
+    assert suffix == compute_names.hash_suffix("dev", "fooazml", "cluster-01")
+    assert len(suffix) == compute_names.SUFFIX_LENGTH
+    assert all(char in compute_names.SUFFIX_ALPHABET for char in suffix)
+    assert compute_names.hash_suffix("dev", "fooazml", "cluster-01", salt=1) != suffix
+
+def test_random_mode_only_keeps_pinned_suffixes():
+    """
+    Test clusters without a pinned suffix still get a `RandomString` in random mode.
+    """
+    suffixes = compute_names.cluster_suffixes(
+        "random", "dev", "fooazml", ["cluster-01", "cluster-02"],
+        pinned={"cluster-01": "ab", "removed-cluster": "cd"})
+    assert suffixes == {"cluster-01": "ab"}
+
+def test_hash_mode_avoids_collisions():
+    """
+    Test a hash suffix colliding with another compute name is salted.
+    """
+    suffix = compute_names.hash_suffix("dev", "fooazml", "cluster")
+    suffixes = compute_names.cluster_suffixes(
+        "hash", "dev", "fooazml", ["cluster", "other"],
+        pinned={"other": "xy"},
+        reserved_names=[f"cluster-{suffix}"])
+    assert suffixes["other"] == "xy"
+    assert suffixes["cluster"] == compute_names.hash_suffix("dev", "fooazml", "cluster", 1)
+
+def test_unknown_mode():
+    """
+    Test an unknown suffix mode raises `ValueError`.
+    """
+    with pytest.raises(ValueError):
+        compute_names.cluster_suffixes("uuid", "dev", "fooazml", ["cluster"])
+
+def test_read_random_suffixes(tmp_path):
+    """
+    Test the suffixes of existing clusters are read from the stack state.
+    """
+    state_path = tmp_path / "dev.json"
+    state_path.write_text(json.dumps({"version": 3, "checkpoint": {"latest": {"resources": [
+        {
+            "urn": "urn:pulumi:dev::dev::azenv_deploy:azureml:AzureML$"
+                   "random:index/randomString:RandomString::cluster-01-suffix",
+            "type": "random:index/randomString:RandomString",
+            "outputs": {"result": "k3"}
+        },
+        {
+            "urn": "urn:pulumi:dev::dev::azenv_deploy:azureml:AzureML$"
+                   "azure-native:machinelearningservices:Compute::cluster-01",
+            "type": "azure-native:machinelearningservices:Compute",
+            "outputs": {}
+        }
+    ]}}}))
+    assert compute_names.read_random_suffixes(str(state_path)) == {"cluster-01": "k3"}
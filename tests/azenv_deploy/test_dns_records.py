@@ -0,0 +1,80 @@
+"""
+Module to test private DNS record sets
+"""
+from typing import List
+import pulumi
+from azenv_deploy.azenv_deploy import dns_records
+
+class RecordSetMocks(pulumi.runtime.Mocks):
+    """
+    Mocking class returning the inputs of the resources as their outputs.
+    """
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        return [args.name + "_id", dict(args.inputs)]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        return {}
+
+def setup_module():
+    """
+    Setup mocks to the execution of the module.
+    """
+    pulumi.runtime.set_mocks(RecordSetMocks(), preview=False)
+
+PRIVATE_DNS_ZONE_CONFIGS = [
+    {
+        "name": "privatelink.blob.core.windows.net",
+        "record_sets": [
+            {"ip_addresses": ["10.0.0.5", "10.0.0.4"]},
+            {"ip_addresses": ["10.0.0.6", "10.0.0.4"]}
+        ]
+    },
+    {
+        "name": "privatelink.dfs.core.windows.net",
+        "record_sets": [{"ip_addresses": ["10.0.0.7"]}]
+    },
+    {
+        "name": "privatelink.file.core.windows.net"
+    }
+]
+
+def test_zone_ip_addresses():
+    """
+    Test every IP of every record set of a zone is collected once.
+    """
+    assert dns_records.zone_ip_addresses(
+        PRIVATE_DNS_ZONE_CONFIGS, "privatelink.blob.core.windows.net") == [
+            "10.0.0.5", "10.0.0.4", "10.0.0.6"]
+    assert dns_records.zone_ip_addresses(
+        PRIVATE_DNS_ZONE_CONFIGS, "privatelink.dfs.core.windows.net") == ["10.0.0.7"]
+
+def test_zone_ip_addresses_without_records():
+    """
+    Test zones without record sets, or missing zones, have no IP.
+    """
+    assert not dns_records.zone_ip_addresses(
+        PRIVATE_DNS_ZONE_CONFIGS, "privatelink.file.core.windows.net")
+    assert not dns_records.zone_ip_addresses(
+        PRIVATE_DNS_ZONE_CONFIGS, "privatelink.azurecr.io")
+    assert not dns_records.zone_ip_addresses(None, "privatelink.azurecr.io")
+
+def test_record_sets_are_deleted_before_replaced():
+    """
+    Test a record set is deleted before it is replaced, e.g. when it moves to another zone
+    under the same relative name.
+    """
+    options: List[pulumi.ResourceOptions] = []
+
+    def record_options(args: pulumi.ResourceTransformationArgs):
+        options.append(args.opts)
+
+    @pulumi.runtime.test
+    def construct():
+        manager = dns_records.PrivateRecordSetManager(
+            "rg", pulumi.ResourceOptions(transformations=[record_options]))
+        manager.add_records("foostg-blob-rs", "privatelink.blob.core.windows.net", "foostg",
+                            pulumi.Output.from_input(PRIVATE_DNS_ZONE_CONFIGS))
+        manager.create_record_sets()
+
+    construct()
+    assert [opts.delete_before_replace for opts in options] == [True]
@@ -0,0 +1,81 @@
+"""
+Module to test the deploy duration estimator
+"""
+import os
+import yaml
+import pytest
+from azenv_deploy.azenv_deploy import estimator, timeline
+from azenv_deploy.azenv_deploy.replay import parse_stack_config
+from azenv_deploy.azenv_deploy.resource_graph import (
+    ResourceGraph, ResourceNode, graph_from_replay, load_durations)
+
+PROJECT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "projects", "dev")
+COMPUTE_TYPE = "azure-native:machinelearningservices:Compute"
+
+def node(name, typ=COMPUTE_TYPE, dependencies=(), **inputs):
+    """
+    Returns a resource node named after its URN.
+    """
+    return ResourceNode(urn=name, type=typ, dependencies=list(dependencies), inputs=inputs)
+
+def test_simulate_parallelism():
+    """
+    Test independent resources share the parallel slots, and dependents wait.
+    """
+    graph = ResourceGraph([node("ws"), node("a", dependencies=["ws"]),
+                           node("b", dependencies=["ws"]), node("c", dependencies=["ws"])])
+    durations = {"ws": 100, "a": 10, "b": 10, "c": 10}
+    assert estimator.simulate(graph, durations) == 110
+    assert estimator.simulate(graph, durations, parallel=2) == 120
+    assert estimator.simulate(graph, durations, parallel=1) == 130
+    with pytest.raises(ValueError):
+        estimator.simulate(graph, durations, parallel=0)
+
+def test_estimate_changes():
+    """
+    Test unchanged resources cost nothing, and deletions run after the other changes.
+    """
+    durations = {COMPUTE_TYPE: 60}
+    current = ResourceGraph([node("ws", vm_size="S"), node("old", dependencies=["ws"])])
+    proposed = ResourceGraph([node("ws", vm_size="M"), node("new", dependencies=["ws"])])
+    result = estimator.estimate(proposed, current, durations, [None])
+    assert result.counts(estimator.OP_UPDATE) == {"Compute": 1}
+    assert result.counts(estimator.OP_CREATE) == {"Compute": 1}
+    assert result.counts(estimator.OP_DELETE) == {"Compute": 1}
+    assert result.durations_s[None] == 60 + 60 + 60
+    assert current.nodes["old"].dependencies == ["ws"]
+
+    result = estimator.estimate(current, current, durations, [None])
+    assert result.durations_s[None] == 0
+    assert estimator.format_estimate(result).startswith("this change changes nothing")
+
+def test_durations_from_timelines(tmp_path):
+    """
+    Test the provisioning times are learnt from the timeline CSV files.
+    """
+    spans = [timeline.ResourceSpan("urn::a", COMPUTE_TYPE, "create", 0, 100, "done"),
+             timeline.ResourceSpan("urn::b", COMPUTE_TYPE, "create", 0, 300, "done")]
+    csv_path = tmp_path / "up.timeline.csv"
+    timeline.write_csv(spans, str(csv_path))
+    assert estimator.durations_from_timelines([str(csv_path)]) == {COMPUTE_TYPE: 200}
+
+def test_estimate_new_compute_instances():
+    """
+    Test new compute instances of a proposed dev stack config are counted, with users
+    that were never looked up.
+    """
+    with open(os.path.join(PROJECT_DIR, "Pulumi.dev.yaml"), encoding="utf-8") as stack_file:
+        content = stack_file.read()
+    proposed = yaml.safe_load(content)
+    for index in range(3):
+        proposed["config"]["dev:azureml"]["compute_instance_config"][f"inst-{index}"] = {
+            "user_email": f"user{index}@example.com", "vm_size": "Standard_DS12_v2"}
+
+    current_graph = graph_from_replay(PROJECT_DIR, "dev", None, parse_stack_config(content))
+    proposed_graph = graph_from_replay(
+        PROJECT_DIR, "dev", None, parse_stack_config(yaml.safe_dump(proposed)))
+    result = estimator.estimate(proposed_graph, current_graph, load_durations(None), [1, None])
+    assert result.counts(estimator.OP_CREATE) == {"Compute": 3}
+    assert not result.counts(estimator.OP_UPDATE)
+    compute_s = load_durations(None)[COMPUTE_TYPE]
+    assert result.durations_s == {1: 3 * compute_s, None: compute_s}
@@ -0,0 +1,146 @@
+"""
+Module to test the fleet driver
+"""
+import json
+import os
+import pytest
+from azenv_deploy.azenv_deploy import fleet
+
+MANIFEST = """
+project_dir: projects/dev
+stacks:
+  - name: team-a
+    config:
+      prefix: teama
+      enable_private_endpoints: true
+      common:
+        resource_group_name: rg-team-a
+  - name: team-b
+    config:
+      prefix: teamb
+"""
+
+def fake_runner(stack, operation, project_dir, log_dir, parallel):
+    """
+    Stand-in for `fleet.run_stack` that fails the `team-b` stack.
+    """
+    return fleet.StackResult(
+        name=stack.name,
+        operation=operation,
+        succeeded=stack.name != "team-b",
+        duration_s=1.0,
+        log_path=f"{log_dir}/{stack.name}.{operation}.log",
+        changes={"create": 3} if stack.name != "team-b" else {},
+        error=None if stack.name != "team-b" else f"boom in {project_dir} ({parallel})")
+
+def raising_runner(stack, operation, project_dir, log_dir, parallel):
+    """
+    Stand-in for `fleet.run_stack` whose worker raises for the `team-b` stack.
+    """
+    if stack.name == "team-b":
+        raise RuntimeError("worker died")
+    return fake_runner(stack, operation, project_dir, log_dir, parallel)
+
+def test_load_manifest(tmp_path):
+    """
+    Test stacks and their config are loaded, with the project directory resolved from
+    the manifest.
+    """
+    manifest_path = tmp_path / "fleet.yaml"
+    manifest_path.write_text(MANIFEST)
+    manifest = fleet.load_manifest(str(manifest_path))
+    assert [stack.name for stack in manifest.stacks] == ["team-a", "team-b"]
+    assert manifest.project_dir == str(tmp_path / "projects" / "dev")
+    assert manifest.stacks[0].config["common"] == {"resource_group_name": "rg-team-a"}
+
+def test_load_manifest_with_duplicated_stacks(tmp_path):
+    """
+    Test a stack listed twice is rejected.
+    """
+    manifest_path = tmp_path / "fleet.json"
+    manifest_path.write_text(json.dumps({"stacks": [{"name": "a"}, {"name": "a"}]}))
+    with pytest.raises(ValueError):
+        fleet.load_manifest(str(manifest_path))
+
+def test_config_value():
+    """
+    Test config values are stored the way `pulumi config set` does.
+    """
+    assert fleet.config_value("teama") == "teama"
+    assert fleet.config_value(True) == "true"
+    assert json.loads(fleet.config_value({"vnet_name": "vn"})) == {"vnet_name": "vn"}
+
+def test_run_fleet_summary(tmp_path):
+    """
+    Test every stack runs, results keep the manifest order and failures are summarized.
+    """
+    manifest = fleet.FleetManifest(
+        stacks=[fleet.FleetStack(name) for name in ("team-a", "team-b", "team-c")],
+        project_dir="projects/dev")
+    results = fleet.run_fleet(manifest, "preview", workers=2, log_dir=str(tmp_path),
+                              parallel=8, runner=fake_runner)
+    assert [result.name for result in results] == ["team-a", "team-b", "team-c"]
+    summary = fleet.format_summary(results)
+    assert "create=3" in summary
+    assert "boom in projects/dev (8)" in summary
+    assert summary.endswith("2 succeeded, 1 failed")
+
+def test_run_fleet_unknown_operation(tmp_path):
+    """
+    Test an unknown operation is rejected before any stack runs.
+    """
+    manifest = fleet.FleetManifest(stacks=[fleet.FleetStack("team-a")])
+    with pytest.raises(ValueError):
+        fleet.run_fleet(manifest, "refresh", log_dir=str(tmp_path), runner=fake_runner)
+
+def stage_runner(stack, operation, project_dir, log_dir, parallel):
+    """
+    Stand-in for `fleet.run_stack` that only succeeds once the earlier stages are done.
+    """
+    earlier_stages_done = stack.stage == 0 or os.path.exists(f"{log_dir}/core.done")
+    with open(f"{log_dir}/{stack.name}.done", "w", encoding="utf-8"):
+        pass
+    return fleet.StackResult(stack.name, operation, earlier_stages_done, 0.0,
+                             f"{log_dir}/{stack.name}.{operation}.log",
+                             error=f"{project_dir} ({parallel})")
+
+def test_run_fleet_stages(tmp_path):
+    """
+    Test compute shards run once the core stack of the earlier stage is done.
+    """
+    manifest = fleet.FleetManifest(
+        stacks=[fleet.FleetStack("shard-a", stage=1), fleet.FleetStack("core"),
+                fleet.FleetStack("shard-b", stage=1)],
+        project_dir="projects/dev")
+    results = fleet.run_fleet(manifest, "up", workers=3, log_dir=str(tmp_path),
+                              runner=stage_runner)
+    assert [result.name for result in results] == ["shard-a", "core", "shard-b"]
+    assert all(result.succeeded for result in results)
+
+def test_run_fleet_skips_stages_after_a_failure(tmp_path):
+    """
+    Test the compute shards are skipped, and reported as failed, when the core stack fails.
+    """
+    manifest = fleet.FleetManifest(
+        stacks=[fleet.FleetStack("team-b"), fleet.FleetStack("shard-a", stage=1)],
+        project_dir="projects/dev")
+    results = fleet.run_fleet(manifest, "up", workers=2, log_dir=str(tmp_path),
+                              runner=fake_runner)
+    assert [result.succeeded for result in results] == [False, False]
+    assert results[1].error == "skipped, an earlier stage failed: team-b"
+    assert not os.path.exists(f"{tmp_path}/shard-a.up.log")
+    assert fleet.format_summary(results).endswith("0 succeeded, 2 failed")
+
+def test_run_fleet_records_worker_errors(tmp_path):
+    """
+    Test an exception raised by a worker is reported as a failed stack, and the other
+    stacks still run.
+    """
+    manifest = fleet.FleetManifest(
+        stacks=[fleet.FleetStack("team-a"), fleet.FleetStack("team-b")],
+        project_dir="projects/dev")
+    results = fleet.run_fleet(manifest, "preview", workers=2, log_dir=str(tmp_path),
+                              runner=raising_runner)
+    assert [result.succeeded for result in results] == [True, False]
+    assert results[1].error == "worker died"
+    assert fleet.format_summary(results).splitlines()[2].endswith("worker died")
@@ -0,0 +1,167 @@
+"""
+Module to test the program-wide invoke cache
+"""
+from typing import List
+import pulumi
+from azenv_deploy.azenv_deploy import invoke_cache, private_endpoint
+
+FAKE_RESOURCE_ID="00000000-0000-0000-0000-000000000000"
+
+class InvokeCacheMocks(pulumi.runtime.Mocks):
+    """
+    Mocking class that records every invoke reaching the engine.
+    """
+    def __init__(self):
+        self.calls: List[str] = []
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        return [args.name + '_id', args.inputs]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        self.calls.append(args.token)
+        match args.token:
+            case "azure-native:network:getPrivateZone":
+                return {
+                    "id": FAKE_RESOURCE_ID
+                }
+            case "azure-native:authorization:getClientConfig":
+                return {
+                    "tenantId": "fake_tenant_id"
+                }
+            case "azuread:index/getUsers:getUsers":
+                upns = args.args["userPrincipalNames"]
+                return {
+                    "userPrincipalNames": [upn.upper() for upn in upns],
+                    "objectIds": [f"{upn}_object_id" for upn in upns]
+                }
+            case _:
+                return {}
+
+mocks = InvokeCacheMocks()
+
+def setup_module():
+    """
+    Setup mocks to the execution of the module.
+    """
+    pulumi.runtime.set_mocks(
+        mocks,
+        preview=False,
+    )
+
+def private_endpoint_args(group_id: str) -> private_endpoint.PrivateEndpointArgs:
+    """
+    Build the args of an endpoint registered in a shared DNS zone.
+    """
+    return private_endpoint.PrivateEndpointArgs(
+        resource_group_name="resource_group_name_foo",
+        private_link_service_id="private_link_service_id",
+        subnet_id="subnet-id",
+        dns_resource_group_name="fake_dns_resource_group_name",
+        group_id=group_id,
+        private_dns_zones=["privatelink.foo.windows.net"])
+
+def test_make_key():
+    """
+    Test cache keys don't depend on argument order and skip unresolved inputs.
+    """
+    key_1 = invoke_cache.make_key("token", {"a": "1", "b": ["x", "y"]})
+    key_2 = invoke_cache.make_key("token", {"b": ["x", "y"], "a": "1"})
+    assert key_1 == key_2
+    assert invoke_cache.make_key("other-token", {"a": "1", "b": ["x", "y"]}) != key_1
+    assert invoke_cache.make_key("token", {"a": pulumi.Output.from_input("1")}) is None
+
+@pulumi.runtime.test
+def test_private_zone_lookup_is_shared():
+    """
+    Test two endpoints in the same DNS zone only look the zone up once.
+    """
+    invoke_cache.INVOKE_CACHE.clear()
+    mocks.calls.clear()
+    private_endpoint.PrivateEndpoint("foo-pe", args=private_endpoint_args("blob"))
+    private_endpoint.PrivateEndpoint("bar-pe", args=private_endpoint_args("file"))
+
+    def check_calls(zone_ids: List[str]):
+        assert zone_ids == [FAKE_RESOURCE_ID, FAKE_RESOURCE_ID]
+        assert mocks.calls.count(invoke_cache.GET_PRIVATE_ZONE_TOKEN) == 1
+        assert invoke_cache.INVOKE_CACHE.stats()[invoke_cache.GET_PRIVATE_ZONE_TOKEN] == {
+            "hits": 3, "disk_hits": 0, "misses": 1}
+
+    zone = invoke_cache.get_private_zone_output(
+        private_zone_name="privatelink.foo.windows.net",
+        resource_group_name="fake_dns_resource_group_name")
+    other_zone = invoke_cache.get_private_zone_output(
+        private_zone_name="privatelink.foo.windows.net",
+        resource_group_name="fake_dns_resource_group_name")
+    assert zone is other_zone
+    return pulumi.Output.all(zone.id, other_zone.id).apply(check_calls)
+
+@pulumi.runtime.test
+def test_client_config_lookup_is_shared():
+    """
+    Test the client config is only looked up once.
+    """
+    invoke_cache.INVOKE_CACHE.clear()
+    mocks.calls.clear()
+    assert invoke_cache.get_client_config().tenant_id == "fake_tenant_id"
+    assert invoke_cache.get_client_config().tenant_id == "fake_tenant_id"
+    assert mocks.calls.count(invoke_cache.GET_CLIENT_CONFIG_TOKEN) == 1
+    assert invoke_cache.INVOKE_CACHE.hits[invoke_cache.GET_CLIENT_CONFIG_TOKEN] == 1
+
+def test_disk_cache_ttl_and_refresh(tmp_path, monkeypatch):
+    """
+    Test disk cache entries expire after their TTL and can be refreshed.
+    """
+    token = invoke_cache.GET_CLIENT_CONFIG_TOKEN
+    key = invoke_cache.make_key(token, {})
+    disk = invoke_cache.DiskCache(str(tmp_path), ttl_seconds={token: 60})
+    assert disk.load(key) is None
+
+    monkeypatch.setattr(invoke_cache.time, "time", lambda: 1000.0)
+    disk.store(key, invoke_cache.CachedInvokeResult(tenant_id="fake_tenant_id"))
+    fields = {"client_id": None, "object_id": None, "subscription_id": None,
+              "tenant_id": "fake_tenant_id"}
+    monkeypatch.setattr(invoke_cache.time, "time", lambda: 1060.0)
+    assert disk.load(key) == fields
+
+    monkeypatch.setattr(invoke_cache.time, "time", lambda: 1061.0)
+    assert disk.load(key) is None
+    # The entry itself is kept, a longer TTL still reads it.
+    assert invoke_cache.DiskCache(str(tmp_path), ttl_seconds={token: 3600}).load(key) == fields
+    refreshed = invoke_cache.DiskCache(str(tmp_path), refresh=True)
+    assert refreshed.load(key) is None
+
+@pulumi.runtime.test
+def test_client_config_is_loaded_from_disk(tmp_path):
+    """
+    Test a persisted client config is reused without any invoke.
+    """
+    invoke_cache.INVOKE_CACHE.clear()
+    mocks.calls.clear()
+    invoke_cache.enable_disk_cache("stack", directory=str(tmp_path), refresh=False)
+    try:
+        assert invoke_cache.get_client_config().tenant_id == "fake_tenant_id"
+        # A new run only has the disk cache left.
+        invoke_cache.INVOKE_CACHE.clear()
+        assert invoke_cache.get_client_config().tenant_id == "fake_tenant_id"
+        assert mocks.calls.count(invoke_cache.GET_CLIENT_CONFIG_TOKEN) == 1
+        assert invoke_cache.INVOKE_CACHE.stats()[invoke_cache.GET_CLIENT_CONFIG_TOKEN] == {
+            "hits": 0, "disk_hits": 1, "misses": 0}
+    finally:
+        invoke_cache.INVOKE_CACHE.disk = None
+
+@pulumi.runtime.test
+def test_users_are_resolved_in_one_lookup():
+    """
+    Test the object IDs of many users are resolved by a single invoke.
+    """
+    invoke_cache.INVOKE_CACHE.clear()
+    mocks.calls.clear()
+    upns = [f"user{index}@foo.com" for index in range(20)]
+    object_ids = invoke_cache.get_user_object_ids(upns + ["user0@foo.com"])
+    assert sorted(object_ids) == sorted(upns)
+
+    def check_object_ids(actual_object_ids: List[str]):
+        assert actual_object_ids == [f"{upn}_object_id" for upn in upns]
+        assert mocks.calls.count(invoke_cache.GET_USERS_TOKEN) == 1
+
+    return pulumi.Output.all(*[object_ids[upn] for upn in upns]).apply(check_object_ids)
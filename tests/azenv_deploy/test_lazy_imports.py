@@ -0,0 +1,41 @@
+"""
+Module to test the lazy import of provider submodules
+"""
+import subprocess
+import sys
+from azenv_deploy.azenv_deploy import lazy_imports
+
+def test_lazy_module_is_imported_on_first_use():
+    """
+    Test a lazy module is only imported when an attribute is used, and its import is timed.
+    """
+    calendar = lazy_imports.lazy_import("calendar")
+    assert not calendar.is_loaded
+    assert calendar.isleap(2024)
+    assert calendar.is_loaded
+    assert "calendar" in lazy_imports.IMPORT_TIMES
+    assert any(line.startswith("calendar: ") for line in lazy_imports.import_report())
+
+def test_compute_provider_not_imported_without_compute():
+    """
+    Test building AzureML without compute never imports `machinelearningservices`.
+    """
+    program = """
+import sys
+import pulumi
+from tests.benchmark.bench_azureml import BenchmarkMocks, BenchmarkCase, synthetic_args
+pulumi.runtime.set_mocks(BenchmarkMocks(), preview=False)
+from azenv_deploy.azenv_deploy import azureml
+
+@pulumi.runtime.test
+def construct():
+    azureml.AzureML("lazy", synthetic_args(BenchmarkCase(0, 0, False)))
+
+construct()
+# Provider packages register placeholders in `sys.modules`, so look for a loaded submodule.
+print("pulumi_azure_native.machinelearningservices.compute" in sys.modules)
+print("pulumi_azure_native.storage.storage_account" in sys.modules)
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", program], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "True"]
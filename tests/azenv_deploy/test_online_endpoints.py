@@ -0,0 +1,81 @@
+"""
+Module to test the managed online endpoints
+"""
+import pulumi
+import pydantic
+import pytest
+from test_azureml import mocks, resources_by_type
+from azenv_deploy.azenv_deploy import azureml, online_endpoints
+
+def setup_module():
+    """
+    Setup mocks to the execution of the module.
+    """
+    pulumi.runtime.set_mocks(mocks, preview=False)
+
+def build_endpoint(**deployment_overrides) -> dict:
+    """
+    Returns an endpoint config with a blue deployment taking all the traffic and a green
+    one being rolled out.
+    """
+    blue = {"model": "azureml:churn-model:3", "instance_type": "Standard_DS3_v2",
+            "instance_count": 2, "traffic": 100, "request_timeout_ms": 3000,
+            "max_queue_wait_ms": 500, **deployment_overrides}
+    green = {"model": "azureml:churn-model:4", "instance_type": "Standard_DS3_v2"}
+    return {"deployments": {"blue": blue, "green": green}}
+
+def test_endpoints_deployments_and_autoscale():
+    """
+    Test the endpoint routes to the deployments with traffic, and the autoscale setting of
+    a deployment scales on CPU and on the endpoint latency.
+    """
+    mocks.resources.clear()
+    autoscale = {"min_instances": 2, "max_instances": 6, "latency_scale_out_ms": 250}
+
+    @pulumi.runtime.test
+    def construct():
+        online_endpoints.create_online_endpoints(
+            "foo", {"churn": build_endpoint(autoscale=autoscale)},
+            resource_group_name="rg", workspace_name="foo-ws",
+            enable_private_endpoints=True, opts=pulumi.ResourceOptions())
+
+    construct()
+    endpoint = resources_by_type("azure-native:machinelearningservices:OnlineEndpoint")[
+        "foo-churn"]
+    properties = endpoint.inputs["onlineEndpointProperties"]
+    assert properties["traffic"] == {"blue": 100}
+    assert properties["publicNetworkAccess"] == "Disabled"
+    deployments = resources_by_type("azure-native:machinelearningservices:OnlineDeployment")
+    blue = deployments["foo-churn-blue"].inputs
+    assert blue["sku"] == {"name": "Default", "capacity": 2}
+    assert blue["onlineDeploymentProperties"]["requestSettings"] == {
+        "maxConcurrentRequestsPerInstance": 1, "maxQueueWait": "PT0.5S",
+        "requestTimeout": "PT3S"}
+    assert blue["onlineDeploymentProperties"]["egressPublicNetworkAccess"] == "Disabled"
+
+    settings = resources_by_type("azure-native:insights:AutoscaleSetting")
+    assert list(settings) == ["foo-churn-blue-autoscale"]
+    profile = settings["foo-churn-blue-autoscale"].inputs["profiles"][0]
+    assert profile["capacity"] == {"default": "2", "maximum": "6", "minimum": "2"}
+    triggers = [(rule["metricTrigger"]["metricName"], rule["scaleAction"]["direction"],
+                 rule["metricTrigger"]["metricResourceUri"]) for rule in profile["rules"]]
+    assert triggers == [
+        ("CpuUtilizationPercentage", "Increase", "foo-churn-blue_id"),
+        ("CpuUtilizationPercentage", "Decrease", "foo-churn-blue_id"),
+        ("RequestLatency_P99", "Increase", "foo-churn_id"),
+    ]
+
+def test_endpoint_config_is_validated():
+    """
+    Test invalid traffic, autoscale bounds and endpoint names are rejected.
+    """
+    with pytest.raises(pydantic.ValidationError, match="adds up to 50%"):
+        azureml.AzureMLYamlConfig(online_endpoint_config={"churn": build_endpoint(traffic=50)})
+    with pytest.raises(pydantic.ValidationError, match="is not between min_instances"):
+        azureml.AzureMLYamlConfig(online_endpoint_config={"churn": build_endpoint(
+            autoscale={"min_instances": 3, "max_instances": 6})})
+    with pytest.raises(pydantic.ValidationError, match="should be lower than"):
+        azureml.AzureMLYamlConfig(online_endpoint_config={"churn": build_endpoint(
+            autoscale={"min_instances": 1, "max_instances": 6, "cpu_scale_in_percent": 80})})
+    with pytest.raises(pydantic.ValidationError, match="invalid online endpoint name"):
+        azureml.AzureMLYamlConfig(online_endpoint_config={"1-churn": build_endpoint()})
@@ -151,3 +151,70 @@ def test_private_endpoint_args_class():
     assert private_endpoint_args.dns_resource_group_name == expected_dns_resource_group_name
     assert private_endpoint_args.group_id == expected_group_id
     assert private_endpoint_args.private_dns_zones == expected_private_dns_zones
+
+def test_default_replacement_policy():
+    """
+    Test private endpoints are only recreated for properties that can't be updated in place,
+    deleting the old endpoint first.
+    """
+    options = private_endpoint.PrivateEndpointReplacementPolicy.from_config(None) \
+        .resource_options()
+    assert options.replace_on_changes == private_endpoint.DEFAULT_REPLACE_ON_CHANGES
+    assert "*" not in options.replace_on_changes
+    assert options.delete_before_replace is True
+
+def test_create_before_delete_replacement_policy():
+    """
+    Test the replacement policy parsed from the stack config.
+    """
+    policy = private_endpoint.PrivateEndpointReplacementPolicy.from_config({
+        "replace_on_changes": ["subnet"],
+        "create_before_delete": True})
+    options = policy.resource_options()
+    assert options.replace_on_changes == ["subnet"]
+    assert options.delete_before_replace is False
+    assert private_endpoint.PrivateEndpointReplacementPolicy.from_config(policy) is policy
+
+def registered_options(name: str, replacement_policy) -> List[pulumi.ResourceOptions]:
+    """
+    Build a PrivateEndpoint and return the options its `network.PrivateEndpoint` is
+    registered with, captured by a transformation of the component.
+    """
+    options: List[pulumi.ResourceOptions] = []
+
+    def record_options(args: pulumi.ResourceTransformationArgs):
+        if args.type_ == "azure-native:network:PrivateEndpoint":
+            options.append(args.opts)
+
+    @pulumi.runtime.test
+    def construct():
+        private_endpoint.PrivateEndpoint(
+            name,
+            args=private_endpoint.PrivateEndpointArgs(
+                resource_group_name=expected_resource_group_name,
+                private_link_service_id=expected_private_link_service_id,
+                subnet_id=expected_subnet_id,
+                dns_resource_group_name=expected_dns_resource_group_name,
+                group_id=expected_group_id,
+                private_dns_zones=expected_private_dns_zones,
+                replacement_policy=replacement_policy),
+            opts=pulumi.ResourceOptions(transformations=[record_options]))
+
+    construct()
+    return options
+
+def test_private_endpoint_is_registered_with_the_replacement_policy():
+    """
+    Test the `network.PrivateEndpoint` is registered with the replacement options of the
+    default policy, and of a create-before-delete policy.
+    """
+    options = registered_options("default-pe", None)
+    assert len(options) == 1
+    assert options[0].replace_on_changes == private_endpoint.DEFAULT_REPLACE_ON_CHANGES
+    assert options[0].delete_before_replace is True
+    assert options[0].ignore_changes == ["tags"]
+
+    options = registered_options("cbd-pe", private_endpoint.PrivateEndpointReplacementPolicy(
+        replace_on_changes=["subnet"], create_before_delete=True))
+    assert options[0].replace_on_changes == ["subnet"]
+    assert options[0].delete_before_replace is False
@@ -0,0 +1,87 @@
+"""
+Module to test the vCPU quota planner
+"""
+import json
+import os
+from azenv_deploy.azenv_deploy import quota
+from azenv_deploy.azenv_deploy.azureml import AzureMLYamlConfig
+
+PROJECT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "projects", "dev")
+CATALOG = """
+Standard_DS11_v2: {family: standardDSv2Family, vcpus: 2, memory_gb: 14}
+Standard_DS12_v2: {family: standardDSv2Family, vcpus: 4, memory_gb: 28}
+Standard_NC6s_v3: {family: standardNCSv3Family, vcpus: 6, memory_gb: 112}
+"""
+
+def cluster(vm_size, max_node_count, vm_priority="Dedicated"):
+    """
+    Returns a compute cluster config.
+    """
+    return {"max_node_count": max_node_count, "min_node_count": 0, "vm_priority": vm_priority,
+            "node_idle_time_before_scale_down": "PT5M", "vm_size": vm_size}
+
+def test_plan_quota(tmp_path):
+    """
+    Test clusters over the available quota are errors, and families that can't run all
+    their computes at full scale at once are warnings.
+    """
+    catalog_path = tmp_path / "skus.yaml"
+    catalog_path.write_text(CATALOG)
+    quota_path = tmp_path / "quota.yaml"
+    quota_path.write_text("""
+eastus:
+  standardDSv2Family: {limit: 40, current: 10}
+  standardNCSv3Family: {limit: 24}
+  lowPriorityCores: 100
+westus:
+  standardNCSv3Family: {limit: 1000}
+""")
+    config = AzureMLYamlConfig(
+        compute_instance_config={"inst-01": {"user_email": "foo@bar.com",
+                                             "vm_size": "Standard_DS12_v2"}},
+        compute_cluster_config={
+            "cpu": cluster("Standard_DS11_v2", 14),
+            "gpu": cluster("Standard_NC6s_v3", 8),
+            "gpu-spot": cluster("Standard_NC6s_v3", 10, "LowPriority"),
+            "other": cluster("Standard_D2_v5", 1),
+        })
+    report = quota.plan_quota(config, quota.load_sku_catalog(str(catalog_path)),
+                              quota.load_quotas(str(quota_path)))
+    assert report.demand == {"standardDSv2Family": 32, "standardNCSv3Family": 48,
+                             "lowPriorityCores": 60, "cores": 80}
+    assert report.memory_gb["standardDSv2Family"] == 14 * 14 + 28
+    assert len(report.errors) == 2
+    assert "`Standard_D2_v5` is not in the catalog" in report.errors[0]
+    assert report.errors[1].startswith("cluster `gpu` could never reach full scale")
+    assert [warning.split(":")[0] for warning in report.warnings] == [
+        "`standardDSv2Family`", "`standardNCSv3Family`"]
+    assert "error: cluster `gpu`" in quota.format_report(report)
+
+def test_load_azure_cli_outputs(tmp_path):
+    """
+    Test the catalog and quotas are read from the Azure CLI outputs.
+    """
+    catalog_path = tmp_path / "skus.json"
+    catalog_path.write_text(json.dumps([{
+        "name": "Standard_DS11_v2", "family": "standardDSv2Family",
+        "resourceType": "virtualMachines",
+        "capabilities": [{"name": "vCPUs", "value": "2"}, {"name": "MemoryGB", "value": "14"}],
+    }]))
+    quota_path = tmp_path / "usage.json"
+    quota_path.write_text(json.dumps([
+        {"name": {"value": "standardDSv2Family"}, "currentValue": 4, "limit": 10},
+        {"name": {"value": "cores"}, "currentValue": 4, "limit": 20},
+        {"name": {"value": "lowPriorityCores"}, "currentValue": 0, "limit": 0},
+    ]))
+    catalog = quota.load_sku_catalog(str(catalog_path))
+    assert catalog["standard_ds11_v2"] == quota.VmSku("Standard_DS11_v2", "standardDSv2Family",
+                                                      2, 14.0)
+    quotas = quota.load_quotas(str(quota_path))
+    assert quotas["standardDSv2Family"].available == 6
+
+    report = quota.plan_quota(quota.load_azureml_config(PROJECT_DIR, "dev"), catalog, quotas)
+    assert report.errors == [
+        "instance `comp-inst-ax01`: the VM size `Standard_DS12_v2` is not in the catalog.",
+        "cluster `comp-cluster-01` could never reach full scale: 5 x Standard_DS11_v2 need "
+        "10 `lowPriorityCores` vCPUs, 0 are available.",
+    ]
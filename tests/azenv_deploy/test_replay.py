@@ -0,0 +1,46 @@
+"""
+Module to test the offline replay of recorded invokes
+"""
+import json
+import os
+import pytest
+from azenv_deploy.azenv_deploy import invoke_cache, replay
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+PROJECT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "projects", "dev")
+
+def test_dev_stack_matches_golden_snapshot():
+    """
+    Test the dev stack renders the same resources and inputs as the golden snapshot.
+    Regenerate it with `python -m azenv_deploy.azenv_deploy.replay --stack dev
+    --fixtures tests/azenv_deploy/fixtures/dev.invokes.json
+    --output tests/azenv_deploy/fixtures/dev.snapshot.json`.
+    """
+    snapshot = replay.render_snapshot(
+        PROJECT_DIR, "dev", os.path.join(FIXTURES_DIR, "dev.invokes.json"))
+    with open(os.path.join(FIXTURES_DIR, "dev.snapshot.json"), encoding="utf-8") as golden:
+        assert replay.dump_snapshot(snapshot) == golden.read()
+
+def test_missing_invoke_is_reported(tmp_path):
+    """
+    Test an invoke that was not recorded fails the replay with its token and arguments.
+    """
+    fixtures_path = tmp_path / "invokes.json"
+    fixtures_path.write_text(json.dumps({"invokes": []}))
+    with pytest.raises(replay.ReplayError, match="azure-native:network:getSubnet"):
+        replay.render_snapshot(PROJECT_DIR, "dev", str(fixtures_path))
+
+def test_recorder_writes_replayable_fixtures(tmp_path):
+    """
+    Test recorded results are stored with wire names and keyed like the mock calls.
+    """
+    recorder = invoke_cache.InvokeRecorder(str(tmp_path / "invokes.json"))
+    recorder.record(
+        invoke_cache.GET_PRIVATE_ZONE_TOKEN,
+        {"private_zone_name": "privatelink.vaultcore.azure.net", "resource_group_name": "dns"},
+        invoke_cache.CachedInvokeResult(id="zone_id", name="privatelink.vaultcore.azure.net"))
+    fixtures = replay.load_fixtures(recorder.path)
+    key = invoke_cache.make_key(
+        invoke_cache.GET_PRIVATE_ZONE_TOKEN,
+        {"privateZoneName": "privatelink.vaultcore.azure.net", "resourceGroupName": "dns"})
+    assert fixtures[key] == {"id": "zone_id", "name": "privatelink.vaultcore.azure.net"}
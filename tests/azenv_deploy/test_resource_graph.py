@@ -0,0 +1,94 @@
+"""
+Module to test the resource dependency graph
+"""
+import json
+import os
+from azenv_deploy.azenv_deploy import resource_graph
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+PROJECT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "projects", "dev")
+URN_PREFIX = "urn:pulumi:dev::dev::azenv_deploy:azureml:AzureML$"
+
+def urn(typ, name):
+    """
+    Returns the URN of a child of the AzureML component.
+    """
+    return f"{URN_PREFIX}{typ}::{name}"
+
+STORAGE = urn("azure-native:storage:StorageAccount", "stg")
+VAULT = urn("azure-native:keyvault:Vault", "kv")
+WORKSPACE = urn("azure-native:machinelearning:Workspace", "ws")
+RECORD_SET = urn("azure-native:network:PrivateRecordSet", "stg-blob-rs")
+
+def write_state(tmp_path):
+    """
+    Write a state where the record set waits for the workspace through `depends_on` only.
+    """
+    resources = [
+        {"urn": "urn:pulumi:dev::dev::pulumi:pulumi:Stack::dev-dev",
+         "type": "pulumi:pulumi:Stack", "custom": False},
+        {"urn": STORAGE, "type": "azure-native:storage:StorageAccount", "custom": True},
+        {"urn": VAULT, "type": "azure-native:keyvault:Vault", "custom": True},
+        {"urn": WORKSPACE, "type": "azure-native:machinelearning:Workspace", "custom": True,
+         "dependencies": [STORAGE, VAULT],
+         "propertyDependencies": {"userStorageAccountId": [STORAGE],
+                                  "keyVaultIdentifierId": [VAULT]}},
+        {"urn": RECORD_SET, "type": "azure-native:network:PrivateRecordSet", "custom": True,
+         "dependencies": [STORAGE, WORKSPACE],
+         "propertyDependencies": {"relativeRecordSetName": [STORAGE]}},
+    ]
+    state_path = tmp_path / "dev.json"
+    state_path.write_text(json.dumps({"checkpoint": {"latest": {"resources": resources}}}))
+    return str(state_path)
+
+def test_critical_path_from_state(tmp_path):
+    """
+    Test the longest chain is weighted by the durations, and the stack is left out.
+    """
+    graph = resource_graph.graph_from_state(write_state(tmp_path))
+    assert len(graph.nodes) == 4
+    durations = {**resource_graph.DEFAULT_DURATIONS,
+                 "azure-native:keyvault:Vault": 90, WORKSPACE: 100}
+    path = graph.critical_path(durations)
+    assert path.urns == [VAULT, WORKSPACE, RECORD_SET]
+    assert path.duration_s == 90 + 100 + 5
+
+def test_explicit_edge_savings(tmp_path):
+    """
+    Test an explicit `depends_on` edge of the critical path is reported with its cost.
+    """
+    graph = resource_graph.graph_from_state(write_state(tmp_path))
+    durations = resource_graph.load_durations(None)
+    assert graph.nodes[RECORD_SET].explicit_dependencies == [WORKSPACE]
+    # Without the edge, the workspace ends last, after 30s + 120s.
+    assert graph.explicit_edge_savings(durations) == [(WORKSPACE, RECORD_SET, 155 - 150)]
+
+def test_exports(tmp_path):
+    """
+    Test the DOT and JSON exports mark the critical path and the explicit edges.
+    """
+    graph = resource_graph.graph_from_state(write_state(tmp_path))
+    durations = resource_graph.load_durations(None)
+    exported = graph.to_json(durations)
+    assert {"from": WORKSPACE, "to": RECORD_SET, "explicit": True} in exported["edges"]
+    assert exported["critical_path"]["urns"][-1] == RECORD_SET
+    dot = graph.to_dot(durations)
+    assert dot.startswith("digraph resources {")
+    assert "style=dashed, color=red" in dot
+
+def test_graph_from_replay():
+    """
+    Test the graph of the dev stack is captured from a replay, with the compute instances
+    waiting for the workspace.
+    """
+    graph = resource_graph.graph_from_replay(
+        PROJECT_DIR, "dev", os.path.join(FIXTURES_DIR, "dev.invokes.json"))
+    nodes = {node.name: node for node in graph.nodes.values()}
+    workspace = nodes["axtest01azml-ws"]
+    assert workspace.urn in nodes["comp-inst-ax01"].dependencies
+    path = graph.critical_path(resource_graph.load_durations(None))
+    # The storage account and the key vault take as long, as do the cluster and the compute
+    # instance; the ties are broken by URN.
+    assert [graph.nodes[urn].name for urn in path.urns] == [
+        "axtest01azml", "axtest01azml-ws", "comp-cluster-01"]
+    assert path.urns == graph.critical_path(resource_graph.load_durations(None)).urns
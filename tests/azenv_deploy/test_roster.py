@@ -0,0 +1,69 @@
+"""
+Module to test the compute instance roster loader
+"""
+import json
+import pytest
+from azenv_deploy.azenv_deploy import roster
+from azenv_deploy.azenv_deploy.constants import STANDARD_DS11_V2
+
+CSV_ROSTER = """name,user_email,vm_size
+ci-alice,alice@example.com,Standard_DS12_v2
+ci-bob,bob@example.com,
+ci-alice-2,Alice@Example.com,Standard_DS11_v2
+"""
+
+def test_load_csv_roster(tmp_path):
+    """
+    Test rows are loaded with the default VM size, keeping the first row of each user.
+    """
+    path = tmp_path / "roster.csv"
+    path.write_text(CSV_ROSTER)
+    loaded = roster.load_roster(str(path))
+    assert loaded.compute_instance_config == {
+        "ci-alice": {"user_email": "alice@example.com", "vm_size": "Standard_DS12_v2"},
+        "ci-bob": {"user_email": "bob@example.com", "vm_size": STANDARD_DS11_V2},
+    }
+    assert loaded.duplicates == [(4, 2)]
+
+def test_load_jsonl_roster_reports_every_invalid_line(tmp_path):
+    """
+    Test all the invalid rows are reported at once, with their line numbers.
+    """
+    rows = [
+        json.dumps({"name": "ci-alice", "user_email": "alice@example.com"}),
+        "",
+        "{not json",
+        json.dumps({"name": "1-bad", "user_email": "bob@example.com"}),
+        json.dumps({"name": "ci-alice", "user_email": "carol@example.com"}),
+        json.dumps({"name": "ci-dave", "user_email": "dave", "team": "x"}),
+    ]
+    path = tmp_path / "roster.jsonl"
+    path.write_text("\n".join(rows) + "\n")
+    with pytest.raises(roster.RosterError) as error:
+        roster.load_roster(str(path))
+    assert [line for line, _ in error.value.errors] == [3, 4, 5, 6, 6]
+    assert f"{path}:5: compute instance `ci-alice` is already defined on line 1" \
+        in str(error.value)
+
+def test_merge_roster(tmp_path):
+    """
+    Test roster compute instances are added to the inline ones, which they can't redefine.
+    """
+    path = tmp_path / "roster.csv"
+    path.write_text(CSV_ROSTER)
+    inline = {"ci-inline": {"user_email": "eve@example.com", "vm_size": STANDARD_DS11_V2}}
+    merged, _ = roster.merge_roster(inline, str(path))
+    assert list(merged) == ["ci-inline", "ci-alice", "ci-bob"]
+
+    with pytest.raises(roster.RosterError) as error:
+        roster.merge_roster({"ci-bob": inline["ci-inline"]}, str(path))
+    assert error.value.errors[0][0] == 3
+
+def test_missing_columns(tmp_path):
+    """
+    Test a CSV roster without the required columns is rejected.
+    """
+    path = tmp_path / "roster.csv"
+    path.write_text("name,email\nci-alice,alice@example.com\n")
+    with pytest.raises(roster.RosterError):
+        roster.load_roster(str(path))
@@ -0,0 +1,39 @@
+"""
+Module to test the assignment of computes to shard stacks
+"""
+import pytest
+from azenv_deploy.azenv_deploy import sharding
+
+COMPUTES = [f"comp-{index:03}" for index in range(600)]
+
+def test_assignment_is_stable_and_balanced():
+    """
+    Test the assignment only depends on the names, and spreads the computes evenly.
+    """
+    shards = ["shard-a", "shard-b", "shard-c"]
+    assignment = sharding.assign_shards(COMPUTES, shards)
+    assert assignment == sharding.assign_shards(COMPUTES, list(reversed(shards)))
+    assert sorted(sum(assignment.values(), [])) == COMPUTES
+    for computes in assignment.values():
+        assert 150 <= len(computes) <= 250
+
+def test_adding_a_shard_only_moves_computes_to_it():
+    """
+    Test a new shard only takes computes, without moving any between the existing shards.
+    """
+    before = {key: sharding.shard_for(key, ["shard-a", "shard-b", "shard-c"])
+              for key in COMPUTES}
+    after = {key: sharding.shard_for(key, ["shard-a", "shard-b", "shard-c", "shard-d"])
+             for key in COMPUTES}
+    moved = [key for key in COMPUTES if before[key] != after[key]]
+    assert all(after[key] == "shard-d" for key in moved)
+    assert 100 <= len(moved) <= 200
+
+def test_unknown_shard():
+    """
+    Test computes can't be assigned without shards, nor to an unknown shard.
+    """
+    with pytest.raises(ValueError):
+        sharding.shard_for("comp-001", [])
+    with pytest.raises(ValueError):
+        sharding.shard_computes(COMPUTES, ["shard-a"], "shard-b")
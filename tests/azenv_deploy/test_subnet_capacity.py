@@ -0,0 +1,79 @@
+"""
+Module to test the subnet IP capacity planner
+"""
+import os
+import types
+import pytest
+from azenv_deploy.azenv_deploy import invoke_cache, replay, subnet_capacity
+
+PROJECT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "projects", "dev")
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "dev.invokes.json")
+
+def compute_args(instances=1, max_node_count=5, **overrides):
+    """
+    Returns the compute configs of a component with private endpoints.
+    """
+    cluster = {"max_node_count": max_node_count}
+    return types.SimpleNamespace(**{
+        "compute_instance_config": {f"inst-{index}": {} for index in range(instances)},
+        "compute_cluster_config": {"cluster-01": cluster, "cluster-02": dict(cluster)},
+        "enable_private_endpoints": True,
+        "private_endpoint_replacement": None,
+        **overrides})
+
+def test_ip_demand_and_capacity():
+    """
+    Test the peak IPs count cluster nodes at full scale and the private endpoints, and the
+    headroom excludes the addresses Azure reserves.
+    """
+    assert subnet_capacity.usable_addresses(["10.0.1.0/24", "10.0.2.0/28"]) == 251 + 11
+    demand = subnet_capacity.ip_demand(compute_args(instances=10, max_node_count=100))
+    assert (demand.instances, sum(demand.cluster_nodes.values())) == (10, 200)
+    assert sum(demand.private_endpoints.values()) == 9
+    capacity = subnet_capacity.check_capacity(["10.0.0.0/23"], demand, 0.5)
+    assert (capacity.usable, capacity.free) == (507, 507 - 219)
+
+    with pytest.raises(subnet_capacity.SubnetCapacityError, match="219 are taken at peak"):
+        subnet_capacity.check_capacity(["10.0.1.0/24"], demand, 0.2)
+
+    replaced = subnet_capacity.ip_demand(compute_args(
+        private_endpoint_replacement={"create_before_delete": True}))
+    assert sum(replaced.private_endpoints.values()) == 18
+    replicated = subnet_capacity.ip_demand(compute_args(
+        container_registry={"sku": "Premium", "replicas": {"westus2": {}, "westeurope": {}}}))
+    assert replicated.private_endpoints["acr-pe"] == 4
+    adls = subnet_capacity.ip_demand(compute_args(storage_profile={"name": "adls_gen2"}))
+    assert adls.private_endpoints["dat-blob-pe"] == adls.private_endpoints["dat-dfs-pe"] == 1
+    assert not subnet_capacity.ip_demand(
+        compute_args(enable_private_endpoints=False)).private_endpoints
+
+def test_subnet_prefix_sources(tmp_path):
+    """
+    Test the prefixes are read from recorded invokes and from the invoke disk cache.
+    """
+    assert subnet_capacity.load_subnet_prefixes(FIXTURES, "pesn") == ["10.0.1.0/24"]
+    subnet_file = tmp_path / "subnet.yaml"
+    subnet_file.write_text("address_prefixes: [10.0.1.0/24, 10.0.2.0/24]\n")
+    assert subnet_capacity.load_subnet_prefixes(str(subnet_file)) == [
+        "10.0.1.0/24", "10.0.2.0/24"]
+
+    args = {"resource_group_name": "vrgn", "virtual_network_name": "vn", "subnet_name": "pesn"}
+    invoke_cache.DiskCache(str(tmp_path)).store(
+        invoke_cache.make_key(invoke_cache.GET_SUBNET_TOKEN, args),
+        types.SimpleNamespace(id="pesn_id", address_prefix="10.0.1.0/26"))
+    assert subnet_capacity.cached_subnet_prefixes(str(tmp_path), "vrgn", "vn", "pesn") == [
+        "10.0.1.0/26"]
+    with pytest.raises(ValueError):
+        subnet_capacity.cached_subnet_prefixes(str(tmp_path), "vrgn", "vn", "other")
+
+def test_preview_fails_without_headroom():
+    """
+    Test the dev stack fails when its subnet keeps less headroom than required.
+    """
+    config = replay.load_stack_config(PROJECT_DIR, "dev")
+    fixtures = replay.load_fixtures(FIXTURES)
+    replay.run_program(PROJECT_DIR, "dev", replay.ReplayMocks(fixtures),
+                       config={**config, "dev:subnet_min_headroom": "0.5"})
+    with pytest.raises(subnet_capacity.SubnetCapacityError):
+        replay.run_program(PROJECT_DIR, "dev", replay.ReplayMocks(fixtures),
+                           config={**config, "dev:subnet_min_headroom": "0.99"})
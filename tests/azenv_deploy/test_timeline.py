@@ -0,0 +1,115 @@
+"""
+Module to test the deploy timeline
+"""
+import csv
+import json
+from azenv_deploy.azenv_deploy import timeline
+
+URN_PREFIX = "urn:pulumi:dev::dev::azenv_deploy:azureml:AzureML$"
+STORAGE = ("azure-native:storage:StorageAccount", "stg")
+WORKSPACE = ("azure-native:machinelearning:Workspace", "ws")
+COMPUTE = ("azure-native:machinelearningservices:Compute", "inst-01")
+COMPONENT = ("azenv_deploy:azureml:AzureML", "fooazml-comp")
+
+def event(sequence, timestamp, kind, resource, op="create"):
+    """
+    Returns an engine event of the event log about a resource.
+    """
+    typ, name = resource
+    urn = f"urn:pulumi:dev::dev::{typ}::{name}" if typ.startswith("azenv_deploy:") \
+        else f"{URN_PREFIX}{typ}::{name}"
+    metadata = {"op": op, "urn": urn, "type": typ, "provider": ""}
+    payload = {"metadata": metadata}
+    if kind == "resOpFailedEvent":
+        payload.update(status=1, steps=1)
+    return {"sequence": sequence, "timestamp": timestamp, kind: payload}
+
+def write_event_log(tmp_path):
+    """
+    Write the event log of a deployment where the compute instance fails.
+    """
+    events = [
+        event(1, 1000, "resourcePreEvent", COMPONENT),
+        event(2, 1000, "resourcePreEvent", STORAGE),
+        event(3, 1030, "resOutputsEvent", STORAGE),
+        event(4, 1030, "resourcePreEvent", WORKSPACE),
+        event(5, 1150, "resOutputsEvent", WORKSPACE),
+        event(6, 1150, "resourcePreEvent", COMPUTE),
+        event(7, 1400, "resOpFailedEvent", COMPUTE),
+        event(8, 1400, "resOutputsEvent", COMPONENT),
+    ]
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(json.dumps(item) for item in events) + "\n")
+    return str(path)
+
+def test_resource_section():
+    """
+    Test resource types are grouped by AzureML section.
+    """
+    assert timeline.resource_section(STORAGE[0]) == "storage"
+    assert timeline.resource_section(WORKSPACE[0]) == "workspace"
+    assert timeline.resource_section(COMPUTE[0]) == "computes"
+    assert timeline.resource_section("azure-native:network:PrivateEndpoint") == "endpoints"
+    assert timeline.resource_section("azure-native:containerregistry:Registry") == "acr"
+
+def test_spans_from_event_log(tmp_path):
+    """
+    Test spans start and finish with their events, skipping components.
+    """
+    spans = timeline.load_event_log(write_event_log(tmp_path)).sorted_spans()
+    assert [(span.name, span.start_s, span.duration_s, span.status) for span in spans] == [
+        ("stg", 0, 30, "done"),
+        ("ws", 30, 120, "done"),
+        ("inst-01", 150, 250, "failed"),
+    ]
+    assert timeline.section_bounds(spans)["computes"] == (150, 400)
+    # Failed operations are not used as historical durations.
+    assert timeline.mean_durations(spans) == {STORAGE[0]: 30, WORKSPACE[0]: 120}
+
+def test_replacement_spans(tmp_path):
+    """
+    Test every step of a replacement gets its own span, and only the creation of the
+    replacement is used as a historical duration.
+    """
+    events = [
+        # The storage account is created before the old one is deleted.
+        event(1, 1000, "resourcePreEvent", STORAGE, "create-replacement"),
+        event(2, 1030, "resOutputsEvent", STORAGE, "create-replacement"),
+        event(3, 1030, "resourcePreEvent", STORAGE, "replace"),
+        event(4, 1030, "resOutputsEvent", STORAGE, "replace"),
+        # The workspace is deleted before its replacement is created.
+        event(5, 1030, "resourcePreEvent", WORKSPACE, "delete-replaced"),
+        event(6, 1090, "resOutputsEvent", WORKSPACE, "delete-replaced"),
+        event(7, 1090, "resourcePreEvent", WORKSPACE, "replace"),
+        event(8, 1090, "resOutputsEvent", WORKSPACE, "replace"),
+        event(9, 1090, "resourcePreEvent", WORKSPACE, "create-replacement"),
+        event(10, 1210, "resOutputsEvent", WORKSPACE, "create-replacement"),
+        event(11, 1210, "resourcePreEvent", STORAGE, "delete-replaced"),
+        event(12, 1225, "resOutputsEvent", STORAGE, "delete-replaced"),
+    ]
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(json.dumps(item) for item in events) + "\n")
+    spans = timeline.load_event_log(str(path)).sorted_spans()
+    assert [(span.name, span.op, span.start_s, span.duration_s) for span in spans] == [
+        ("stg", "create-replacement", 0, 30),
+        ("stg", "replace", 30, 0),
+        ("stg", "delete-replaced", 210, 15),
+        ("ws", "delete-replaced", 30, 60),
+        ("ws", "replace", 90, 0),
+        ("ws", "create-replacement", 90, 120),
+    ]
+    assert timeline.mean_durations(spans) == {STORAGE[0]: 30, WORKSPACE[0]: 120}
+
+def test_outputs(tmp_path):
+    """
+    Test the CSV has a row per span and the HTML a bar per section and span.
+    """
+    spans = timeline.load_event_log(write_event_log(tmp_path)).sorted_spans()
+    csv_path = tmp_path / "timeline.csv"
+    timeline.write_csv(spans, str(csv_path))
+    with open(csv_path, encoding="utf-8") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert [row["section"] for row in rows] == ["storage", "workspace", "computes"]
+    page = timeline.render_html(spans)
+    assert page.count('class="bar"') == 6
+    assert "inst-01 (azure-native:machinelearningservices:Compute) create failed" in page
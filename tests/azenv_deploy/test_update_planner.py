@@ -0,0 +1,186 @@
+"""
+Module to test the targeted update planner
+"""
+import copy
+from azenv_deploy.azenv_deploy import sharding, update_planner
+
+STACK_FILE = """
+config:
+  dev:prefix: foo
+  dev:common:
+    resource_group_name: rgn
+  dev:azureml:
+    compute_instance_subnet_name: cisn
+    compute_cluster_subnet_name: ccsn
+    compute_cluster_config:
+      cluster-01:
+        max_node_count: 5
+        min_node_count: 1
+        node_idle_time_before_scale_down: PT5M
+        vm_priority: LowPriority
+        vm_size: Standard_DS11_v2
+    compute_instance_config:
+      inst-01:
+        user_email: foo@bar.com
+        vm_size: Standard_DS12_v2
+"""
+
+def compute_urn(name):
+    """
+    Returns the URN of a compute of the `dev` stack.
+    """
+    return update_planner.child_urn("dev", "dev", update_planner.COMPUTE_TYPE, name)
+
+def suffix_urn(cluster_name):
+    """
+    Returns the URN of the `RandomString` suffix of a cluster of the `dev` stack.
+    """
+    return update_planner.child_urn(
+        "dev", "dev", "random:index/randomString:RandomString", f"{cluster_name}-suffix")
+
+def compute_urn_in(shard, name):
+    """
+    Returns the URN of a compute of a shard stack.
+    """
+    return update_planner.child_urn(shard, "dev", update_planner.COMPUTE_TYPE, name,
+                                    update_planner.SHARD_TYPE)
+
+def test_load_stack_config():
+    """
+    Test the project namespace is stripped from the stack config keys.
+    """
+    config = update_planner.load_stack_config(STACK_FILE, "dev")
+    assert config["prefix"] == "foo"
+    assert "cluster-01" in config["azureml"]["compute_cluster_config"]
+
+def test_no_change():
+    """
+    Test an unchanged config plans no update.
+    """
+    config = update_planner.load_stack_config(STACK_FILE, "dev")
+    plan = update_planner.plan_update(config, copy.deepcopy(config), "dev", "dev")
+    assert plan.targets == []
+    assert plan.command("dev") == []
+
+def test_compute_changes_are_targeted():
+    """
+    Test added, removed and changed compute entries are targeted, with the suffix of
+    new clusters.
+    """
+    previous = update_planner.load_stack_config(STACK_FILE, "dev")
+    new = copy.deepcopy(previous)
+    azureml = new["azureml"]
+    azureml["compute_cluster_config"]["cluster-01"]["max_node_count"] = 10
+    azureml["compute_cluster_config"]["cluster-02"] = dict(
+        azureml["compute_cluster_config"]["cluster-01"])
+    del azureml["compute_instance_config"]["inst-01"]
+    plan = update_planner.plan_update(previous, new, "dev", "dev")
+
+    assert plan.clusters.changed == ["cluster-01"]
+    assert plan.clusters.added == ["cluster-02"]
+    assert plan.instances.removed == ["inst-01"]
+    assert plan.targets == sorted([
+        compute_urn("cluster-01"),
+        compute_urn("cluster-02"),
+        suffix_urn("cluster-02"),
+        compute_urn("inst-01"),
+    ])
+    command = plan.command("dev")
+    assert command[-1] == "--target-dependents"
+    assert command.count("--target") == 4
+
+def test_switching_to_hash_suffixes_renames_clusters():
+    """
+    Test switching an unpinned cluster to hash suffixes targets its compute and suffix.
+    """
+    previous = update_planner.load_stack_config(STACK_FILE, "dev")
+    new = copy.deepcopy(previous)
+    new["azureml"]["compute_cluster_suffix_mode"] = "hash"
+    plan = update_planner.plan_update(previous, new, "dev", "dev")
+    assert plan.targets == sorted([compute_urn("cluster-01"), suffix_urn("cluster-01")])
+
+    # Pinning the current suffix keeps the cluster as it is.
+    new["azureml"]["compute_cluster_suffixes"] = {"cluster-01": "ab"}
+    previous["azureml"]["compute_cluster_suffixes"] = {"cluster-01": "ab"}
+    assert update_planner.plan_update(previous, new, "dev", "dev").targets == []
+
+def test_other_changes_need_a_full_update():
+    """
+    Test changes outside of the compute config fall back to a full update.
+    """
+    previous = update_planner.load_stack_config(STACK_FILE, "dev")
+    new = copy.deepcopy(previous)
+    new["azureml"]["compute_cluster_subnet_name"] = "other"
+    plan = update_planner.plan_update(previous, new, "dev", "dev")
+    assert plan.is_full_update
+    assert "compute_cluster_subnet_name" in plan.reason
+    assert plan.command("dev") == ["pulumi", "up", "--stack", "dev"]
+
+    new = copy.deepcopy(previous)
+    new["common"]["resource_group_name"] = "other"
+    assert update_planner.plan_update(previous, new, "dev", "dev").is_full_update
+
+def test_image_build_compute_changes_need_a_full_update():
+    """
+    Test a change or a rename of the image build cluster updates the workspace too.
+    """
+    previous = update_planner.load_stack_config(STACK_FILE, "dev")
+    previous["azureml"]["image_build"] = {"compute": "cluster-01"}
+    new = copy.deepcopy(previous)
+    new["azureml"]["compute_cluster_suffixes"] = {"cluster-01": "k3"}
+    plan = update_planner.plan_update(previous, new, "dev", "dev")
+    assert plan.is_full_update
+    assert plan.reason == "changed image build compute: cluster-01"
+
+    new = copy.deepcopy(previous)
+    new["azureml"]["compute_instance_config"]["inst-01"]["vm_size"] = "Standard_DS11_v2"
+    assert update_planner.plan_update(previous, new, "dev", "dev").targets == [
+        compute_urn("inst-01")]
+
+def test_roster_needs_a_full_update():
+    """
+    Test a stack with a compute instance roster gets a full update, since an edit of the
+    roster file doesn't change the stack config.
+    """
+    previous = update_planner.load_stack_config(STACK_FILE, "dev")
+    previous["azureml"]["compute_instance_roster"] = "rosters/dev.csv"
+    plan = update_planner.plan_update(previous, copy.deepcopy(previous), "dev", "dev")
+    assert plan.is_full_update
+    assert "roster" in plan.reason
+
+def test_sharded_stacks():
+    """
+    Test a shard stack only targets its own computes, under its shard component, and a
+    sharded core stack falls back to a full update.
+    """
+    previous = update_planner.load_stack_config(STACK_FILE, "dev")
+    previous["sharding"] = {"core_stack": "org/dev/core", "shards": ["shard-a", "shard-b"]}
+    new = copy.deepcopy(previous)
+    new["azureml"]["compute_cluster_config"]["cluster-01"]["max_node_count"] = 10
+    new["azureml"]["compute_instance_config"]["inst-01"]["vm_size"] = "Standard_DS11_v2"
+
+    shard = sharding.shard_for("cluster-01", ["shard-a", "shard-b"])
+    plan = update_planner.plan_update(previous, new, shard, "dev")
+    assert plan.clusters.changed == ["cluster-01"]
+    assert compute_urn_in(shard, "cluster-01") in plan.targets
+    assert all(f"::{update_planner.SHARD_TYPE}$" in target for target in plan.targets)
+    other = "shard-b" if shard == "shard-a" else "shard-a"
+    assert compute_urn_in(other, "cluster-01") not in (
+        update_planner.plan_update(previous, new, other, "dev").targets)
+
+    plan = update_planner.plan_update(previous, new, "core", "dev")
+    assert plan.is_full_update
+    assert "sharded core stack" in plan.reason
+    assert update_planner.plan_update(previous, copy.deepcopy(previous), "core", "dev"
+                                      ).targets == []
+
+def test_main_without_change(tmp_path, capsys):
+    """
+    Test the planner prints no `pulumi up` command when nothing needs an update.
+    """
+    (tmp_path / "Pulumi.yaml").write_text("name: dev\n")
+    (tmp_path / "Pulumi.dev.yaml").write_text(STACK_FILE)
+    assert update_planner.main(["--stack", "dev", "--project-dir", str(tmp_path),
+                                "--previous", str(tmp_path / "Pulumi.dev.yaml"),
+                                "--run"]) == 0
+    assert capsys.readouterr().out == "no update needed: no compute change\n"
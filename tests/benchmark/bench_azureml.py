@@ -0,0 +1,243 @@
+"""
+Benchmark of the `AzureML` program construction, driven by Pulumi mocks.
+
+The benchmark builds `AzureML` with synthetic configs, sweeping the number of compute
+instances and compute clusters with private endpoints on and off, and records the wall
+time, the peak RSS and the number of registered resources of each case. Every case runs
+in a fresh process, so the peak RSS of a case isn't inflated by the previous ones.
+
+Usage, from the repo root:
+
+    python -m tests.benchmark.bench_azureml --output baseline.json
+    python -m tests.benchmark.bench_azureml --baseline baseline.json --output latest.json
+
+When `--baseline` is given, the run exits with a non-zero code if any case got slower than
+the tolerance allows or registers more resources than in the baseline.
+"""
+import argparse
+import importlib.metadata
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+import pulumi
+from azenv_deploy.azenv_deploy import azureml
+from tests.azenv_deploy.test_private_endpoint import PrivateEndpointMocks
+
+DEFAULT_INSTANCE_COUNTS = [1, 10, 100, 1000]
+DEFAULT_CLUSTER_COUNTS = [1, 10, 50, 200]
+DEFAULT_TOLERANCE = 0.25
+FAKE_IP_ADDRESS = "10.0.0.4"
+
+class BenchmarkMocks(PrivateEndpointMocks):
+    """
+    Mocking class for the whole `AzureML` component, counting registered resources.
+    """
+    def __init__(self):
+        self.resource_count = 0
+        self.call_count = 0
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        self.resource_count += 1
+        outputs = dict(args.inputs)
+        if args.typ == "azure-native:network:PrivateDnsZoneGroup":
+            # The engine fills in the record sets of the endpoint IP in each zone.
+            outputs["privateDnsZoneConfigs"] = [
+                {**zone_config, "recordSets": [{"ipAddresses": [FAKE_IP_ADDRESS]}]}
+                for zone_config in args.inputs.get("privateDnsZoneConfigs", [])
+            ]
+        return [args.name + '_id', outputs]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        self.call_count += 1
+        match args.token:
+            case "azure-native:network:getSubnet":
+                return {"id": "fake_subnet_id"}
+            case "azure-native:authorization:getClientConfig":
+                return {"tenantId": "fake_tenant_id"}
+            case "azuread:index/getUsers:getUsers":
+                upns = args.args["userPrincipalNames"]
+                return {
+                    "userPrincipalNames": upns,
+                    "objectIds": [f"{upn}_object_id" for upn in upns]
+                }
+            case _:
+                return super().call(args)
+
+@dataclass
+class BenchmarkCase:
+    """
+    A synthetic `AzureML` config to build.
+    """
+    instance_count: int
+    cluster_count: int
+    enable_private_endpoints: bool
+
+    @property
+    def case_id(self) -> str:
+        """The identifier used to match cases against the baseline."""
+        pe_mode = "pe" if self.enable_private_endpoints else "nope"
+        return f"ci{self.instance_count}-cc{self.cluster_count}-{pe_mode}"
+
+def synthetic_args(case: BenchmarkCase) -> azureml.AzureMLArgs:
+    """
+    Build the `AzureML` arguments of a benchmark case.
+    """
+    return azureml.AzureMLArgs(
+        resource_group_name="bench_resource_group_name",
+        compute_instance_subnet_name=None,
+        compute_cluster_subnet_name=None,
+        vnet_resource_group_name="bench_vnet_resource_group_name",
+        vnet_name="bench_vnet_name",
+        enable_private_endpoints=case.enable_private_endpoints,
+        dns_resource_group_name="bench_dns_resource_group_name",
+        private_endpoint_subnet_name="bench_private_endpoint_subnet_name",
+        compute_instance_config={
+            f"ci-{index:04d}": {
+                "user_email": f"user{index}@bench.example.com",
+                "vm_size": "Standard_DS11_v2"
+            }
+            for index in range(case.instance_count)
+        },
+        compute_cluster_config={
+            f"cc-{index:03d}": {
+                "max_node_count": 4,
+                "min_node_count": 0,
+                "node_idle_time_before_scale_down": "PT5M",
+                "vm_priority": "LowPriority",
+                "vm_size": "Standard_DS11_v2"
+            }
+            for index in range(case.cluster_count)
+        })
+
+def peak_rss_mb() -> float:
+    """
+    Returns:
+        float: The peak resident set size of the current process, in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # `ru_maxrss` is in bytes on macOS and in KiB on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_case(case: BenchmarkCase) -> Dict:
+    """
+    Build `AzureML` for a case in the current process and measure it.
+    """
+    mocks = BenchmarkMocks()
+    pulumi.runtime.set_mocks(mocks, preview=False)
+    args = synthetic_args(case)
+
+    @pulumi.runtime.test
+    def construct():
+        azureml.AzureML("bench", args)
+
+    start = time.perf_counter()
+    construct()
+    wall_time = time.perf_counter() - start
+    return {
+        "case_id": case.case_id,
+        **asdict(case),
+        "wall_time_s": round(wall_time, 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "resource_count": mocks.resource_count,
+        "invoke_count": mocks.call_count
+    }
+
+def run_case_isolated(case: BenchmarkCase) -> Dict:
+    """
+    Run a case in a fresh process.
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_case, case).result()
+
+def sweep_cases(instance_counts: List[int], cluster_counts: List[int]) -> List[BenchmarkCase]:
+    """
+    Sweep compute instances with a single cluster, then clusters with a single instance,
+    each with private endpoints on and off.
+    """
+    cases: Dict[str, BenchmarkCase] = {}
+    for enable_private_endpoints in (False, True):
+        for case in [BenchmarkCase(count, 1, enable_private_endpoints)
+                     for count in instance_counts] + \
+                    [BenchmarkCase(1, count, enable_private_endpoints)
+                     for count in cluster_counts]:
+            cases.setdefault(case.case_id, case)
+    return list(cases.values())
+
+def compare_with_baseline(
+        results: List[Dict],
+        baseline: Dict,
+        tolerance: float) -> List[str]:
+    """
+    Compare results with a baseline.
+
+    Returns:
+        List[str]: A description of every regression, empty when there is none.
+    """
+    baseline_cases = {case["case_id"]: case for case in baseline.get("cases", [])}
+    regressions: List[str] = []
+    for result in results:
+        previous = baseline_cases.get(result["case_id"])
+        if previous is None:
+            continue
+        if result["wall_time_s"] > previous["wall_time_s"] * (1 + tolerance):
+            regressions.append(
+                f"{result['case_id']}: wall time {result['wall_time_s']}s, "
+                f"baseline {previous['wall_time_s']}s")
+        if result["resource_count"] > previous["resource_count"]:
+            regressions.append(
+                f"{result['case_id']}: {result['resource_count']} resources, "
+                f"baseline {previous['resource_count']}")
+    return regressions
+
+def parse_counts(value: str) -> List[int]:
+    """Parse a comma-separated list of counts."""
+    return [int(count) for count in value.split(",") if count]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--instances", type=parse_counts, default=DEFAULT_INSTANCE_COUNTS,
+                        help="Comma-separated compute instance counts.")
+    parser.add_argument("--clusters", type=parse_counts, default=DEFAULT_CLUSTER_COUNTS,
+                        help="Comma-separated compute cluster counts.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare the results with this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative wall time increase over the baseline.")
+    options = parser.parse_args(argv)
+
+    results: List[Dict] = []
+    for case in sweep_cases(options.instances, options.clusters):
+        result = run_case_isolated(case)
+        results.append(result)
+        print(f"{result['case_id']:<20} {result['wall_time_s']:>9.3f}s "
+              f"{result['peak_rss_mb']:>8.1f}MiB {result['resource_count']:>6} resources")
+
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as output_file:
+            json.dump({
+                "python": platform.python_version(),
+                "pulumi": importlib.metadata.version("pulumi"),
+                "cases": results
+            }, output_file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare_with_baseline(
+                results, json.load(baseline_file), options.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Smoke test of the AzureML construction benchmark
+"""
+from tests.benchmark import bench_azureml
+
+def test_run_smallest_cases():
+    """
+    Test the benchmark builds AzureML and counts its resources, with and without
+    private endpoints.
+    """
+    without_pe = bench_azureml.run_case(bench_azureml.BenchmarkCase(2, 1, False))
+    with_pe = bench_azureml.run_case(bench_azureml.BenchmarkCase(2, 1, True))
+    assert without_pe["case_id"] == "ci2-cc1-nope"
+    assert without_pe["resource_count"] > 0
+    assert with_pe["resource_count"] > without_pe["resource_count"]
+    assert with_pe["wall_time_s"] > 0
+
+def test_sweep_cases_are_unique():
+    """
+    Test the sweep doesn't run the shared single instance and cluster case twice.
+    """
+    cases = bench_azureml.sweep_cases([1, 10], [1, 5])
+    assert [case.case_id for case in cases] == [
+        "ci1-cc1-nope", "ci10-cc1-nope", "ci1-cc5-nope",
+        "ci1-cc1-pe", "ci10-cc1-pe", "ci1-cc5-pe"]
+
+def test_compare_with_baseline():
+    """
+    Test slower cases and extra resources are reported as regressions.
+    """
+    baseline = {"cases": [
+        {"case_id": "a", "wall_time_s": 1.0, "resource_count": 10},
+        {"case_id": "b", "wall_time_s": 1.0, "resource_count": 10}]}
+    results = [
+        {"case_id": "a", "wall_time_s": 1.2, "resource_count": 10},
+        {"case_id": "b", "wall_time_s": 2.0, "resource_count": 11},
+        {"case_id": "c", "wall_time_s": 9.0, "resource_count": 99}]
+    regressions = bench_azureml.compare_with_baseline(results, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert all(regression.startswith("b:") for regression in regressions)